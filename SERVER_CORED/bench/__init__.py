@@ -0,0 +1 @@
+# Бенчмарки сервера. Запуск из каталога SERVER_CORED: python -m bench.<модуль>
@@ -0,0 +1,153 @@
+"""Цена критической ошибки для вызывающего кода при «шторме» ошибок.
+
+Локальные заглушки SMTP и Telegram API отвечают с задержкой --latency; сравниваются прямой
+синхронный вызов отправителей (как было) и постановка в очередь AlertDispatcher. Те же заглушки
+используют тесты (tests/test_alerts.py): код ответа Telegram можно менять, тексты сохраняются.
+
+    python -m bench.alerts --errors 2000 --distinct 5 --latency 0.2
+"""
+import argparse
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules.error_handler import (ErrorHandler, CriticalError, AlertChannel, AlertDispatcher,
+                                   set_alert_dispatcher)
+
+
+class StubSMTP(socketserver.ThreadingTCPServer):
+    """Минимальный SMTP без TLS и авторизации: принимает письмо и считает его."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.received = 0
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 stub")
+        while line := self.rfile.readline():
+            cmd = line.decode(errors="replace").strip().upper()
+            if cmd.startswith(("EHLO", "HELO")):
+                self.reply("250 stub")
+            elif cmd == "DATA":
+                self.reply("354 end with .")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(self.server.latency)
+                self.server.received += 1
+                self.reply("250 queued")
+            elif cmd == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class StubTelegram(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, status: int = 200):
+        self.latency = latency
+        self.status = status
+        self.received = 0
+        self.messages = []
+        super().__init__(("127.0.0.1", 0), _TelegramHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency)
+        self.server.received += 1
+        self.server.messages.append(json.loads(payload)["text"])
+        body = b'{"ok": %s}' % (b"true" if self.server.status == 200 else b"false")
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _storm(errors: int, distinct: int) -> list:
+    """Поднять errors критических ошибок с distinct разными трейсбеками; время на каждую."""
+    timings = []
+    for i in range(errors):
+        try:
+            raise ValueError(f"сбой #{i % distinct}")
+        except ValueError as e:
+            t0 = time.perf_counter()
+            try:
+                ErrorHandler.handle_exception(e, critical=True)
+            except CriticalError:
+                pass
+            timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def _summary(timings: list) -> dict:
+    t = sorted(timings)
+    return {
+        "errors": len(t),
+        "avg_ms": round(sum(t) / len(t) * 1000, 3),
+        "p99_ms": round(t[min(len(t) - 1, int(len(t) * 0.99))] * 1000, 3),
+        "total_s": round(sum(t), 3),
+    }
+
+
+def run(errors: int = 2000, distinct: int = 5, latency: float = 0.2, sync_errors: int = 20):
+    smtp, tg = StubSMTP(latency), StubTelegram(latency)
+    ErrorHandler.EMAIL_CONFIG.update(smtp_server="127.0.0.1", smtp_port=smtp.server_address[1],
+                                     starttls=False, password="")
+    ErrorHandler.TELEGRAM_CONFIG.update(api_url=tg.url)
+    results = {}
+
+    # Как было: отправка прямо в коде, где случилась ошибка
+    set_alert_dispatcher(type("Sync", (), {"submit": staticmethod(
+        lambda m: (ErrorHandler.send_email_alert(m), ErrorHandler.send_telegram_alert(m)))})())
+    results["sync"] = _summary(_storm(sync_errors, distinct))
+    results["sync"]["delivered"] = smtp.received + tg.received
+
+    smtp.received = tg.received = 0
+    dispatcher = AlertDispatcher([
+        AlertChannel("email", ErrorHandler.send_email_alert),
+        AlertChannel("telegram", ErrorHandler.send_telegram_alert),
+    ])
+    set_alert_dispatcher(dispatcher)
+    results["queued"] = _summary(_storm(errors, distinct))
+    dispatcher.close()
+    results["queued"]["delivered"] = smtp.received + tg.received
+    results["queued"]["channels"] = dispatcher.stats()
+
+    smtp.shutdown()
+    tg.shutdown()
+    for name, r in results.items():
+        print(name, r)
+    return results
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--errors", type=int, default=2000)
+    p.add_argument("--distinct", type=int, default=5)
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--sync-errors", type=int, default=20)
+    a = p.parse_args()
+    run(a.errors, a.distinct, a.latency, a.sync_errors)
@@ -0,0 +1,156 @@
+"""Пропускная способность APIClient/AsyncAPIClient на локальном HTTP-сервере-заглушке.
+
+Заглушка отвечает JSON с заданной задержкой и долей ошибок 503 (её можно менять на ходу), а на
+путь .../status/<код> — этим кодом; несколько заглушек изображают прокси (httpx/requests шлют им
+запрос с абсолютным URL, заглушка отвечает сама). Её же используют тесты (tests/test_api_client.py).
+
+    python -m bench.api_client --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import multiprocessing
+import random
+import time
+
+import requests
+
+from modules.api_client import APIClient, AsyncAPIClient
+
+
+class StubServer:
+    """Минимальный HTTP/1.1 сервер с keep-alive в отдельном процессе (не делит GIL с клиентом)."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        self._hits = multiprocessing.Value("q", 0, lock=False)
+        self._conns = multiprocessing.Value("q", 0, lock=False)
+        self._error_rate = multiprocessing.Value("d", error_rate, lock=False)
+        ports = multiprocessing.SimpleQueue()
+        self._proc = multiprocessing.Process(
+            target=_serve, args=(ports, latency, self._error_rate, self._hits, self._conns),
+            daemon=True)
+        self._proc.start()
+        self.port = ports.get()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def hits(self):
+        return self._hits.value
+
+    @property
+    def connections(self):
+        return self._conns.value
+
+    @property
+    def error_rate(self):
+        return self._error_rate.value
+
+    @error_rate.setter
+    def error_rate(self, value: float):
+        self._error_rate.value = value
+
+    def stop(self):
+        self._proc.terminate()
+
+
+def _serve(ports, latency, error_rate, hits, conns):
+    async def handle(reader, writer):
+        conns.value += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.split(b" ", 2)[1].split(b"?")[0]
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                if length:
+                    await reader.readexactly(length)
+                hits.value += 1
+                if latency:
+                    await asyncio.sleep(latency)
+                if b"/status/" in path:
+                    status, body = path.rsplit(b"/", 1)[1] + b" Status", b'{"ok": false}'
+                elif random.random() < error_rate.value:
+                    status, body = b"503 Service Unavailable", b'{"ok": false}'
+                else:
+                    status, body = b"200 OK", b'{"ok": true}'
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=1024)
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def bench_sync_per_call(url, n):
+    """Прежнее поведение: requests.request без Session — новое соединение на каждый вызов."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        requests.request("get", url + "/ping", timeout=10)
+    return n / (time.perf_counter() - t0)
+
+
+def bench_sync_session(url, n):
+    client = APIClient(url, retries=1)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        client.get("/ping")
+    client.close()
+    return n / (time.perf_counter() - t0)
+
+
+async def bench_async(url, n, concurrency, proxies=None, retries=1):
+    async with AsyncAPIClient(url, retries=retries, proxies_list=proxies,
+                              backoff_base=0.01) as api:
+        t0 = time.perf_counter()
+        results = await api.gather([("get", "/ping")] * n, concurrency=concurrency)
+        rate = n / (time.perf_counter() - t0)
+        return rate, sum(r is not None for r in results) / n, api.health()
+
+
+def main(args):
+    target = StubServer(latency=args.latency)
+    n = args.requests
+    res = {
+        "sync_per_call_rps": round(bench_sync_per_call(target.url, n // 4), 1),
+        "sync_session_rps": round(bench_sync_session(target.url, n // 4), 1),
+    }
+    before = target.connections
+    rate, ok, _ = asyncio.run(bench_async(target.url, n, args.concurrency))
+    res["async_pooled_rps"] = round(rate, 1)
+    res["async_connections"] = target.connections - before
+    print(res)
+
+    # Прокси: здоровый, медленный и «сломанный» (половина ответов 503)
+    proxies = [StubServer(latency=args.latency), StubServer(latency=args.latency + 0.02),
+               StubServer(latency=args.latency, error_rate=0.5)]
+    rate, ok, health = asyncio.run(bench_async(target.url, n, args.concurrency,
+                                               proxies=[p.url for p in proxies], retries=3))
+    share = [round(p.hits / max(1, sum(q.hits for q in proxies)), 3) for p in proxies]
+    proxy_res = {"proxy_rps": round(rate, 1), "success_rate": round(ok, 4),
+                 "share_healthy_slow_broken": share}
+    print(proxy_res)
+    for h in health:
+        print(h)
+    for srv in [target, *proxies]:
+        srv.stop()
+    return {**res, **proxy_res}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--latency", type=float, default=0.002, help="задержка ответа заглушки, сек")
+    main(ap.parse_args())
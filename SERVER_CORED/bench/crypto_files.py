@@ -0,0 +1,63 @@
+"""Пропускная способность encrypt_file / decrypt_file (МБ/с) на файлах разного размера.
+
+KEK кешируется (как в приложении), поэтому на больших файлах замеряется AEAD и ввод-вывод,
+а на маленьких заметна цена открытия файла и PBKDF2 первого вызова.
+
+    python -m bench.crypto_files --sizes 4096,1048576,16777216,67108864 --repeat 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from modules import crypto_module as cm
+
+
+def run_case(tmp, size, repeat):
+    src = os.path.join(tmp, f"plain_{size}.bin")
+    with open(src, "wb") as f:
+        left = size
+        while left:
+            n = min(left, cm.READ_CHUNK)
+            f.write(os.urandom(n))
+            left -= n
+    enc_s = dec_s = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        enc_path = cm.encrypt_file(src, "bench-password")
+        enc_s = min(enc_s, time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        cm.decrypt_file(enc_path, "bench-password", src + ".out")
+        dec_s = min(dec_s, time.perf_counter() - t0)
+    assert os.path.getsize(src + ".out") == size
+    for path in (src, src + ".out", enc_path):
+        os.remove(path)
+    mb = size / (1024 * 1024)
+    return {
+        "size": size,
+        "encrypt_mb_s": round(mb / enc_s, 1),
+        "decrypt_mb_s": round(mb / dec_s, 1),
+        "encrypt_ms": round(enc_s * 1000, 3),
+        "decrypt_ms": round(dec_s * 1000, 3),
+    }
+
+
+def main(args):
+    tmp = tempfile.mkdtemp(prefix="bench_files_")
+    cm.ENC_DIR = tmp        # encrypt_file пишет в ENC_DIR — рабочий каталог не трогаем
+    # Прогрев KEK-кеша, чтобы PBKDF2 не попадал в замер первого размера
+    cm.encrypt_file(__file__, "bench-password")
+    results = []
+    for size in args.sizes:
+        res = run_case(tmp, size, args.repeat)
+        print(res)
+        results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")],
+                    default=[4096, 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024])
+    ap.add_argument("--repeat", type=int, default=3)
+    main(ap.parse_args())
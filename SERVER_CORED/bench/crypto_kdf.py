@@ -0,0 +1,52 @@
+"""Файлов в секунду для пачки маленьких документов: PBKDF2 на каждый файл против кеша KEK.
+
+    python -m bench.crypto_kdf --files 500 --size 4096 --iterations 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from modules import crypto_module as cm
+
+
+def run_case(name, cache, files, payload, iterations):
+    cm.KEK_CACHE = cache
+    tmp = tempfile.mkdtemp(prefix="bench_kdf_")
+    t0 = time.perf_counter()
+    for i in range(files):
+        path = os.path.join(tmp, f"doc{i}.enc")
+        w = cm.EncryptedWriter(path, "bench-password", iterations=iterations)
+        w.write(payload)
+        w.close()
+    t_enc = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(files):
+        for _ in cm.iter_decrypted(os.path.join(tmp, f"doc{i}.enc"), "bench-password"):
+            pass
+    t_dec = time.perf_counter() - t0
+    return {
+        "case": name,
+        "encrypt_files_per_sec": round(files / t_enc, 1),
+        "decrypt_files_per_sec": round(files / t_dec, 1),
+        "pbkdf2_calls": cache.misses,
+    }
+
+
+def main(args):
+    payload = os.urandom(args.size)
+    results = []
+    for name, cache in (("no_cache", cm.KekCache(maxsize=0)),
+                        ("kek_cache", cm.KekCache(maxsize=256, ttl=600))):
+        res = run_case(name, cache, args.files, payload, args.iterations)
+        print(res)
+        results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--files", type=int, default=500)
+    ap.add_argument("--size", type=int, default=4096)
+    ap.add_argument("--iterations", type=int, default=cm.KDF_ITERATIONS)
+    main(ap.parse_args())
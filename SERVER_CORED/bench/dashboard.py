@@ -0,0 +1,95 @@
+"""Время ответа admin_dashboard (GET /admin, с рендером шаблона) на таблицах разного размера.
+
+Приложение поднимается в процессе через TestClient на временном DATA_DIR; для каждого размера
+таблица users заполняется заново.
+
+    python -m bench.dashboard --sizes 1000,100000,1000000 --requests 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from modules.db_core import DBWorker, encode_cursor
+
+ROLES = ("user", "user", "user", "manager", "admin")
+
+
+async def _open(db_path: str):
+    return DBWorker(db_path)._sync_open()     # DBWorker создаётся только внутри цикла событий
+
+
+def _seed(db_path: str, size: int, rnd: random.Random):
+    conn = asyncio.run(_open(db_path))
+    conn.execute("BEGIN")
+    batch = 50000
+    for start in range(0, size, batch):
+        conn.executemany(
+            "INSERT INTO users(login, full_name, iin, pwd, phone, role, created_at, is_blocked, "
+            "is_deleted) VALUES(?, ?, ?, 'x', ?, ?, ?, ?, ?)",
+            ((f"user{i:07d}", f"User {i}", f"iin{i:07d}", f"+7{i:010d}", rnd.choice(ROLES),
+              f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:00:00",
+              int(rnd.random() < 0.02), int(rnd.random() < 0.05))
+             for i in range(start, min(size, start + batch))))
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def _views(size: int):
+    return {
+        "first_page": {},
+        "role_filter": {"role": "admin"},
+        "created_desc": {"order": "created_at", "desc": "true"},
+        "deep_page": {"after": encode_cursor([f"user{size // 2:07d}"])},
+    }
+
+
+def run_case(app_main, client_cls, size, requests, rnd):
+    tmp = tempfile.mkdtemp(prefix="bench_dash_")
+    db_path = os.path.join(tmp, "users.db")
+    t0 = time.perf_counter()
+    _seed(db_path, size, rnd)
+    seed_s = time.perf_counter() - t0
+    app_main.DB_PATH = db_path
+    res = {"size": size, "seed_s": round(seed_s, 1)}
+    with client_cls(app_main.app) as client:
+        for name, params in _views(size).items():
+            for _ in range(3):
+                client.get("/admin", params=params)
+            lat = []
+            for _ in range(requests):
+                t0 = time.perf_counter()
+                r = client.get("/admin", params=params)
+                lat.append(time.perf_counter() - t0)
+                assert r.status_code == 200, r.status_code
+            lat.sort()
+            res[f"{name}_p50_ms"] = round(statistics.median(lat) * 1000, 3)
+            res[f"{name}_p99_ms"] = round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 3)
+    return res
+
+
+def main(args):
+    # Пути приложения читаются при импорте main — подменяем их до импорта
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench_dash_app_")
+    os.environ["BACKUP_INTERVAL"] = "0"
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    rnd = random.Random(1)
+    results = []
+    for size in args.sizes:
+        res = run_case(app_main, TestClient, size, args.requests, rnd)
+        print(res)
+        results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")],
+                    default=[1000, 100000, 1000000])
+    ap.add_argument("--requests", type=int, default=50)
+    main(ap.parse_args())
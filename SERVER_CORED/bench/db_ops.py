@@ -0,0 +1,104 @@
+"""Пропускная способность и хвостовые задержки операций DBProducer при разной конкурентности.
+
+Каждая операция замеряется отдельно на заранее заполненной базе; bcrypt — с BCRYPT_ROUNDS=4,
+чтобы замерялась БД, а не хеш.
+
+    python -m bench.db_ops --users 10000 --ops 2000 --concurrency 1,16,64
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from modules.db_core import DBProducer, DBWorker
+from modules.hasher import PasswordHasher
+
+OPS = ("get_user", "check_free", "check_free_bulk", "auth", "update_contacts", "add_user")
+BULK_CANDIDATES = 1000     # кандидатов на поле в одном вызове check_free_bulk
+
+
+def _seed(worker: DBWorker, users: int, pwd: str):
+    conn = worker._sync_open()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users(login, full_name, iin, pwd, phone, role) VALUES(?, ?, ?, ?, ?, ?)",
+        ((f"user{i:07d}", f"User {i}", f"iin{i:07d}", pwd, f"+7{i:010d}", "user")
+         for i in range(users)))
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def _call(producer: DBProducer, op: str, users: int, seq):
+    login = f"user{random.randrange(users):07d}"
+    if op == "get_user":
+        return producer.get_user(login)
+    if op == "check_free":
+        return producer.check_free(login=login, phone=f"+7{random.randrange(users):010d}")
+    if op == "check_free_bulk":
+        return producer.check_free_bulk(
+            logins=[f"user{random.randrange(users * 2):07d}" for _ in range(BULK_CANDIDATES)],
+            phones=[f"+7{random.randrange(users * 2):010d}" for _ in range(BULK_CANDIDATES)])
+    if op == "auth":
+        return producer.auth(login, "bench-password")
+    if op == "update_contacts":
+        return producer.update_contacts(login, full_name=f"Renamed {next(seq)}")
+    n = next(seq)
+    return producer.add_user(f"new{n:08d}", "bench-password", "New", f"+8{n:010d}", iin=f"new{n}")
+
+
+async def run_case(producer, op, users, ops, concurrency, seq):
+    lat = []
+    left = itertools.count()
+
+    async def client():
+        while next(left) < ops:
+            t0 = time.perf_counter()
+            await _call(producer, op, users, seq)
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "op": op,
+        "concurrency": concurrency,
+        "ops_per_sec": round(len(lat) / elapsed, 1),
+        "p50_ms": round(lat[len(lat) // 2] * 1000, 3),
+        "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 3),
+    }
+
+
+async def main(args):
+    tmp = tempfile.mkdtemp(prefix="bench_ops_")
+    hasher = PasswordHasher(rounds=4, use_processes=False)
+    worker = DBWorker(db_path=os.path.join(tmp, "users.db"), backup_dir=os.path.join(tmp, "b"))
+    _seed(worker, args.users, await hasher.hash("bench-password"))
+    task = asyncio.create_task(worker.run())
+    await worker.ready.wait()
+    producer = DBProducer(hasher=hasher)
+    seq = itertools.count()
+    results = []
+    try:
+        for op in args.ops_list:
+            for c in args.concurrency:
+                res = await run_case(producer, op, args.users, args.ops, c, seq)
+                print(res)
+                results.append(res)
+    finally:
+        task.cancel()
+        hasher.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--users", type=int, default=10000)
+    ap.add_argument("--ops", type=int, default=2000, help="операций на каждый замер")
+    ap.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")],
+                    default=[1, 16, 64])
+    ap.add_argument("--ops-list", type=lambda s: s.split(","), default=list(OPS))
+    asyncio.run(main(ap.parse_args()))
@@ -0,0 +1,79 @@
+"""Операции DocumentDatabase в секунду: новое соединение на вызов против соединения потока.
+
+«fresh» повторяет прежнее поведение get_connection() — sqlite3.connect() без прагм на каждый вызов.
+
+    python -m bench.document_db --ops 20000 --threads 1,4
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.database import DocumentDatabase
+
+
+class FreshConnectionDatabase(DocumentDatabase):
+    """Прежнее поведение: новое соединение на каждый запрос, без прагм."""
+
+    def get_connection(self):
+        conn = self._local.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return conn
+
+    def execute(self, sql, params=()):
+        # Внутри `with self.get_connection():` — то же соединение, иначе новое (как было раньше)
+        conn = self._local.__dict__.pop("conn", None) or self.get_connection()
+        self._local.conn = None
+        return conn.execute(sql, params)
+
+
+def _run(db, op, n, threads):
+    def work(tid):
+        for i in range(n // threads):
+            if op == "user_exists":
+                db.user_exists(f"user{(tid * 7919 + i) % 1000}")
+            elif op == "verify_user":
+                db.verify_user(f"user{i % 1000}", "secret")
+            else:
+                db.add_user(f"new{tid}_{i}_{time.perf_counter_ns()}", "secret")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(work, range(threads)))
+    return n / (time.perf_counter() - t0)
+
+
+def run_case(mode, op, n, threads):
+    tmp = tempfile.mkdtemp(prefix="bench_docdb_")
+    path = os.path.join(tmp, "docs.db")
+    db = (DocumentDatabase if mode == "reuse" else FreshConnectionDatabase)(path)
+    pwd = hashlib.sha256(b"secret").hexdigest()
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                         ((f"user{i}", pwd) for i in range(1000)))
+    ops = _run(db, op, n if op != "add_user" else n // 10, threads)
+    if mode == "reuse":
+        db.close()
+    return {"mode": mode, "op": op, "threads": threads, "ops_per_sec": round(ops, 1)}
+
+
+def main(args):
+    results = []
+    for op in args.ops_list:
+        for threads in args.threads:
+            for mode in ("fresh", "reuse"):
+                res = run_case(mode, op, args.ops, threads)
+                print(res)
+                results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--ops", type=int, default=20000)
+    ap.add_argument("--threads", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4])
+    ap.add_argument("--ops-list", type=lambda s: s.split(","),
+                    default=["user_exists", "verify_user", "add_user"])
+    main(ap.parse_args())
@@ -0,0 +1,89 @@
+"""Задержка search_documents (FTS5) в зависимости от числа документов, в сравнении с LIKE.
+
+    python -m bench.document_search --sizes 1000,10000,100000,1000000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from modules.database import DocumentDatabase
+
+CATEGORIES = ("contracts", "reports", "scans", "invoices", "hr", "legal", "misc", "ids")
+LIKE_SQL = "SELECT * FROM documents WHERE filename LIKE ? OR tags LIKE ? OR category LIKE ?"
+
+
+def _vocab(n, rnd):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rnd.choice(letters) for _ in range(rnd.randint(4, 9))) for _ in range(n)]
+
+
+def _fill(db, size, rnd, words, tags):
+    conn = db.get_connection()
+    batch = 10000
+    for start in range(0, size, batch):
+        docs = []
+        for i in range(start, min(size, start + batch)):
+            docs.append((i + 1, f"{rnd.choice(words)}_{rnd.choice(words)}_doc{i:07d}.pdf",
+                         f"/data/{i}.enc", rnd.choice(CATEGORIES),
+                         ", ".join(rnd.sample(tags, 2)), "2024-01-01T00:00:00", ""))
+        with conn:
+            conn.executemany("INSERT INTO documents (id, filename, filepath, category, tags, "
+                             "date_added, encryption_key) VALUES (?, ?, ?, ?, ?, ?, ?)", docs)
+    # Прямой INSERT в documents: FTS обновили триггеры, document_tags — пересобираем
+    db.rebuild_tags()
+
+
+def _timed(fn, n):
+    lat = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(i)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return {"p50_ms": round(statistics.median(lat) * 1000, 3),
+            "p95_ms": round(lat[int(len(lat) * 0.95) - 1] * 1000, 3)}
+
+
+def run_case(size, queries, with_like, seed=1):
+    rnd = random.Random(seed)
+    words, tags = _vocab(5000, rnd), _vocab(500, rnd)
+    db = DocumentDatabase(os.path.join(tempfile.mkdtemp(prefix="bench_search_"), "docs.db"))
+    _fill(db, size, rnd, words, tags)
+
+    res = {"documents": size}
+    # Номер документа (префикс): несколько совпадений при любом размере
+    res["fts_serial"] = _timed(lambda i: db.search_documents(f"doc{rnd.randrange(size):07d}"[:-1]),
+                               queries)
+    # Тег + категория, первая страница
+    res["tag_category"] = _timed(lambda i: db.search_documents(
+        tags=rnd.choice(tags), category=rnd.choice(CATEGORIES), limit=20), queries)
+    # Слово из имени файла + категория, первая страница по bm25
+    res["fts_word"] = _timed(lambda i: db.search_documents(
+        rnd.choice(words), category=rnd.choice(CATEGORIES), limit=20), queries)
+    if with_like:
+        res["like_word"] = _timed(lambda i: db.execute(
+            LIKE_SQL, (f"%{rnd.choice(words)}%",) * 3).fetchall(), max(3, queries // 20))
+    db.close()
+    return res
+
+
+def main(args):
+    results = []
+    for size in args.sizes:
+        res = run_case(size, args.queries, with_like=size <= args.like_max)
+        print(res)
+        results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")],
+                    default=[1000, 10000, 100000])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--like-max", type=int, default=100000,
+                    help="LIKE замеряется только до этого размера")
+    main(ap.parse_args())
@@ -0,0 +1,133 @@
+"""Нагрузочный тест HTTP: один uvicorn-воркер против N воркеров с процессом-владельцем БД.
+
+Режимы:
+    inproc     — uvicorn --workers 1, DBWorker внутри процесса (как раньше);
+    owner-N    — python -m modules.db_server + uvicorn --workers N с DB_SOCKET.
+Нагрузка — смесь GET /api/users (чтение) и POST /admin/add_user (запись, bcrypt с BCRYPT_ROUNDS=4).
+Данные — во временном DATA_DIR, рабочий users.db не трогается.
+
+    python -m bench.multiprocess --workers 1,4 --concurrency 64 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(url: str, procs, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            if any(p.poll() is not None for p in procs):
+                raise RuntimeError("Процесс сервера завершился при старте")
+            try:
+                if (await client.get(url + "/api/users?limit=1")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError("Сервер не поднялся")
+            await asyncio.sleep(0.2)
+
+
+async def _load(url: str, concurrency: int, duration: float, write_ratio: float) -> dict:
+    lat, codes, seq = [], {}, itertools.count()
+    tag = os.urandom(3).hex()
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def one(client):
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            if random.random() < write_ratio:
+                n = next(seq)
+                r = await client.post("/admin/add_user", data={
+                    "login": f"u{tag}{n}", "password": "pw", "full_name": "Bench",
+                    "phone": f"+{tag}{n}", "iin": f"{tag}{n}"})
+            else:
+                r = await client.get("/api/users", params={"limit": 20})
+            lat.append(time.perf_counter() - t0)
+            codes[r.status_code] = codes.get(r.status_code, 0) + 1
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(client) for _ in range(concurrency)),
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - t0
+    errors = sum(isinstance(r, Exception) for r in results)
+    lat.sort()
+    return {
+        "requests": len(lat),
+        "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": round(lat[len(lat) // 2] * 1000, 2) if lat else None,
+        "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 2) if lat else None,
+        "codes": codes,
+        "client_errors": errors,
+    }
+
+
+def run_mode(mode: str, workers: int, concurrency: int, duration: float,
+             write_ratio: float) -> dict:
+    tmp = tempfile.mkdtemp(prefix="bench_mp_")
+    port = _free_port()
+    env = dict(os.environ, DATA_DIR=tmp, BCRYPT_ROUNDS="4", LOG_LEVEL="WARNING",
+               LOG_DIR=os.path.join(tmp, "logs"), BACKUP_INTERVAL="0")
+    procs = []
+    try:
+        if mode == "owner":
+            env["DB_SOCKET"] = os.path.join(tmp, "db.sock")
+            procs.append(subprocess.Popen([sys.executable, "-m", "modules.db_server"],
+                                          cwd=APP_DIR, env=env))
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+            cwd=APP_DIR, env=env))
+        url = f"http://127.0.0.1:{port}"
+
+        async def go():
+            await _wait_ready(url, procs)
+            return await _load(url, concurrency, duration, write_ratio)
+
+        res = asyncio.run(go())
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+            p.wait(10)
+    res = dict({"mode": "inproc" if mode == "inproc" else f"owner-{workers}",
+                "workers": workers}, **res)
+    print(res)
+    return res
+
+
+def run(workers=(1, 4), concurrency: int = 64, duration: float = 10.0,
+        write_ratio: float = 0.2) -> list:
+    results = [run_mode("inproc", 1, concurrency, duration, write_ratio)]
+    for n in workers:
+        results.append(run_mode("owner", n, concurrency, duration, write_ratio))
+    return results
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--workers", default="1,4")
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--write-ratio", type=float, default=0.2)
+    a = p.parse_args()
+    run([int(x) for x in a.workers.split(",")], a.concurrency, a.duration, a.write_ratio)
@@ -0,0 +1,90 @@
+"""Пропускная способность чтения (get_user/check_free) под одновременной нагрузкой записи.
+
+Сравнивает чтение через очередь воркера (read_pool_size=0) и через пул read-only соединений.
+
+    python -m bench.read_pool --readers 32 --writers 8 --duration 5 --pool-sizes 0,2,4,8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from modules.db_core import DBProducer, DBWorker
+
+# Готовый bcrypt-хеш: бенчмарк меряет БД, а не хеширование
+PWD_HASH = "$2b$12$C6UzMDM.H6dfI/f/IKcEeO5bD1jHdXGzHLlqcnbZ6fCvSOgrE5o2a"
+
+
+async def _writer(producer, wid, stop, counter):
+    i = 0
+    while not stop.is_set():
+        await producer._call("add", login=f"w{wid}_{i}@bench", pwd=PWD_HASH,
+                             full_name="Bench Writer", phone=f"+7{wid:03d}{i:09d}",
+                             role="user", iin=f"{wid:03d}{i:09d}")
+        counter[0] += 1
+        i += 1
+
+
+async def _reader(producer, rid, stop, latencies):
+    i = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        if i % 2:
+            await producer.get_user(f"seed{(rid * 7919 + i) % 1000}@bench")
+        else:
+            await producer.check_free(login=f"seed{i % 1000}@bench", phone="+70000000000")
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+
+
+async def run_case(pool_size, readers, writers, duration):
+    tmp = tempfile.mkdtemp(prefix="bench_read_pool_")
+    worker = DBWorker(db_path=os.path.join(tmp, "users.db"),
+                      backup_dir=os.path.join(tmp, "backups"),
+                      read_pool_size=pool_size)
+    task = asyncio.create_task(worker.run())
+    producer = DBProducer()
+    await asyncio.gather(*(producer._call("add", login=f"seed{i}@bench", pwd=PWD_HASH,
+                                          full_name="Seed", phone=f"+71{i:09d}",
+                                          role="user", iin=f"1{i:011d}")
+                           for i in range(1000)))
+
+    stop = asyncio.Event()
+    latencies, written = [], [0]
+    jobs = [asyncio.create_task(_writer(producer, w, stop, written)) for w in range(writers)]
+    jobs += [asyncio.create_task(_reader(producer, r, stop, latencies)) for r in range(readers)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*jobs)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    latencies.sort()
+    return {
+        "pool_size": pool_size,
+        "reads_per_sec": round(len(latencies) / duration, 1),
+        "writes_per_sec": round(written[0] / duration, 1),
+        "read_p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "read_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+async def main(args):
+    results = []
+    for size in args.pool_sizes:
+        res = await run_case(size, args.readers, args.writers, args.duration)
+        print(res)
+        results.append(res)
+    return results
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--readers", type=int, default=32)
+    ap.add_argument("--writers", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=5.0)
+    ap.add_argument("--pool-sizes", type=lambda s: [int(x) for x in s.split(",")],
+                    default=[0, 4])
+    asyncio.run(main(ap.parse_args()))
@@ -0,0 +1,181 @@
+"""Набор бенчмарков одним запуском: результаты в JSON и сравнение с сохранённой базовой линией.
+
+Всё работает офлайн, на временных каталогах: рабочие users.db, documents.db и encrypted_docs
+не трогаются. Профиль quick — минуты, для проверки перед коммитом; full — размеры из задач
+(таблицы до 1M пользователей, файлы до 64 МБ).
+
+    python -m bench.suite --profile quick --out baseline.json
+    python -m bench.suite --profile quick --out current.json --compare baseline.json
+    python -m bench.suite --compare baseline.json current.json      # без запуска
+Код выхода 1, если хотя бы одна метрика хуже базовой больше чем на --threshold.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+from argparse import Namespace
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_OPS = ["get_user", "check_free", "check_free_bulk", "auth", "update_contacts", "add_user"]
+MB = 1024 * 1024
+
+
+def _http(args):
+    from bench import multiprocess
+    return [dict(multiprocess.run_mode("inproc", 1, c, args.duration, args.write_ratio),
+                 concurrency=c) for c in args.concurrency]
+
+
+# имя -> (модуль с main(args) или функция, поля-ключ записи, параметры по профилям)
+SUITE = {
+    "db_ops": ("bench.db_ops", ("op", "concurrency"), {
+        "quick": dict(users=2000, ops=500, concurrency=[1, 16], ops_list=DB_OPS),
+        "full": dict(users=100000, ops=5000, concurrency=[1, 16, 64], ops_list=DB_OPS),
+    }),
+    "dashboard": ("bench.dashboard", ("size",), {
+        "quick": dict(sizes=[1000, 100000], requests=20),
+        "full": dict(sizes=[1000, 100000, 1000000], requests=50),
+    }),
+    "crypto_files": ("bench.crypto_files", ("size",), {
+        "quick": dict(sizes=[4096, MB, 16 * MB], repeat=2),
+        "full": dict(sizes=[4096, MB, 16 * MB, 64 * MB], repeat=3),
+    }),
+    "document_search": ("bench.document_search", ("documents",), {
+        "quick": dict(sizes=[1000, 10000], queries=100, like_max=10000),
+        "full": dict(sizes=[1000, 100000, 1000000], queries=200, like_max=100000),
+    }),
+    "http": (_http, ("mode", "workers", "concurrency"), {
+        "quick": dict(concurrency=[16], duration=5.0, write_ratio=0.2),
+        "full": dict(concurrency=[16, 64], duration=15.0, write_ratio=0.2),
+    }),
+}
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run(names, profile: str) -> dict:
+    report = {
+        "meta": {
+            "profile": profile,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "git_rev": _git_rev(),
+            "started": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": {},
+    }
+    for name in names:
+        target, key, profiles = SUITE[name]
+        params = profiles[profile]
+        print(f"--- {name} {params}", file=sys.stderr)
+        fn = importlib.import_module(target).main if isinstance(target, str) else target
+        # Бенчмарки печатают записи в stdout — уводим в stderr, чтобы JSON в stdout был чистым
+        with contextlib.redirect_stdout(sys.stderr):
+            res = fn(Namespace(**params))
+            if asyncio.iscoroutine(res):
+                res = asyncio.run(res)
+        report["results"][name] = {"key": list(key), "params": params, "records": res}
+    return report
+
+
+# --- Сравнение ---
+def _direction(metric: str) -> int:
+    """+1 — больше лучше, -1 — меньше лучше, 0 — не метрика (счётчики, коды ответов)."""
+    name = metric.rsplit(".", 1)[-1]
+    if "per_sec" in name or name == "rps" or name.endswith("_mb_s"):
+        return 1
+    if name.endswith(("_ms", "_s", "seconds")) and not name.startswith("seed"):
+        return -1
+    return 0
+
+
+def _flatten(record: dict, prefix: str = ""):
+    for k, v in record.items():
+        if isinstance(v, dict):
+            yield from _flatten(v, f"{prefix}{k}.")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield prefix + k, v
+
+
+def compare(base: dict, cur: dict, threshold: float):
+    """Список (регрессия?, строка отчёта) по метрикам, изменившимся больше чем на threshold."""
+    out = []
+    for name, section in cur["results"].items():
+        if name not in base["results"]:
+            continue
+        key = section["key"]
+        base_by_key = {tuple(r.get(k) for k in key): r for r in base["results"][name]["records"]}
+        for rec in section["records"]:
+            rk = tuple(rec.get(k) for k in key)
+            old = base_by_key.get(rk)
+            if old is None:
+                continue
+            old_metrics = dict(_flatten(old))
+            label = " ".join(f"{k}={v}" for k, v in zip(key, rk))
+            for metric, value in _flatten(rec):
+                sign = _direction(metric)
+                was = old_metrics.get(metric)
+                if not sign or not was:
+                    continue
+                change = (value - was) / was
+                if abs(change) <= threshold:
+                    continue
+                worse = change * sign < 0
+                out.append((worse, f"{'REGRESSION' if worse else 'improved  '} {name} {label} "
+                                   f"{metric}: {was} -> {value} ({change:+.0%})"))
+    return out
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(args):
+    if args.compare and len(args.compare) == 2:
+        base, report = _load(args.compare[0]), _load(args.compare[1])
+    else:
+        report = run(args.only or list(SUITE), args.profile)
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.out == "-":
+            print(text)
+        else:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+            print(f"Результаты: {args.out}", file=sys.stderr)
+        if not args.compare:
+            return 0
+        base = _load(args.compare[0])
+    if base["meta"].get("profile") != report["meta"].get("profile"):
+        print("Внимание: профили базовой линии и текущего запуска различаются", file=sys.stderr)
+    rows = compare(base, report, args.threshold)
+    for _, line in rows:
+        print(line, file=sys.stderr)
+    regressions = sum(worse for worse, _ in rows)
+    print(f"Регрессий: {regressions} (порог {args.threshold:.0%})", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profile", choices=("quick", "full"), default="quick")
+    ap.add_argument("--only", type=lambda s: s.split(","), help=f"из: {','.join(SUITE)}")
+    ap.add_argument("--out", default="-", help="файл JSON с результатами (- — stdout)")
+    ap.add_argument("--compare", nargs="+", metavar="JSON",
+                    help="базовая линия [и готовый результат вместо запуска]")
+    ap.add_argument("--threshold", type=float, default=0.2,
+                    help="допустимое ухудшение, доля (0.2 = 20%%)")
+    sys.exit(main(ap.parse_args()))
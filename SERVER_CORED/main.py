@@ -1,48 +1,148 @@
 
-from fastapi import FastAPI, HTTPException, Form, UploadFile, File
+from fastapi import FastAPI, HTTPException, Form, Depends, Query, Header
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from starlette.requests import ClientDisconnect
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from contextlib import asynccontextmanager
-from modules.db_core import DBProducer, DBWorker
-import sqlite3
+from typing import Literal, Optional
+from urllib.parse import urlencode, quote
+from modules.db_core import DBProducer, DBWorker, DBBusy, PAGE_SIZE, PAGE_SIZE_MAX, sql_timestamp
+from modules.hasher import get_hasher
+from modules.utils import iter_multipart
+from modules.user_import import ImportJob, run_import_file, spool
+from modules.user_export import UserExport
+from modules import metrics
 import os
+import re
 import asyncio
-
-# --- БД: Добавляем колонку is_deleted, если её нет ---
-conn = sqlite3.connect("users.db")
-try:
-    conn.execute("ALTER TABLE users ADD COLUMN is_deleted INTEGER DEFAULT 0;")
-except sqlite3.OperationalError:
-    pass  # Колонка уже существует
-conn.commit()
-conn.close()
+import mimetypes
+import time
 
 # --- Конфигурация ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "users.db")
+DATA_DIR = os.getenv("DATA_DIR", BASE_DIR)     # базы, документы (encrypted_docs) и бэкапы
+DB_PATH = os.path.join(DATA_DIR, "users.db")
+DOCS_DB_PATH = os.path.join(DATA_DIR, "secure_storage.db")
+ENC_DIR = os.path.join(DATA_DIR, "encrypted_docs")           # старые *.enc, блобы и манифест
+BLOB_DIR = os.path.join(ENC_DIR, "blobs")
+BACKUP_DIR = os.path.join(DATA_DIR, "backups")
+BACKUP_INTERVAL = float(os.getenv("BACKUP_INTERVAL", 3600))    # 0 — без автобэкапа
+# Задан — users.db держит отдельный процесс (python -m modules.db_server), а этот процесс
+# (любой из uvicorn --workers N) шлёт ему записи через Unix-сокет
+DB_SOCKET = os.getenv("DB_SOCKET", "")
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    worker = DBWorker(db_path=DB_PATH)
-    task = asyncio.create_task(worker.run())
-    app.state.db_producer = DBProducer()
+    if DB_SOCKET:
+        from modules.db_server import RemoteDBProducer
+        task = None
+        app.state.db_producer = await RemoteDBProducer.connect(DB_SOCKET, DB_PATH)
+    else:
+        worker = DBWorker(db_path=DB_PATH, backup_dir=BACKUP_DIR,
+                          backup_interval=BACKUP_INTERVAL or None)
+        task = asyncio.create_task(worker.run())
+        # Схема (миграции users.db) готова до первого запроса; упавший старт — ошибка запуска
+        await asyncio.wait({task, asyncio.create_task(worker.ready.wait())},
+                           return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            task.result()
+        app.state.db_producer = DBProducer()
+    from modules.database import DocumentDatabase
+    app.state.documents = await asyncio.to_thread(DocumentDatabase, DOCS_DB_PATH, blob_dir=BLOB_DIR)
     yield
-    task.cancel()
+    # Незавершённые импорты сохраняют статус failed, пока очередь БД ещё работает
+    for t in list(_IMPORT_TASKS):
+        t.cancel()
+    await asyncio.gather(*_IMPORT_TASKS, return_exceptions=True)
+    app.state.documents.close()
+    if task is None:
+        app.state.db_producer.close()
+    else:
+        task.cancel()
+    get_hasher().shutdown()
 
 app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# --- Метрики ---
+_M_HTTP = metrics.histogram("http_request_seconds", "Время ответа (до заголовков) по маршруту",
+                            ("method", "route"))
+_M_HTTP_TOTAL = metrics.counter("http_requests_total", "HTTP-запросы", ("method", "route", "status"))
+
+@app.middleware("http")
+async def http_metrics(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Шаблон маршрута, а не сам путь: /admin/delete/{login}, а не по метке на каждого пользователя
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        _M_HTTP.labels(request.method, route).observe(time.perf_counter() - t0)
+        _M_HTTP_TOTAL.labels(request.method, route, str(status)).inc()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.exception_handler(DBBusy)
+async def db_busy_handler(request: Request, exc: DBBusy):
+    """Очередь БД переполнена или задача не дождалась исполнения — пусть клиент повторит позже."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+# --- Фильтры и пагинация списка пользователей (общие для страницы и API) ---
+_TRISTATE = {"0": False, "1": True, "all": None}
+
+def user_filters(
+    after: Optional[str] = None,
+    order: Literal["login", "created_at"] = "login",
+    desc: bool = False,
+    limit: int = Query(PAGE_SIZE, ge=1, le=PAGE_SIZE_MAX),
+    role: str = "",
+    blocked: Literal["0", "1", "all"] = "all",
+    deleted: Literal["0", "1", "all"] = "0",
+):
+    return {"after": after, "order": order, "desc": desc, "limit": limit,
+            "role": role, "blocked": blocked, "deleted": deleted}
+
+async def query_users(filters: dict, columns=None):
+    producer: DBProducer = app.state.db_producer
+    kw = dict(filters, role=filters["role"] or None,
+              blocked=_TRISTATE[filters["blocked"]],
+              deleted=_TRISTATE[filters["deleted"]])
+    if columns:
+        kw["columns"] = columns
+    try:
+        return await producer.list_users(**kw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # --- Главная страница админки ---
 @app.get("/", response_class=HTMLResponse)
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard(request: Request):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.execute("SELECT * FROM users WHERE is_deleted=0")
-        users = cursor.fetchall()
-    return templates.TemplateResponse("admin.html", {"request": request, "users": users})
+async def admin_dashboard(request: Request, filters: dict = Depends(user_filters)):
+    page = await query_users(filters)
+    next_url = None
+    if page["next"]:
+        params = {k: v for k, v in filters.items() if v not in (None, "")}
+        params["after"] = page["next"]
+        next_url = "/admin?" + urlencode(params)
+    return templates.TemplateResponse("admin.html", {
+        "request": request, "users": page["items"],
+        "filters": filters, "next_url": next_url,
+    })
+
+# --- Список пользователей в JSON ---
+@app.get("/api/users")
+async def api_users(filters: dict = Depends(user_filters),
+                    columns: Optional[str] = None):
+    cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    return await query_users(filters, cols)
 
 # --- Страница добавления пользователя ---
 @app.get("/admin/add_user_form", response_class=HTMLResponse)
@@ -66,6 +166,91 @@ async def add_user(
     await producer.add_user(login, password, full_name, phone, role, iin)
     return RedirectResponse("/admin", status_code=303)
 
+# --- Массовый импорт пользователей (CSV / NDJSON потоком) ---
+_IMPORT_TYPES = {"text/csv": "csv", "application/x-ndjson": "ndjson",
+                 "application/jsonl": "ndjson", "application/ndjson": "ndjson"}
+
+async def _import_body(request: Request):
+    """Байты файла: сырое тело или поле file из multipart/form-data."""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        current = None
+        async for ev in iter_multipart(request):
+            if ev[0] == "begin":
+                current = ev[1] if ev[2] is not None else None
+            elif ev[0] == "data":
+                if current == "file":
+                    yield ev[1]
+            else:
+                current = None
+    else:
+        async for chunk in request.stream():
+            yield chunk
+
+# Фоновые импорты: ссылка держит задачу до завершения; при остановке они отменяются
+_IMPORT_TASKS = set()
+
+@app.post("/admin/import", status_code=202)
+async def import_users(request: Request, format: Optional[Literal["csv", "ndjson"]] = None):
+    """Тело — во временный файл, импорт — в фоне; 202 с id сразу после загрузки, прогресс — GET /admin/import/{id}."""
+    ctype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    fmt = format or _IMPORT_TYPES.get(ctype)
+    try:
+        body = await spool(_import_body(request))
+    except ClientDisconnect:
+        return Response(status_code=400)   # клиенту уже не отправить; задача не создана
+    job = ImportJob(fmt)
+    producer: DBProducer = app.state.db_producer
+    try:
+        await producer.save_import_job(job.to_dict())
+    except BaseException:
+        body.close()
+        raise
+    task = asyncio.create_task(run_import_file(producer, body, job, fmt))
+    _IMPORT_TASKS.add(task)
+    task.add_done_callback(_IMPORT_TASKS.discard)
+    return JSONResponse(job.to_dict(), status_code=202)
+
+@app.get("/admin/import")
+async def import_jobs(limit: int = Query(20, ge=1, le=200)):
+    return await app.state.db_producer.list_import_jobs(limit)
+
+@app.get("/admin/import/{job_id}")
+async def import_status(job_id: str):
+    job = await app.state.db_producer.get_import_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача импорта не найдена")
+    return job
+
+# --- Выгрузка пользователей (CSV / NDJSON потоком) ---
+@app.get("/admin/export")
+async def export_users(
+    format: Literal["csv", "ndjson"] = "csv",
+    columns: Optional[str] = None,
+    gzip: bool = False,
+    role: str = "",
+    blocked: Literal["0", "1", "all"] = "all",
+    deleted: Literal["0", "1", "all"] = "0",
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+):
+    """Вся выборка одним ответом; память не зависит от числа строк (modules.user_export)."""
+    # Границы — в формате created_at ("2024-01-31T10:00" -> "2024-01-31 10:00:00")
+    try:
+        created_from, created_to = (sql_timestamp(v) if v else None
+                                    for v in (created_from, created_to))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="created_from/created_to: ожидается дата ISO 8601")
+    cols = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        export = UserExport(DB_PATH, format, cols, gzip, role=role or None,
+                            blocked=_TRISTATE[blocked], deleted=_TRISTATE[deleted],
+                            created_from=created_from, created_to=created_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(export.stream(), media_type=export.media_type, headers={
+        "Content-Disposition": f'attachment; filename="{export.filename}"',
+    })
+
 # --- Удаление пользователя (мягкое удаление) ---
 @app.get("/admin/delete/{login}")
 async def delete_user(login: str):
@@ -87,33 +272,187 @@ async def admin_unblock_user(login: str):
     await producer.unblock(login)
     return RedirectResponse("/admin", status_code=303)
 
+# --- Задержки bcrypt: для подбора размера пула хеширования ---
+@app.get("/admin/hasher_stats")
+async def hasher_stats():
+    return JSONResponse(get_hasher().stats())
+
 # --- Создание резервной копии БД ---
 @app.get("/admin/backup")
 async def admin_backup():
     producer: DBProducer = app.state.db_producer
-    await producer.backup("manual_backup")
+    await producer.backup("manual_backup", force=True)
     return RedirectResponse("/admin", status_code=303)
 
 @app.get("/admin/upload_document_form", response_class=HTMLResponse)
 async def upload_document_form(request: Request):
     return templates.TemplateResponse("upload_document.html", {"request": request})
 
+# --- Загрузка документа: поток шифруется по частям прямо в encrypted_docs/ ---
+UPLOAD_CHUNK = 1024 * 1024
+
 @app.post("/admin/upload_document")
-async def upload_document(file: UploadFile = File(...), password: str = Form(...)):
-    from modules.crypto_module import encrypt_file
-    upload_dir = os.path.join(BASE_DIR, "uploads")
-    os.makedirs(upload_dir, exist_ok=True)
+async def upload_document(request: Request):
+    # Поля password (обязательно), category и tags должны идти перед файлом
+    fields, current, upload, safe_name = {}, None, None, None
+    buf = bytearray()
+    try:
+        async for ev in iter_multipart(request):
+            if ev[0] == "begin":
+                _, name, filename = ev
+                current = name
+                if filename is None:
+                    fields[name] = bytearray()
+                elif name == "file" and upload is None:
+                    if not fields.get("password"):
+                        raise HTTPException(status_code=400,
+                                            detail="Поле password должно идти перед файлом")
+                    safe_name = os.path.basename(filename)
+                    if not safe_name:
+                        raise HTTPException(status_code=400, detail="Пустое имя файла")
+                    upload = await asyncio.to_thread(app.state.documents.blobs.begin)
+                else:
+                    current = None
+            elif ev[0] == "data":
+                if current == "file" and upload is not None:
+                    buf += ev[1]
+                    if len(buf) >= UPLOAD_CHUNK:
+                        await asyncio.to_thread(upload.write, bytes(buf))
+                        buf.clear()
+                elif current in fields and len(fields[current]) < 4096:
+                    fields[current] += ev[1]
+            else:
+                current = None
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Файл не передан")
+        await asyncio.to_thread(upload.write, bytes(buf))
+        text = {k: v.decode() for k, v in fields.items()}
+        await asyncio.to_thread(upload.commit, safe_name, text["password"],
+                                text.get("category") or None, text.get("tags"))
+    except ValueError as e:
+        if upload is not None:
+            await asyncio.to_thread(upload.abort)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        if upload is not None:
+            await asyncio.to_thread(upload.abort)
+        raise
 
-    file_path = os.path.join(upload_dir, file.filename)
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    return RedirectResponse("/admin", status_code=303)
 
-    # Шифруем файл
-    encrypt_file(file_path, password)
-    os.remove(file_path)  # Удаляем открытый файл после шифрования
+@app.post("/admin/documents/gc")
+async def documents_gc():
+    documents = app.state.documents
+    removed = await asyncio.to_thread(documents.blobs.gc)
+    return {"removed": removed, "store": await asyncio.to_thread(documents.blobs.stats)}
 
-    return RedirectResponse("/admin", status_code=303)
+# --- Скачивание документа: расшифровка на лету, поддержка Range ---
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+def parse_range(header: Optional[str], size: int):
+    """(start, end) для одного диапазона из заголовка Range; None — отдать файл целиком.
+
+    end не включается. Несколько диапазонов не поддерживаем и отдаём файл целиком (RFC 9110
+    это допускает). Неудовлетворимый диапазон — ValueError.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    first, last = m.group(1), m.group(2)
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    else:
+        start, end = max(0, size - int(last)), size
+    if start >= size or start >= end:
+        raise ValueError("Диапазон вне файла")
+    return start, end
+
+# Пароль — только в заголовке X-Document-Password или в теле POST (форма): в URL он попал бы
+# в журналы доступа, прокси, историю браузера и метки запросов
+@app.get("/admin/documents/{name}")
+async def download_document(
+    name: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    x_document_password: Optional[str] = Header(None),
+):
+    return await send_document(name, x_document_password, range_header)
+
+@app.post("/admin/documents/{name}")
+async def download_document_form(
+    name: str,
+    password: str = Form(...),
+    range_header: Optional[str] = Header(None, alias="Range"),
+):
+    return await send_document(name, password, range_header)
+
+async def send_document(name: str, password: Optional[str], range_header: Optional[str]):
+    from modules.crypto_module import EncryptedReader
+    from cryptography.exceptions import InvalidTag
+    if not password:
+        raise HTTPException(status_code=401, detail="Нужен пароль документа")
+    safe_name = os.path.basename(name)
+    if not safe_name:
+        raise HTTPException(status_code=404, detail="Документ не найден")
+    try:
+        reader = await asyncio.to_thread(app.state.documents.blobs.open, safe_name, password)
+        if reader is None:
+            # Документы, загруженные до хранилища блобов: encrypted_docs/<имя>.enc
+            path = os.path.join(ENC_DIR, safe_name + ".enc")
+            if not os.path.isfile(path):
+                raise HTTPException(status_code=404, detail="Документ не найден")
+            reader = await asyncio.to_thread(EncryptedReader, path, password)
+    except InvalidTag:
+        raise HTTPException(status_code=403, detail="Неверный пароль или файл повреждён")
+
+    try:
+        rng = parse_range(range_header, reader.size)
+    except ValueError:
+        reader.close()
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{reader.size}"})
+    start, end = rng or (0, reader.size)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start),
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(safe_name)}",
+    }
+    if rng:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{reader.size}"
+
+    def body():
+        # Синхронный генератор: Starlette крутит его в пуле потоков, расшифровка не блокирует цикл
+        try:
+            yield from reader.iter_range(start, end)
+        finally:
+            reader.close()
+
+    media_type = mimetypes.guess_type(safe_name)[0] or "application/octet-stream"
+    return StreamingResponse(body(), status_code=206 if rng else 200,
+                             media_type=media_type, headers=headers)
+
+# --- Манифест хранилища: целостность всех документов одной проверкой подписи ---
+@app.post("/admin/manifest")
+async def rebuild_manifest():
+    from modules import crypto_module
+    try:
+        manifest = await asyncio.to_thread(crypto_module.build_manifest, ENC_DIR)
+    except FileNotFoundError as e:
+        if e.filename != crypto_module.PRIVATE_KEY_FILE:
+            raise
+        raise HTTPException(status_code=409, detail="Ключ подписи не создан: нет keys/private_key.pem "
+                                                    "(crypto_module.generate_rsa_keys())")
+    return {"root": manifest["root"], "files": len(manifest["files"]),
+            "created_at": manifest["created_at"]}
+
+@app.get("/admin/manifest")
+async def check_manifest():
+    from modules.crypto_module import verify_manifest
+    try:
+        return await asyncio.to_thread(verify_manifest, ENC_DIR)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Манифест ещё не создан")
 
 # --- Запуск сервера ---
 if __name__ == "__main__":
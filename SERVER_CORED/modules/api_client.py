@@ -1,8 +1,142 @@
 import requests
+import httpx
+import asyncio
+import ssl
+import threading
+import time
 from modules.logger import Logger
+from modules.retry import backoff_delay
 import random
 
-log = Logger()
+log = Logger("api_client")
+
+# --- Повторы и здоровье прокси ---
+BACKOFF_BASE = 0.2          # сек: пауза перед повтором — случайная в [0, min(MAX, BASE * 2^попытка)]
+BACKOFF_MAX = 5.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+HEALTH_ALPHA = 0.2          # вес нового замера в скользящих средних задержки и доли ошибок
+HEALTH_HALFLIFE = 30.0      # сек: доля ошибок прокси без трафика вдвое «забывается» за это время
+BREAKER_FAILURES = 3        # подряд неудач, после которых прокси отправляется «отдыхать»
+BREAKER_COOLDOWN = 10.0     # сек первого отдыха; каждый повторный отказ удваивает, до BREAKER_MAX
+BREAKER_MAX = 300.0
+PROBE_TIMEOUT = 30.0        # сек: пробная попытка без результата (отменили) перестаёт блокировать прокси
+POOL_CONNECTIONS = 100      # соединений на клиент (один клиент на прокси), keep-alive из них
+POOL_KEEPALIVE = 20
+GATHER_CONCURRENCY = 32
+
+
+class ProxyHealth:
+    """Скользящие задержка и доля ошибок одного прокси плюс автомат-предохранитель.
+
+    closed — прокси в работе; после BREAKER_FAILURES неудач подряд — open на cooldown;
+    по истечении — одна пробная попытка (half-open): успех закрывает, неудача удваивает отдых.
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.requests = 0
+        self.open_until = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probe_at = 0.0     # начало пробной попытки (half-open), 0 — не идёт
+        self.updated = time.monotonic()
+
+    @property
+    def probing(self) -> bool:
+        return self.probe_at > 0 and time.monotonic() - self.probe_at < PROBE_TIMEOUT
+
+    def available(self, now: float) -> bool:
+        return self.open_until <= now and not self.probing
+
+    def needs_probe(self, now: float) -> bool:
+        """Отдых кончился, а пробной попытки ещё не было."""
+        return self.failures >= BREAKER_FAILURES and self.available(now)
+
+    def errors(self, now: float) -> float:
+        return self.error_rate * 0.5 ** ((now - self.updated) / HEALTH_HALFLIFE)
+
+    def score(self, now: float = None) -> float:
+        # Неизвестный прокси считаем быстрым, чтобы он получил трафик и замеры
+        err = self.errors(time.monotonic() if now is None else now)
+        return (self.latency or 0.0) * (1 + 4 * err) + err
+
+    def record(self, ok: bool, latency: float = None):
+        now = time.monotonic()
+        self.requests += 1
+        self.error_rate = self.errors(now) + HEALTH_ALPHA * ((0.0 if ok else 1.0) - self.errors(now))
+        self.updated = now
+        if ok:
+            if latency is not None:
+                self.latency = latency if self.latency is None else \
+                    self.latency + HEALTH_ALPHA * (latency - self.latency)
+            self.failures = 0
+            self.cooldown = BREAKER_COOLDOWN
+        else:
+            self.failures += 1
+            if self.failures >= BREAKER_FAILURES or self.probing:
+                self.open_until = time.monotonic() + self.cooldown
+                log.warning("Прокси %s отключён на %.0f с", self.proxy, self.cooldown)
+                self.cooldown = min(BREAKER_MAX, self.cooldown * 2)
+        self.probe_at = 0.0
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {
+            "proxy": self.proxy,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "error_rate": round(self.errors(now), 3),
+            "requests": self.requests,
+            "open_for": round(max(0.0, self.open_until - now), 1),
+        }
+
+
+class ProxyPool:
+    """Выбор прокси: из двух случайных доступных — с лучшим score (power of two choices).
+
+    Если все прокси отдыхают, берётся тот, чей отдых кончается раньше.
+    """
+
+    def __init__(self, proxies):
+        self._health = {p: ProxyHealth(p) for p in proxies if p}
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self._health)
+
+    def pick(self, exclude=()):
+        if not self._health:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            # Отдохнувший прокси получает одну пробную попытку вне очереди (half-open)
+            probe = next((h for h in self._health.values()
+                          if h.needs_probe(now) and h.proxy not in exclude), None)
+            if probe is not None:
+                probe.probe_at = now
+                return probe.proxy
+            ready = [h for h in self._health.values() if h.available(now) and h.proxy not in exclude]
+            if not ready:
+                ready = [h for h in self._health.values() if h.available(now)]
+            if ready:
+                best = min(random.sample(ready, min(2, len(ready))), key=lambda h: h.score(now))
+            else:
+                best = min((h for h in self._health.values() if not h.probing),
+                           key=lambda h: h.open_until, default=None) \
+                    or next(iter(self._health.values()))
+        return best.proxy
+
+    def record(self, proxy, ok: bool, latency: float = None):
+        h = self._health.get(proxy)
+        if h is not None:
+            with self._lock:
+                h.record(ok, latency)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [h.snapshot() for h in self._health.values()]
+
 
 class APIClient:
     def __init__(
@@ -22,6 +156,9 @@ class APIClient:
         self.proxies_list = proxies_list or []
         self.verify_ssl = verify_ssl
         self.cert = cert
+        self.proxies = ProxyPool(self.proxies_list)
+        # Session держит keep-alive соединения: без неё каждый запрос — новый TCP+TLS
+        self.session = requests.Session()
 
     def _headers(self):
         headers = {'Content-Type': 'application/json'}
@@ -29,20 +166,25 @@ class APIClient:
             headers['Authorization'] = f"Bearer {self.token}"
         return headers
 
-    def _get_random_proxy(self):
-        if not self.proxies_list:
-            return None
-        proxy = random.choice(self.proxies_list)
-        log.info(f"Используется прокси: {proxy}")
-        return {"http": proxy, "https": proxy}
+    def _get_random_proxy(self, exclude=()):
+        proxy = self.proxies.pick(exclude)
+        if proxy is None:
+            return None, None
+        log.debug("Используется прокси: %s", proxy)
+        return proxy, {"http": proxy, "https": proxy}
 
     def _request(self, method: str, endpoint: str, **kwargs):
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        tried = []
         for attempt in range(1, self.retries + 1):
+            if attempt > 1:
+                time.sleep(backoff_delay(attempt - 1, BACKOFF_BASE, BACKOFF_MAX))
+            proxy, proxies = self._get_random_proxy(tried)
+            tried.append(proxy)
+            t0 = time.perf_counter()
             try:
-                proxies = self._get_random_proxy()
-                log.info(f"HTTP {method.upper()} Request to {url}. Attempt {attempt}.")
-                response = requests.request(
+                log.debug("HTTP %s Request to %s. Attempt %s.", method.upper(), url, attempt)
+                response = self.session.request(
                     method=method,
                     url=url,
                     headers=self._headers(),
@@ -52,12 +194,16 @@ class APIClient:
                     cert=self.cert,
                     **kwargs
                 )
+                self.proxies.record(proxy, response.status_code < 500, time.perf_counter() - t0)
                 if response.ok:
-                    log.info(f"Response {response.status_code}: {response.text}")
+                    log.debug("Response %s: %.200s", response.status_code, response.text)
                     return response.json() if 'application/json' in response.headers.get('Content-Type', '') else response.text
                 else:
-                    log.warning(f"Failed Response {response.status_code}: {response.text}")
+                    log.warning("Failed Response %s: %.200s", response.status_code, response.text)
+                    if response.status_code not in RETRY_STATUSES:
+                        break
             except requests.RequestException as e:
+                self.proxies.record(proxy, False)
                 log.error(f"Request Error: {e} — Пробуем другой прокси...")
         log.warning("Все попытки исчерпаны. Запрос не выполнен.")
         return None
@@ -73,3 +219,132 @@ class APIClient:
 
     def delete(self, endpoint: str):
         return self._request("delete", endpoint)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncAPIClient:
+    """Асинхронный вариант APIClient на httpx с пулом keep-alive соединений.
+
+    На каждый прокси (и на прямое соединение) — свой httpx.AsyncClient: прокси в httpx задаётся
+    на клиент, а соединения к каждому хосту внутри клиента переиспользуются. Повторы — только
+    на сетевые ошибки и RETRY_STATUSES, с экспоненциальной паузой и джиттером; каждый повтор
+    идёт через другой прокси, если есть из чего выбрать.
+
+        async with AsyncAPIClient("https://api.example.com", proxies_list=[...]) as api:
+            users = await api.get("/users")
+            results = await api.gather([("get", "/a"), ("post", "/b", {"json": {...}})])
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token: str = None,
+        retries: int = 3,
+        timeout: float = 10,
+        proxies_list: list = None,
+        verify_ssl: bool = True,
+        cert: str = None,
+        max_connections: int = POOL_CONNECTIONS,
+        max_keepalive: int = POOL_KEEPALIVE,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.retries = retries
+        self.timeout = timeout
+        self.proxies = ProxyPool(proxies_list or [])
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive)
+        self._verify = self._ssl_context(verify_ssl, cert)
+        self._clients = {}
+
+    @staticmethod
+    def _ssl_context(verify_ssl, cert):
+        if not cert:
+            return verify_ssl
+        ctx = ssl.create_default_context() if verify_ssl else ssl._create_unverified_context()
+        ctx.load_cert_chain(cert)
+        return ctx
+
+    def _headers(self):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        return headers
+
+    def _client(self, proxy) -> httpx.AsyncClient:
+        client = self._clients.get(proxy)
+        if client is None:
+            client = self._clients[proxy] = httpx.AsyncClient(
+                proxy=proxy, verify=self._verify, timeout=self.timeout, limits=self._limits,
+                headers=self._headers(), trust_env=False)
+        return client
+
+    async def _request(self, method: str, endpoint: str, **kwargs):
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        tried = []
+        for attempt in range(1, self.retries + 1):
+            if attempt > 1:
+                await asyncio.sleep(backoff_delay(attempt - 1, self.backoff_base, self.backoff_max))
+            proxy = self.proxies.pick(tried)
+            tried.append(proxy)
+            t0 = time.perf_counter()
+            try:
+                response = await self._client(proxy).request(method, url, **kwargs)
+            except httpx.HTTPError as e:
+                self.proxies.record(proxy, False)
+                log.error(f"Request Error: {e!r} (попытка {attempt}, прокси {proxy})")
+                continue
+            self.proxies.record(proxy, response.status_code < 500, time.perf_counter() - t0)
+            if response.is_success:
+                log.debug("Response %s: %.200s", response.status_code, response.text)
+                return response.json() if 'application/json' in response.headers.get('Content-Type', '') else response.text
+            log.warning("Failed Response %s: %.200s", response.status_code, response.text)
+            if response.status_code not in RETRY_STATUSES:
+                break
+        log.warning("Все попытки исчерпаны. Запрос не выполнен.")
+        return None
+
+    async def get(self, endpoint: str, params: dict = None):
+        return await self._request("get", endpoint, params=params)
+
+    async def post(self, endpoint: str, data: dict = None):
+        return await self._request("post", endpoint, json=data)
+
+    async def put(self, endpoint: str, data: dict = None):
+        return await self._request("put", endpoint, json=data)
+
+    async def delete(self, endpoint: str):
+        return await self._request("delete", endpoint)
+
+    async def gather(self, calls, concurrency: int = GATHER_CONCURRENCY) -> list:
+        """Пакет запросов: [(method, endpoint[, kwargs]), ...] -> результаты в том же порядке.
+
+        Одновременно выполняется не больше concurrency запросов; неудачный запрос даёт None.
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(call):
+            method, endpoint, *rest = call
+            async with sem:
+                return await self._request(method, endpoint, **(rest[0] if rest else {}))
+
+        return await asyncio.gather(*(one(c) for c in calls))
+
+    def health(self) -> list:
+        return self.proxies.snapshot()
+
+    async def aclose(self):
+        clients, self._clients = list(self._clients.values()), {}
+        await asyncio.gather(*(c.aclose() for c in clients))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
@@ -2,15 +2,38 @@ import hashlib
 import hmac
 import base64
 import time
+import threading
+from collections import OrderedDict
 from modules.logger import Logger
 from modules.database import DocumentDatabase
+from modules.db_core import add_user_listener, remove_user_listener
 
-log = Logger()
+log = Logger("auth")
+
+# --- Кеши ---
+TOKEN_CACHE_SIZE = 4096     # проверенных токенов (LRU); запись живёт до истечения самого токена
+ROLE_CACHE_SIZE = 1024
+ROLE_CACHE_TTL = 30         # секунд; set_user_roles и set_role/del_user сбрасывают запись сразу
+                            # (set_user_roles — только в своём процессе, остальные ждут TTL)
 
 class AuthManager:
-    def __init__(self, secret_key: str, db_path: str):
+    def __init__(self, secret_key: str, db_path: str,
+                 token_cache_size: int = TOKEN_CACHE_SIZE,
+                 role_cache_size: int = ROLE_CACHE_SIZE, role_ttl: float = ROLE_CACHE_TTL):
         self.secret_key = secret_key.encode()
         self.db = DocumentDatabase(db_path)
+        self._token_cache = OrderedDict()   # sha256(token) -> (username, expiration)
+        self._role_cache = OrderedDict()    # username -> (monotonic deadline, frozenset ролей)
+        self._token_cache_size = token_cache_size
+        self._role_cache_size = role_cache_size
+        self._role_ttl = role_ttl
+        self._lock = threading.Lock()
+        # Слабая подписка: AuthManager, который больше не используется, не живёт до конца процесса
+        add_user_listener(self.invalidate_user)
+
+    def close(self):
+        remove_user_listener(self.invalidate_user)
+        self.db.close()
 
     def hash_password(self, password: str) -> str:
         return hashlib.sha256(password.encode()).hexdigest()
@@ -33,36 +56,91 @@ class AuthManager:
         return self.generate_token(username, expire_in_seconds=2592000)  # 30 дней
 
     # ---------- Проверка токена ----------
-    def verify_token(self, token: str) -> bool:
+    def _decode_token(self, token: str) -> str:
+        return base64.urlsafe_b64decode(token.encode()).decode()
+
+    def _check_token(self, token: str):
+        """Полная проверка без кеша: (username, expiration) или None."""
         try:
-            decoded = base64.urlsafe_b64decode(token.encode()).decode()
-            username, expiration, signature_b64 = decoded.split(":")
+            username, expiration, signature_b64 = self._decode_token(token).split(":")
             if int(expiration) < int(time.time()):
                 log.warning("Токен истёк.")
-                return False
+                return None
 
             data = f"{username}:{expiration}"
             expected_signature = hmac.new(self.secret_key, data.encode(), hashlib.sha256).digest()
             valid = hmac.compare_digest(base64.urlsafe_b64encode(expected_signature).decode(), signature_b64)
-            
+
             if not valid:
                 log.warning("Неверная подпись токена.")
-            return valid
+                return None
+            return username, int(expiration)
         except Exception as e:
             log.error(f"Ошибка проверки токена: {e}")
-            return False
+            return None
+
+    def token_user(self, token: str) -> str | None:
+        """Имя пользователя из валидного токена. Повторный токен — один поиск в LRU без HMAC."""
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            hit = self._token_cache.get(key)
+            if hit is not None:
+                if hit[1] >= time.time():
+                    self._token_cache.move_to_end(key)
+                    return hit[0]
+                del self._token_cache[key]
+        checked = self._check_token(token)
+        if checked is None:
+            return None     # невалидные токены не кешируем: иначе мусорными токенами можно вытеснить валидные
+        with self._lock:
+            self._token_cache[key] = checked
+            self._token_cache.move_to_end(key)
+            if len(self._token_cache) > self._token_cache_size:
+                self._token_cache.popitem(last=False)
+        return checked[0]
+
+    def verify_token(self, token: str) -> bool:
+        return self.token_user(token) is not None
 
     # ---------- Освежение Access Token ----------
     def refresh_access_token(self, refresh_token: str) -> str | None:
-        if self.verify_token(refresh_token):
-            decoded = base64.urlsafe_b64decode(refresh_token.encode()).decode()
-            username = decoded.split(":")[0]
+        username = self.token_user(refresh_token)
+        if username is not None:
             log.info(f"Обновление Access Token для пользователя: {username}")
             return self.generate_access_token(username)
         log.warning("Невалидный Refresh Token.")
         return None
 
     # ---------- Роли ----------
+    def get_roles(self, username: str) -> frozenset:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._role_cache.get(username)
+            if hit is not None and hit[0] > now:
+                self._role_cache.move_to_end(username)
+                return hit[1]
+        roles = frozenset(self.db.get_user_roles(username))
+        with self._lock:
+            self._role_cache[username] = (now + self._role_ttl, roles)
+            self._role_cache.move_to_end(username)
+            if len(self._role_cache) > self._role_cache_size:
+                self._role_cache.popitem(last=False)
+        return roles
+
+    def set_roles(self, username: str, roles) -> bool:
+        """Роли пишутся в user_roles; кеш сбрасывается уведомлением set_user_roles (во всех AuthManager)."""
+        return self.db.set_user_roles(username, roles)
+
     def has_role(self, username: str, required_role: str) -> bool:
-        roles = self.db.get_user_roles(username)
-        return required_role in roles
+        return required_role in self.get_roles(username)
+
+    def invalidate_user(self, username: str | None = None):
+        """Сбросить кеш ролей пользователя (или весь, если username=None)."""
+        with self._lock:
+            if username is None:
+                self._role_cache.clear()
+            else:
+                self._role_cache.pop(username, None)
+
+    def cache_stats(self) -> dict:
+        return {"tokens": len(self._token_cache), "roles": len(self._role_cache)}
@@ -0,0 +1,176 @@
+import os
+import hmac
+import time
+import hashlib
+from datetime import datetime
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap, InvalidUnwrap
+from cryptography.exceptions import InvalidTag
+from modules.crypto_module import EncryptedWriter, EncryptedReader, KEK_CACHE, READ_CHUNK
+
+# --- Параметры ---
+# Шифртекст до BLOB_SPOOL байт держится в памяти до конца загрузки: повторная загрузка
+# небольшого файла вообще не пишет на диск
+BLOB_SPOOL = int(os.getenv("DOC_BLOB_SPOOL", 8 * 1024 * 1024))
+GC_GRACE = 3600     # сек: недописанные и бесхозные файлы моложе этого не трогаем (идёт загрузка)
+
+# --- Адрес и ключ блоба ---
+# Оба выводятся из SHA-256 открытого текста, но разными функциями: адрес хранится в БД, а ключ,
+# которым обёрнут ключ данных блоба, из адреса не получить. Расшифровать блоб может только тот,
+# у кого есть сам файл (повторная загрузка) или пароль документа, ссылающегося на блоб.
+def blob_address(digest: bytes) -> str:
+    return hashlib.sha256(b"sdoc-blob-address\0" + digest).hexdigest()
+
+def content_key(digest: bytes) -> bytes:
+    return hmac.new(digest, b"sdoc-blob-key", hashlib.sha256).digest()
+
+
+class BlobUpload:
+    """Одна потоковая загрузка: write() по частям, затем commit() или abort()."""
+
+    def __init__(self, store: "BlobStore"):
+        self._store = store
+        self._dek = AESGCM.generate_key(bit_length=256)
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        self._writer = EncryptedWriter(os.path.join(store.tmp_dir, os.urandom(8).hex()),
+                                       key=self._dek, hash_plaintext=True, spool=store.spool)
+
+    @property
+    def size(self) -> int:
+        return self._writer.size
+
+    def write(self, data: bytes):
+        self._writer.write(data)
+
+    def commit(self, filename: str, password: str = None, category: str = None,
+               tags=None, replace: bool = True) -> dict:
+        """Связать загруженное содержимое с документом filename.
+
+        Если такой блоб уже есть, свой шифртекст отбрасывается, а документ получает ключ
+        существующего блоба. replace=True заменяет прежний документ с тем же именем.
+        """
+        digest = self._writer.finish()
+        address, ckey = blob_address(digest), content_key(digest)
+        db = self._store.db
+        with db.get_connection():
+            # Первая запись берёт блокировку записи: параллельная загрузка того же содержимого
+            # и gc() ждут конца транзакции, поэтому файл и строка blobs появляются вместе
+            created = db.execute(
+                "INSERT OR IGNORE INTO blobs (address, size, refcount, wrapped_key, created_at) "
+                "VALUES (?, ?, 0, ?, ?)",
+                (address, self.size, aes_key_wrap(ckey, self._dek), datetime.now().isoformat())
+            ).rowcount == 1
+            if created:
+                path = self._store.path(address)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._writer.close(path)
+                dek = self._dek
+            else:
+                self._writer.abort()
+                wrapped = db.execute("SELECT wrapped_key FROM blobs WHERE address = ?",
+                                     (address,)).fetchone()[0]
+                dek = aes_key_unwrap(ckey, wrapped)
+            if replace:
+                db.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            doc_id = db.link_document(filename, address, self.size, dek, password,
+                                      category, tags, self._store.path(address))
+        return {"id": doc_id, "address": address, "size": self.size, "duplicate": not created}
+
+    def abort(self):
+        self._writer.abort()
+
+
+class BlobStore:
+    """Контентно-адресуемое хранилище: каждый уникальный файл лежит один раз в root/<aa>/<адрес>.sdoc.
+
+    Метаданные и счётчики ссылок — в таблицах blobs/documents DocumentDatabase; счётчик
+    ведут триггеры на documents, поэтому удаление документа любым способом его уменьшает.
+    Блобы без ссылок удаляет gc().
+    """
+
+    def __init__(self, db, root: str, spool: int = BLOB_SPOOL):
+        self.db = db
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.spool = spool
+
+    def path(self, address: str) -> str:
+        return os.path.join(self.root, address[:2], address + ".sdoc")
+
+    def begin(self) -> BlobUpload:
+        return BlobUpload(self)
+
+    def put_file(self, src_path: str, filename: str, password: str = None, category: str = None,
+                 tags=None, replace: bool = True) -> dict:
+        upload = self.begin()
+        try:
+            with open(src_path, "rb") as f:
+                while chunk := f.read(READ_CHUNK):
+                    upload.write(chunk)
+            return upload.commit(filename, password, category, tags, replace)
+        except BaseException:
+            upload.abort()
+            raise
+
+    def open(self, filename: str = None, password: str = None, *, doc_id: int = None):
+        """EncryptedReader документа или None, если такого документа в хранилище нет.
+
+        Неверный пароль — InvalidTag, как и для файлов SDOC v2.
+        """
+        row = self.db.find_document_key(filename=filename, doc_id=doc_id)
+        if row is None:
+            return None
+        address, salt, iterations, wrapped, server_key = row
+        if wrapped is not None:
+            try:
+                dek = aes_key_unwrap(KEK_CACHE.get(password or "", salt, iterations), wrapped)
+            except InvalidUnwrap:
+                raise InvalidTag("Неверный пароль")
+        else:
+            dek = bytes.fromhex(server_key)
+        return EncryptedReader(self.path(address), key=dek)
+
+    def gc(self, grace: float = GC_GRACE) -> dict:
+        """Удалить блобы без ссылок, а также бесхозные и недописанные файлы старше grace секунд."""
+        removed = freed = 0
+        conn = self.db.get_connection()
+        with conn:
+            # Файлы удаляются до фиксации: новая загрузка того же содержимого не может
+            # вставить строку между удалением строки и удалением файла
+            for address, size in self.db.execute(
+                    "DELETE FROM blobs WHERE refcount <= 0 RETURNING address, size").fetchall():
+                try:
+                    os.remove(self.path(address))
+                except FileNotFoundError:
+                    pass
+                removed += 1
+                freed += size
+        cutoff = time.time() - grace
+        orphans = 0
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                p = os.path.join(root, name)
+                if root == self.tmp_dir or name.endswith(".part"):
+                    stale = True
+                elif name.endswith(".sdoc"):
+                    stale = self.db.execute("SELECT 1 FROM blobs WHERE address = ?",
+                                            (name[:-5],)).fetchone() is None
+                else:
+                    continue
+                try:
+                    if stale and os.path.getmtime(p) < cutoff:
+                        os.remove(p)
+                        orphans += 1
+                except FileNotFoundError:
+                    pass
+        return {"blobs": removed, "bytes": freed, "orphans": orphans}
+
+    def stats(self) -> dict:
+        blobs, stored, refs = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refcount), 0) FROM blobs"
+        ).fetchone()
+        logical = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM documents WHERE blob_address IS NOT NULL"
+        ).fetchone()[0]
+        return {"blobs": blobs, "references": refs, "stored_bytes": stored,
+                "logical_bytes": logical}
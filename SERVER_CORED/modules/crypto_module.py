@@ -1,21 +1,71 @@
 
+import io
 import os
+import hmac
+import json
+import time
+import base64
+import struct
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.keywrap import aes_key_wrap, aes_key_unwrap, InvalidUnwrap
 from cryptography.hazmat.backends import default_backend
-from cryptography.exceptions import InvalidSignature
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from modules.metrics import counter, histogram
 
 # --- Параметры ---
-PRIVATE_KEY_FILE = "keys/private_key.pem"
-PUBLIC_KEY_FILE = "keys/public_key.pem"
-KEY_DIR = "keys"
-ENC_DIR = "encrypted_docs"
+# Пути от корня проекта, а не от текущего каталога процесса; документы — в DATA_DIR, как базы
+# и блобы в main.py (DATA_DIR/encrypted_docs/blobs), чтобы манифест покрывал и хранилище блобов
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.getenv("DATA_DIR", BASE_DIR)
+KEY_DIR = os.path.join(BASE_DIR, "keys")
+ENC_DIR = os.path.join(DATA_DIR, "encrypted_docs")
+PRIVATE_KEY_FILE = os.path.join(KEY_DIR, "private_key.pem")
+PUBLIC_KEY_FILE = os.path.join(KEY_DIR, "public_key.pem")
+MANIFEST_FILE = os.path.join(ENC_DIR, "manifest.json")
+SIGN_WORKERS = int(os.getenv("SIGN_WORKERS", os.cpu_count() or 2))
+KDF_ITERATIONS = int(os.getenv("DOC_KDF_ITERATIONS", 100000))
+LEGACY_KDF_ITERATIONS = 100000      # v1 и CFB-файлы: число итераций не хранится в заголовке
+KEK_CACHE_SIZE = int(os.getenv("DOC_KEK_CACHE_SIZE", 256))
+KEK_CACHE_TTL = float(os.getenv("DOC_KEK_CACHE_TTL", 600))
 
-# --- Убедимся, что папки существуют ---
-os.makedirs(KEY_DIR, exist_ok=True)
-os.makedirs(ENC_DIR, exist_ok=True)
+# --- Формат SDOC (сегментированный AES-GCM) ---
+# v2 (пишется сейчас): magic | версия | размер сегмента | итерации PBKDF2 | salt | обёрнутый ключ
+# данных (AES-KW, 40 байт) | префикс nonce. Ключ данных случайный для каждого файла; паролем через
+# PBKDF2 получается только ключ шифрования ключей (KEK), и он кешируется.
+# v1 (только чтение): magic | версия | размер сегмента | salt | префикс nonce; ключ = PBKDF2(пароль).
+# Далее сегменты: ciphertext(<= SEGMENT_SIZE) + tag(16). Nonce сегмента = префикс(7) | номер(4) | флаг
+# последнего сегмента(1); заголовок идёт в AAD каждого сегмента. Поэтому перестановка, обрезка и
+# подмена заголовка обнаруживаются. Файлы без MAGIC — старый формат salt + iv + AES-CFB.
+# v3 (блобы хранилища): magic | версия | размер сегмента | префикс nonce; ключ данных хранится вне
+# файла (см. blob_store), сегменты — как в v2.
+MAGIC = b"SDOC"
+FORMAT_VERSION = 2
+BLOB_FORMAT_VERSION = 3
+SEGMENT_SIZE = 64 * 1024
+TAG_SIZE = 16
+READ_CHUNK = 1024 * 1024
+_HEADER_V1 = struct.Struct(">4sBI16s7s")
+_HEADER_V2 = struct.Struct(">4sBII16s40s7s")
+_HEADER_V3 = struct.Struct(">4sBI7s")
+_HEADERS = {1: _HEADER_V1, 2: _HEADER_V2, 3: _HEADER_V3}
+
+# --- Метрики (/metrics): скорость = rate(*_bytes_total) / rate(*_seconds_total) ---
+_M_KDF = histogram("crypto_pbkdf2_seconds", "Время одного вывода ключа PBKDF2",
+                   buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+_M_KDF_ITER = counter("crypto_pbkdf2_iterations_total", "Итерации PBKDF2")
+_M_AEAD_BYTES = counter("crypto_aead_bytes_total", "Байт открытого текста через AES-GCM", ("op",))
+_M_AEAD_SECONDS = counter("crypto_aead_seconds_total", "Время AES-GCM", ("op",))
+_M_ENC_BYTES, _M_ENC_SECONDS = _M_AEAD_BYTES.labels("encrypt"), _M_AEAD_SECONDS.labels("encrypt")
+_M_DEC_BYTES, _M_DEC_SECONDS = _M_AEAD_BYTES.labels("decrypt"), _M_AEAD_SECONDS.labels("decrypt")
 
 # --- Генерация ключей RSA ---
 def generate_rsa_keys():
@@ -26,6 +76,7 @@ def generate_rsa_keys():
     )
     public_key = private_key.public_key()
 
+    os.makedirs(os.path.dirname(PRIVATE_KEY_FILE), exist_ok=True)
     with open(PRIVATE_KEY_FILE, "wb") as f:
         f.write(private_key.private_bytes(
             encoding=serialization.Encoding.PEM,
@@ -39,92 +90,464 @@ def generate_rsa_keys():
             format=serialization.PublicFormat.SubjectPublicKeyInfo
         ))
 
-# --- Загрузка ключей ---
+    reload_keys()
+
+# --- Загрузка ключей (разбираются один раз и кешируются) ---
+_KEYS = {}
+_KEYS_LOCK = threading.Lock()
+
 def load_private_key():
-    with open(PRIVATE_KEY_FILE, "rb") as f:
-        return serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
+    key = _KEYS.get("private")
+    if key is None:
+        with _KEYS_LOCK:
+            key = _KEYS.get("private")
+            if key is None:
+                with open(PRIVATE_KEY_FILE, "rb") as f:
+                    key = serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
+                _KEYS["private"] = key
+    return key
 
 def load_public_key():
-    with open(PUBLIC_KEY_FILE, "rb") as f:
-        return serialization.load_pem_public_key(f.read(), backend=default_backend())
+    key = _KEYS.get("public")
+    if key is None:
+        with _KEYS_LOCK:
+            key = _KEYS.get("public")
+            if key is None:
+                with open(PUBLIC_KEY_FILE, "rb") as f:
+                    key = serialization.load_pem_public_key(f.read(), backend=default_backend())
+                _KEYS["public"] = key
+    return key
+
+def reload_keys():
+    """Сбросить кеш ключей после ротации: следующая подпись/проверка перечитает PEM."""
+    with _KEYS_LOCK:
+        _KEYS.clear()
+
+_PSS = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
 
 # --- Подпись данных ---
 def sign_data(data: bytes) -> bytes:
-    private_key = load_private_key()
-    signature = private_key.sign(
-        data,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH
-        ),
-        hashes.SHA256()
-    )
-    return signature
+    return load_private_key().sign(data, _PSS, hashes.SHA256())
 
 # --- Проверка подписи ---
 def verify_signature(data: bytes, signature: bytes) -> bool:
-    public_key = load_public_key()
     try:
-        public_key.verify(
-            signature,
-            data,
-            padding.PSS(
-                mgf=padding.MGF1(hashes.SHA256()),
-                salt_length=padding.PSS.MAX_LENGTH
-            ),
-            hashes.SHA256()
-        )
+        load_public_key().verify(signature, data, _PSS, hashes.SHA256())
         return True
     except InvalidSignature:
         return False
 
-# --- Шифрование файла ---
-def encrypt_file(input_path: str, password: str):
-    with open(input_path, "rb") as f:
-        plaintext = f.read()
+# --- Пакетные подпись и проверка ---
+_POOL = None
+_POOL_LOCK = threading.Lock()
 
-    salt = os.urandom(16)
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=100000,
-        backend=default_backend()
-    )
-    key = kdf.derive(password.encode())
-    iv = os.urandom(16)
-    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
-    ciphertext = encryptor.update(plaintext) + encryptor.finalize()
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ThreadPoolExecutor(max_workers=SIGN_WORKERS, thread_name_prefix="sign")
+    return _POOL
 
-    output_path = os.path.join(ENC_DIR, os.path.basename(input_path) + ".enc")
-    with open(output_path, "wb") as f:
-        f.write(salt + iv + ciphertext)
+def sign_many(items) -> list:
+    """Подписи для списка документов (в том же порядке), в пуле потоков."""
+    load_private_key()
+    return list(_pool().map(sign_data, items))
 
-    return output_path
+def verify_many(pairs) -> list:
+    """[(data, signature), ...] -> [bool, ...] в том же порядке, в пуле потоков."""
+    load_public_key()
+    return list(_pool().map(lambda p: verify_signature(*p), pairs))
 
-# --- Дешифрование файла ---
-def decrypt_file(encrypted_path: str, password: str, output_path: str):
-    with open(encrypted_path, "rb") as f:
-        content = f.read()
+# --- Манифест хранилища: корень Меркла по хешам документов + одна подпись ---
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK):
+            h.update(chunk)
+    return h.hexdigest()
+
+def merkle_root(files: dict) -> str:
+    """Корень дерева Меркла по {имя: sha256-hex}, листья в порядке имён.
+
+    Лист = H(0x00 | имя | 0x00 | хеш), узел = H(0x01 | левый | правый). Непарный узел
+    поднимается на уровень выше без изменений (без дублирования, как в CVE-2012-2459).
+    """
+    level = [hashlib.sha256(b"\x00" + name.encode() + b"\x00" + bytes.fromhex(files[name])).digest()
+             for name in sorted(files)]
+    if not level:
+        return hashlib.sha256(b"").hexdigest()
+    while len(level) > 1:
+        nxt = [hashlib.sha256(b"\x01" + level[i] + level[i + 1]).digest()
+               for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0].hex()
+
+def _store_files(directory: str) -> list:
+    """Относительные пути всех *.enc и блобов *.sdoc (из подкаталогов тоже)."""
+    return sorted(os.path.relpath(os.path.join(root, n), directory)
+                  for root, _, names in os.walk(directory)
+                  for n in names if n.endswith((".enc", ".sdoc")))
+
+def _hash_store(directory: str) -> dict:
+    names = _store_files(directory)
+    digests = _pool().map(lambda n: file_sha256(os.path.join(directory, n)), names)
+    return dict(zip(names, digests))
+
+def _manifest_paths(directory, path):
+    """По умолчанию — ENC_DIR на момент вызова и manifest.json в выбранном каталоге."""
+    directory = directory or ENC_DIR
+    return directory, path or os.path.join(directory, os.path.basename(MANIFEST_FILE))
 
-    salt = content[:16]
-    iv = content[16:32]
-    ciphertext = content[32:]
+def build_manifest(directory: str = None, path: str = None) -> dict:
+    """Пересчитать хеши хранилища, подписать корень Меркла и записать манифест."""
+    directory, path = _manifest_paths(directory, path)
+    files = _hash_store(directory)
+    root = merkle_root(files)
+    manifest = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+        "root": root,
+        "signature": base64.b64encode(sign_data(bytes.fromhex(root))).decode(),
+    }
+    tmp = path + ".part"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return manifest
 
+def verify_manifest(directory: str = None, path: str = None) -> dict:
+    """Проверка всего хранилища: одна проверка RSA-подписи корня плюс сверка хешей."""
+    directory, path = _manifest_paths(directory, path)
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    signature_ok = (merkle_root(manifest["files"]) == manifest["root"]
+                    and verify_signature(bytes.fromhex(manifest["root"]),
+                                         base64.b64decode(manifest["signature"])))
+    current = _hash_store(directory)
+    expected = manifest["files"]
+    changed = sorted(n for n in current.keys() & expected.keys() if current[n] != expected[n])
+    missing = sorted(expected.keys() - current.keys())
+    added = sorted(current.keys() - expected.keys())
+    return {
+        "ok": signature_ok and not (changed or missing or added),
+        "signature_ok": signature_ok,
+        "created_at": manifest.get("created_at"),
+        "changed": changed,
+        "missing": missing,
+        "added": added,
+    }
+
+# --- Ключ из пароля ---
+def derive_key(password: str, salt: bytes, iterations: int = KDF_ITERATIONS) -> bytes:
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
         salt=salt,
-        iterations=100000,
+        iterations=iterations,
         backend=default_backend()
     )
+    t0 = time.perf_counter()
     key = kdf.derive(password.encode())
-    cipher = Cipher(algorithms.AES(key), modes.CFB(iv), backend=default_backend())
-    decryptor = cipher.decryptor()
-    plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+    _M_KDF.observe(time.perf_counter() - t0)
+    _M_KDF_ITER.inc(iterations)
+    return key
+
+class KekCache:
+    """LRU-кеш ключей, выведенных PBKDF2, с вытеснением по TTL.
+
+    Ключ кеша — HMAC пароля на случайном секрете процесса (сам пароль не хранится), соль
+    и число итераций. Для шифрования кеш ещё помнит «текущую» соль пароля: новые файлы
+    с тем же паролем получают ту же соль и готовый KEK, пока запись не устарела.
+    """
+
+    def __init__(self, maxsize: int = KEK_CACHE_SIZE, ttl: float = KEK_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._secret = os.urandom(32)
+        self._keys = OrderedDict()
+        self._salts = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _pw_id(self, password: str) -> bytes:
+        return hmac.new(self._secret, password.encode(), hashlib.sha256).digest()
+
+    def get(self, password: str, salt: bytes, iterations: int) -> bytes:
+        if self.maxsize <= 0:
+            self.misses += 1
+            return derive_key(password, salt, iterations)
+        k = (self._pw_id(password), salt, iterations)
+        now = time.monotonic()
+        with self._lock:
+            hit = self._keys.get(k)
+            if hit and hit[1] > now:
+                self._keys.move_to_end(k)
+                self.hits += 1
+                return hit[0]
+        # PBKDF2 вне блокировки: параллельные промахи по разным паролям не ждут друг друга
+        key = derive_key(password, salt, iterations)
+        with self._lock:
+            self.misses += 1
+            self._keys[k] = (key, now + self.ttl)
+            self._keys.move_to_end(k)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+        return key
+
+    def for_encryption(self, password: str, iterations: int):
+        """(salt, kek) для нового файла: соль переиспользуется, пока живёт её KEK."""
+        pw_id = self._pw_id(password)
+        now = time.monotonic()
+        with self._lock:
+            salt = self._salts.get((pw_id, iterations))
+            entry = self._keys.get((pw_id, salt, iterations)) if salt else None
+            if entry is None or entry[1] <= now:
+                salt = os.urandom(16)
+                self._salts[(pw_id, iterations)] = salt
+                if len(self._salts) > max(self.maxsize, 1):
+                    self._salts.pop(next(iter(self._salts)))
+        return salt, self.get(password, salt, iterations)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self._salts.clear()
 
-    with open(output_path, "wb") as f:
-        f.write(plaintext)
+KEK_CACHE = KekCache()
+
+def _segment_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    return prefix + struct.pack(">IB", index, 1 if last else 0)
+
+# --- Потоковое шифрование ---
+class EncryptedWriter:
+    """Шифрует поток по сегментам и пишет его прямо в файл.
+
+    write() принимает открытый текст любыми порциями; в памяти держится не больше одного
+    сегмента. Файл пишется как <path>.part и переименовывается в close(), поэтому
+    недописанный файл не виден под итоговым именем. abort() удаляет .part.
+
+    С key= пишется v3 без пароля (ключ данных задаёт вызывающий). hash_plaintext=True считает
+    SHA-256 открытого текста (sha256). spool>0 держит шифртекст в памяти, пока он не больше
+    spool байт: если после finish() файл не нужен (дубликат), на диск ничего не записано.
+    """
+
+    def __init__(self, output_path: str, password: str = None, segment_size: int = SEGMENT_SIZE,
+                 iterations: int = KDF_ITERATIONS, *, key: bytes = None,
+                 hash_plaintext: bool = False, spool: int = 0):
+        self.output_path = output_path
+        self._tmp_path = output_path + ".part"
+        self._prefix = os.urandom(7)
+        if key is not None:
+            self._header = _HEADER_V3.pack(MAGIC, BLOB_FORMAT_VERSION, segment_size, self._prefix)
+        else:
+            salt, kek = KEK_CACHE.for_encryption(password, iterations)
+            key = AESGCM.generate_key(bit_length=256)
+            self._header = _HEADER_V2.pack(MAGIC, FORMAT_VERSION, segment_size, iterations,
+                                           salt, aes_key_wrap(kek, key), self._prefix)
+        self._aead = AESGCM(key)
+        self._segment_size = segment_size
+        self._index = 0
+        self._buf = bytearray()
+        self.size = 0
+        self.sha256 = hashlib.sha256() if hash_plaintext else None
+        self._spool = spool
+        self._finished = False
+        self._f = io.BytesIO() if spool > 0 else open(self._tmp_path, "wb")
+        self._f.write(self._header)
+
+    def _emit(self, data: bytes, last: bool):
+        nonce = _segment_nonce(self._prefix, self._index, last)
+        t0 = time.perf_counter()
+        ct = self._aead.encrypt(nonce, data, self._header)
+        _M_ENC_SECONDS.inc(time.perf_counter() - t0)
+        _M_ENC_BYTES.inc(len(data))
+        self._f.write(ct)
+        self._index += 1
+        if isinstance(self._f, io.BytesIO) and self._f.tell() > self._spool:
+            self._spill()
+
+    def _spill(self):
+        mem = self._f
+        self._f = open(self._tmp_path, "wb")
+        self._f.write(mem.getbuffer())
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.sha256 is not None:
+            self.sha256.update(data)
+        self._buf += data
+        # Строго больше: последний сегмент должен остаться в буфере до close()
+        while len(self._buf) > self._segment_size:
+            self._emit(bytes(self._buf[:self._segment_size]), last=False)
+            del self._buf[:self._segment_size]
+
+    def finish(self):
+        """Дописать последний сегмент, не публикуя файл. Возвращает SHA-256 открытого текста или None."""
+        if not self._finished:
+            self._emit(bytes(self._buf), last=True)
+            self._buf = bytearray()
+            self._finished = True
+        return self.sha256.digest() if self.sha256 is not None else None
+
+    def close(self, output_path: str = None) -> str:
+        self.finish()
+        if isinstance(self._f, io.BytesIO):
+            self._spill()
+        self._f.close()
+        self.output_path = output_path or self.output_path
+        os.replace(self._tmp_path, self.output_path)
+        return self.output_path
+
+    def abort(self):
+        if not self._f.closed:
+            self._f.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+class EncryptedReader:
+    """Случайный доступ к зашифрованному файлу без расшифровки с начала.
+
+    SDOC: по смещению вычисляется номер сегмента, расшифровываются только нужные сегменты.
+    Старый CFB: IV для блока k — это шифртекст блока k-1, так что тоже можно начать с середины.
+    Для SDOC неверный пароль обнаруживается сразу в конструкторе (InvalidTag).
+    """
+
+    def __init__(self, encrypted_path: str, password: str = None, *, key: bytes = None):
+        self._f = open(encrypted_path, "rb")
+        try:
+            total = os.fstat(self._f.fileno()).st_size
+            head = self._f.read(5)
+            fmt = _HEADERS.get(head[4]) if head[:4] == MAGIC and len(head) == 5 else None
+            if fmt is not None:
+                self._f.seek(0)
+                head = self._f.read(fmt.size)
+                self.legacy = False
+                self._header = head
+                if fmt is _HEADER_V3:
+                    _, _, self._segment_size, self._prefix = fmt.unpack(head)
+                    if key is None:
+                        raise ValueError("Для блоба нужен ключ данных")
+                elif fmt is _HEADER_V1:
+                    _, _, self._segment_size, salt, self._prefix = fmt.unpack(head)
+                    key = KEK_CACHE.get(password, salt, LEGACY_KDF_ITERATIONS)
+                else:
+                    _, _, self._segment_size, iterations, salt, wrapped, self._prefix = fmt.unpack(head)
+                    try:
+                        key = aes_key_unwrap(KEK_CACHE.get(password, salt, iterations), wrapped)
+                    except InvalidUnwrap:
+                        raise InvalidTag("Неверный пароль")
+                self._aead = AESGCM(key)
+                stride = self._segment_size + TAG_SIZE
+                body = total - len(head)
+                self._segments = max(1, -(-body // stride))
+                self.size = body - TAG_SIZE * self._segments
+                self._read_segment(0)
+            elif head[:4] == MAGIC:
+                raise ValueError(f"Неподдерживаемая версия формата: {head[4:5].hex()}")
+            else:
+                self.legacy = True
+                self._f.seek(0)
+                head = self._f.read(32)
+                self._iv = head[16:32]
+                self._key = KEK_CACHE.get(password, head[:16], LEGACY_KDF_ITERATIONS)
+                self.size = max(0, total - 32)
+        except BaseException:
+            self._f.close()
+            raise
+
+    def _read_segment(self, index: int) -> bytes:
+        stride = self._segment_size + TAG_SIZE
+        self._f.seek(len(self._header) + index * stride)
+        last = index == self._segments - 1
+        nonce = _segment_nonce(self._prefix, index, last)
+        data = self._f.read(stride)
+        t0 = time.perf_counter()
+        pt = self._aead.decrypt(nonce, data, self._header)
+        _M_DEC_SECONDS.inc(time.perf_counter() - t0)
+        _M_DEC_BYTES.inc(len(pt))
+        return pt
+
+    def iter_range(self, start: int = 0, end: int = None):
+        """Открытый текст байтов [start, end) по частям."""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return
+        if self.legacy:
+            yield from self._iter_legacy(start, end)
+            return
+        seg = self._segment_size
+        for index in range(start // seg, (end - 1) // seg + 1):
+            data = self._read_segment(index)
+            base = index * seg
+            yield data[max(0, start - base):end - base]
+
+    def _iter_legacy(self, start: int, end: int):
+        block = start // 16
+        if block == 0:
+            iv = self._iv
+        else:
+            self._f.seek(32 + (block - 1) * 16)
+            iv = self._f.read(16)
+        self._f.seek(32 + block * 16)
+        decryptor = Cipher(algorithms.AES(self._key), modes.CFB(iv),
+                           backend=default_backend()).decryptor()
+        skip, left = start - block * 16, end - block * 16
+        while left > 0:
+            chunk = self._f.read(min(READ_CHUNK, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            data = decryptor.update(chunk)
+            if skip:
+                data, skip = data[skip:], 0
+            yield data
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_decrypted(encrypted_path: str, password: str = None, start: int = 0, end: int = None,
+                   *, key: bytes = None):
+    """Генератор открытого текста по частям; понимает SDOC и старый формат salt+iv+CFB.
+
+    Для SDOC неверный пароль или повреждённый файл дают cryptography.exceptions.InvalidTag.
+    """
+    with EncryptedReader(encrypted_path, password, key=key) as reader:
+        yield from reader.iter_range(start, end)
+
+# --- Шифрование файла ---
+def encrypt_file(input_path: str, password: str):
+    os.makedirs(ENC_DIR, exist_ok=True)     # каталоги создаются при первой записи, а не при импорте
+    output_path = os.path.join(ENC_DIR, os.path.basename(input_path) + ".enc")
+    writer = EncryptedWriter(output_path, password)
+    try:
+        with open(input_path, "rb") as f:
+            while chunk := f.read(READ_CHUNK):
+                writer.write(chunk)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+# --- Дешифрование файла ---
+def decrypt_file(encrypted_path: str, password: str, output_path: str):
+    tmp_path = output_path + ".part"
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in iter_decrypted(encrypted_path, password):
+                out.write(chunk)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
     return output_path
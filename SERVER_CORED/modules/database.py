@@ -1,129 +1,450 @@
 import sqlite3
 import os
-from cryptography.fernet import Fernet
+import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from functools import cached_property
 import hashlib
+import json
+from modules.db_core import encode_cursor, decode_cursor, notify_user_changed
+from modules.migrations import add_columns, migrate
+# cryptography (blob_store, crypto_module, Fernet) импортируется при первой операции с документом,
+# а не при старте приложения
+
+# --- Соединения ---
+# Прагмы применяются один раз при открытии соединения потока
+DB_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),      # в WAL не теряет целостность, fsync только на checkpoint
+    ("cache_size", -16000),         # ~16 МБ кеша страниц на соединение
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+)
+STATEMENT_CACHE = 128               # подготовленных выражений на соединение (sqlite3 cached_statements)
+# Разных SQL в query_stats (LRU): search_documents собирает текст запроса из фильтров, и без
+# предела словарь рос бы с каждой новой комбинацией
+QUERY_STATS_SIZE = 256
+
+# --- Поиск ---
+SEARCH_LIMIT = 50
+SEARCH_LIMIT_MAX = 500
+# Веса bm25 по колонкам documents_fts: совпадение в имени файла важнее, чем в тегах и категории
+SEARCH_WEIGHTS = (10.0, 5.0, 2.0)
+DOC_COLUMNS = ("id", "filename", "filepath", "category", "tags", "date_added")
+# Колонки documents, добавленные после первой версии схемы (шаг миграции «колонки блобов»)
+DOC_EXTRA_COLUMNS = (
+    ("blob_address", "TEXT"),       # блоб в BlobStore; NULL — старый документ (Fernet)
+    ("size", "INTEGER"),
+    ("key_salt", "BLOB"),           # ключ данных блоба, обёрнутый KEK пароля документа
+    ("key_iterations", "INTEGER"),
+    ("wrapped_key", "BLOB"),
+)
+
+def normalize_tags(tags) -> list:
+    """'Договор, #скан,договор' -> ['договор', 'скан'] (порядок сохраняется)."""
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    out = []
+    for t in tags or ():
+        t = t.strip().lstrip("#").strip().lower()
+        if t and t not in out:
+            out.append(t)
+    return out
+
+def fts_query(keyword: str, prefix: bool = True) -> str:
+    """Пользовательский ввод -> запрос FTS5: каждое слово в кавычках (без синтаксиса FTS), все слова обязательны."""
+    words = re.findall(r"\w+", keyword or "")
+    return " ".join(f'"{w}"' + ("*" if prefix else "") for w in words)
+
+def _rebuild_tags(conn, doc_ids=None):
+    """document_tags заново из documents.tags: всех документов или только doc_ids."""
+    if doc_ids is None:
+        conn.execute("DELETE FROM document_tags")
+        rows = conn.execute("SELECT id, tags FROM documents").fetchall()
+    else:
+        ids = json.dumps([int(i) for i in doc_ids])
+        conn.execute("DELETE FROM document_tags WHERE document_id IN "
+                     "(SELECT value FROM json_each(?))", (ids,))
+        rows = conn.execute("SELECT id, tags FROM documents WHERE id IN "
+                            "(SELECT value FROM json_each(?))", (ids,)).fetchall()
+    conn.executemany("INSERT OR IGNORE INTO document_tags (tag, document_id) VALUES (?, ?)",
+                     ((t, doc_id) for doc_id, tags in rows for t in normalize_tags(tags)))
+
+def _backfill_search(conn):
+    """FTS-индекс и теги из документов, которые лежали в базе до появления поиска."""
+    conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')")
+    _rebuild_tags(conn)
+
+# --- Схема (modules.migrations): шаги только дописываются в конец ---
+DOCS_MIGRATIONS = [
+    ("базовые таблицы", """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE,
+            password_hash TEXT
+        );
+        CREATE TABLE IF NOT EXISTS roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            role_name TEXT UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS user_roles (
+            user_id INTEGER,
+            role_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (role_id) REFERENCES roles(id)
+        );
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            filepath TEXT,
+            category TEXT,
+            tags TEXT,
+            date_added TEXT,
+            encryption_key TEXT
+        );"""),
+    ("колонки блобов в documents", lambda conn: add_columns(conn, "documents", DOC_EXTRA_COLUMNS)),
+    # Таблица блобов и счётчик ссылок на них, который ведут триггеры на documents
+    ("блобы", """
+        CREATE TABLE IF NOT EXISTS blobs (
+            address TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            wrapped_key BLOB NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs(refcount) WHERE refcount <= 0;
+        CREATE INDEX IF NOT EXISTS idx_documents_blob ON documents(blob_address);
+        CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents(filename, id);
+        CREATE TRIGGER IF NOT EXISTS documents_blob_ai AFTER INSERT ON documents
+        WHEN new.blob_address IS NOT NULL BEGIN
+            UPDATE blobs SET refcount = refcount + 1 WHERE address = new.blob_address;
+        END;
+        CREATE TRIGGER IF NOT EXISTS documents_blob_ad AFTER DELETE ON documents
+        WHEN old.blob_address IS NOT NULL BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE address = old.blob_address;
+        END;
+        CREATE TRIGGER IF NOT EXISTS documents_blob_au AFTER UPDATE OF blob_address ON documents BEGIN
+            UPDATE blobs SET refcount = refcount - 1 WHERE address = old.blob_address;
+            UPDATE blobs SET refcount = refcount + 1 WHERE address = new.blob_address;
+        END;"""),
+    # FTS5-индекс по filename/tags/category (синхронизируется триггерами) и таблица тегов.
+    # document_tags триггеры только чистят при удалении: разбор и нормализация тегов
+    # (normalize_tags, lower() для кириллицы) в SQL триггера не выражаются — см. DocumentDatabase
+    ("поиск", """
+        CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+            filename, tags, category,
+            content='documents', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_fts(rowid, filename, tags, category)
+            VALUES (new.id, new.filename, new.tags, new.category);
+        END;
+        CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, filename, tags, category)
+            VALUES ('delete', old.id, old.filename, old.tags, old.category);
+            DELETE FROM document_tags WHERE document_id = old.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF filename, tags, category ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, filename, tags, category)
+            VALUES ('delete', old.id, old.filename, old.tags, old.category);
+            INSERT INTO documents_fts(rowid, filename, tags, category)
+            VALUES (new.id, new.filename, new.tags, new.category);
+        END;
+        CREATE TABLE IF NOT EXISTS document_tags (
+            tag TEXT NOT NULL,
+            document_id INTEGER NOT NULL,
+            PRIMARY KEY (tag, document_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_document_tags_doc ON document_tags(document_id);
+        CREATE INDEX IF NOT EXISTS idx_documents_category ON documents(category, id);"""),
+    ("заполнение поиска", _backfill_search),
+]
 
 class DocumentDatabase:
-    def __init__(self, db_path: str):
+    """Одно соединение на поток: открывается при первом обращении и живёт до close().
+
+    Выражения, выполненные через execute(), кешируются sqlite3 как подготовленные
+    и учитываются в query_stats().
+
+    Инвариант тегов: documents.tags и document_tags (по ней работают фильтры tags= в
+    search_documents) согласованы, только если теги пишутся через add_document/set_tags.
+    FTS-индекс триггеры обновляют при любой записи, document_tags — нет: после INSERT в
+    documents или UPDATE tags в обход этих методов нужен rebuild_tags(), иначе документ
+    находится по словам, но не по фильтру тегов.
+    """
+
+    def __init__(self, db_path: str, pragmas=DB_PRAGMAS, blob_dir: str = None):
         self.db_path = db_path
+        self._pragmas = pragmas
+        self._local = threading.local()
+        self._conns = {}            # ident потока -> соединение (для close() и уборки)
+        self._lock = threading.Lock()
+        self._stats = OrderedDict() # sql -> [count, total_sec, max_sec], не больше QUERY_STATS_SIZE
+        self._blob_dir = blob_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), "blobs")
         self.create_tables()
 
+    @cached_property
+    def blobs(self):
+        from modules.blob_store import BlobStore
+        return BlobStore(self, self._blob_dir)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE)
+        for name, value in self._pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
     def get_connection(self):
-        return sqlite3.connect(self.db_path, check_same_thread=False)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            ident = threading.get_ident()
+            with self._lock:
+                # Соединения завершившихся потоков закрываем здесь, а не ждём close()
+                alive = {t.ident for t in threading.enumerate()}
+                for tid in [tid for tid in self._conns if tid not in alive or tid == ident]:
+                    self._conns.pop(tid).close()
+                self._conns[ident] = conn
+        return conn
+
+    def execute(self, sql: str, params=()):
+        """conn.execute с замером времени (время до первой строки результата)."""
+        t0 = time.perf_counter()
+        cursor = self.get_connection().execute(sql, params)
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            st = self._stats.get(sql)
+            if st is None:
+                if len(self._stats) >= QUERY_STATS_SIZE:
+                    self._stats.popitem(last=False)
+                st = self._stats[sql] = [0, 0.0, 0.0]
+            else:
+                self._stats.move_to_end(sql)
+            st[0] += 1
+            st[1] += elapsed
+            st[2] = max(st[2], elapsed)
+        return cursor
+
+    def query_stats(self) -> list:
+        with self._lock:
+            items = [(sql, *st) for sql, st in self._stats.items()]
+        return sorted(({"sql": " ".join(sql.split()), "count": n,
+                        "total_ms": round(total * 1000, 3),
+                        "avg_ms": round(total / n * 1000, 4),
+                        "max_ms": round(mx * 1000, 3)} for sql, n, total, mx in items),
+                      key=lambda r: r["total_ms"], reverse=True)
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+        self._local = threading.local()
 
     def create_tables(self):
-        with self.get_connection() as conn:
-            queries = [
-                """
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE,
-                    password_hash TEXT
-                );
-                """,
-                """
-                CREATE TABLE IF NOT EXISTS roles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    role_name TEXT UNIQUE
-                );
-                """,
-                """
-                CREATE TABLE IF NOT EXISTS user_roles (
-                    user_id INTEGER,
-                    role_id INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (role_id) REFERENCES roles(id)
-                );
-                """,
-                """
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename TEXT,
-                    filepath TEXT,
-                    category TEXT,
-                    tags TEXT,
-                    date_added TEXT,
-                    encryption_key TEXT
-                );
-                """
-            ]
-            for query in queries:
-                conn.execute(query)
-            conn.commit()
+        """Схема documents.db через DOCS_MIGRATIONS; на актуальной базе — одно чтение user_version."""
+        migrate(self.get_connection(), DOCS_MIGRATIONS, "documents.db")
 
     # ---------- Пользователи ----------
     def add_user(self, username: str, password: str):
         password_hash = hashlib.sha256(password.encode()).hexdigest()
-        with self.get_connection() as conn:
-            conn.execute(
+        with self.get_connection():
+            self.execute(
                 "INSERT INTO users (username, password_hash) VALUES (?, ?)", 
                 (username, password_hash)
             )
-            conn.commit()
 
     def verify_user(self, username: str, password: str) -> bool:
         password_hash = hashlib.sha256(password.encode()).hexdigest()
-        with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT 1 FROM users WHERE username = ? AND password_hash = ?", 
-                (username, password_hash)
-            )
-            return cursor.fetchone() is not None
+        cursor = self.execute(
+            "SELECT 1 FROM users WHERE username = ? AND password_hash = ?", 
+            (username, password_hash)
+        )
+        return cursor.fetchone() is not None
 
     def user_exists(self, username: str) -> bool:
+        cursor = self.execute(
+            "SELECT 1 FROM users WHERE username = ?", 
+            (username,)
+        )
+        return cursor.fetchone() is not None
+
+    def set_user_roles(self, username: str, roles) -> bool:
+        """Заменить роли пользователя (несуществующие роли создаются). False — нет пользователя.
+
+        После фиксации сбрасывает кеш ролей подписчиков (AuthManager) этого процесса — без
+        ожидания TTL. Другие процессы (uvicorn --workers N) увидят новые роли через ROLE_CACHE_TTL.
+        """
+        roles = sorted(set(roles))
         with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT 1 FROM users WHERE username = ?", 
-                (username,)
-            )
-            return cursor.fetchone() is not None
+            row = self.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return False
+            conn.executemany("INSERT OR IGNORE INTO roles (role_name) VALUES (?)",
+                             ((r,) for r in roles))
+            self.execute("DELETE FROM user_roles WHERE user_id = ?", (row[0],))
+            conn.executemany("INSERT INTO user_roles (user_id, role_id) "
+                             "SELECT ?, id FROM roles WHERE role_name = ?",
+                             ((row[0], r) for r in roles))
+        notify_user_changed(username)
+        return True
+
+    def get_user_roles(self, username: str) -> list:
+        cursor = self.execute(
+            "SELECT r.role_name FROM users u "
+            "JOIN user_roles ur ON ur.user_id = u.id "
+            "JOIN roles r ON r.id = ur.role_id WHERE u.username = ?",
+            (username,)
+        )
+        return [row[0] for row in cursor.fetchall()]
 
     # ---------- Работа с Документами ----------
-    def add_document(self, filename, filepath, category, tags):
-        key = Fernet.generate_key()
-        cipher = Fernet(key)
+    def add_document(self, filename, filepath, category, tags, password: str = None):
+        """Положить файл в хранилище блобов (повторное содержимое не дублируется) и удалить исходник.
 
-        with open(filepath, 'rb') as f:
-            encrypted_data = cipher.encrypt(f.read())
+        Без пароля ключ данных хранится в encryption_key, как раньше ключ Fernet.
+        """
+        doc = self.blobs.put_file(filepath, filename, password, category, tags, replace=False)
+        os.remove(filepath)
+        return doc["id"]
 
-        encrypted_path = f"{filepath}.enc"
-        with open(encrypted_path, 'wb') as f:
-            f.write(encrypted_data)
+    def link_document(self, filename, address, size, dek, password, category, tags, filepath):
+        """Строка documents для блоба (вызывается внутри транзакции BlobUpload.commit)."""
+        salt = iterations = wrapped = server_key = None
+        if password:
+            from cryptography.hazmat.primitives.keywrap import aes_key_wrap
+            from modules.crypto_module import KEK_CACHE, KDF_ITERATIONS
+            salt, kek = KEK_CACHE.for_encryption(password, KDF_ITERATIONS)
+            iterations, wrapped = KDF_ITERATIONS, aes_key_wrap(kek, dek)
+        else:
+            server_key = dek.hex()
+        tag_list = normalize_tags(tags)
+        doc_id = self.execute(
+            "INSERT INTO documents (filename, filepath, category, tags, date_added, encryption_key, "
+            "blob_address, size, key_salt, key_iterations, wrapped_key) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, filepath, category, ", ".join(tag_list), datetime.now().isoformat(),
+             server_key, address, size, salt, iterations, wrapped)
+        ).lastrowid
+        self._set_tags(doc_id, tag_list)
+        return doc_id
 
-        os.remove(filepath)
+    def find_document_key(self, filename: str = None, doc_id: int = None):
+        """(blob_address, key_salt, key_iterations, wrapped_key, encryption_key) последней версии документа."""
+        where, arg = ("id = ?", doc_id) if doc_id is not None else ("filename = ?", filename)
+        return self.execute(
+            "SELECT blob_address, key_salt, key_iterations, wrapped_key, encryption_key "
+            f"FROM documents WHERE {where} AND blob_address IS NOT NULL ORDER BY id DESC LIMIT 1",
+            (arg,)
+        ).fetchone()
 
-        with self.get_connection() as conn:
-            conn.execute(
-                "INSERT INTO documents (filename, filepath, category, tags, date_added, encryption_key) VALUES (?, ?, ?, ?, ?, ?)",
-                (filename, encrypted_path, category, tags, datetime.now().isoformat(), key.decode())
-            )
-            conn.commit()
+    def delete_document(self, doc_id: int) -> bool:
+        """Удалить документ; блоб освобождается триггером и удаляется gc(), если ссылок не осталось."""
+        with self.get_connection():
+            return self.execute("DELETE FROM documents WHERE id = ?", (doc_id,)).rowcount > 0
 
-    def decrypt_document(self, document_id, output_path):
+    def _set_tags(self, doc_id: int, tag_list):
+        self.execute("DELETE FROM document_tags WHERE document_id = ?", (doc_id,))
+        self.get_connection().executemany(
+            "INSERT OR IGNORE INTO document_tags (tag, document_id) VALUES (?, ?)",
+            ((t, doc_id) for t in tag_list))
+
+    def rebuild_tags(self, doc_ids=None):
+        """Пересобрать document_tags по documents.tags (всех документов или doc_ids)."""
         with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT filepath, encryption_key FROM documents WHERE id = ?", 
-                (document_id,)
-            )
-            row = cursor.fetchone()
+            _rebuild_tags(conn, doc_ids)
 
-            if not row:
-                raise ValueError("Документ не найден")
+    def set_tags(self, doc_id: int, tags):
+        tag_list = normalize_tags(tags)
+        with self.get_connection():
+            self.execute("UPDATE documents SET tags = ? WHERE id = ?", (", ".join(tag_list), doc_id))
+            self._set_tags(doc_id, tag_list)
 
-            encrypted_path, key = row
-            cipher = Fernet(key.encode())
+    def decrypt_document(self, document_id, output_path, password: str = None):
+        reader = self.blobs.open(password=password, doc_id=document_id)
+        if reader is not None:
+            with reader, open(output_path, 'wb') as f:
+                for chunk in reader.iter_range():
+                    f.write(chunk)
+            return
 
-            with open(encrypted_path, 'rb') as f:
-                decrypted_data = cipher.decrypt(f.read())
+        row = self.execute(
+            "SELECT filepath, encryption_key FROM documents WHERE id = ?", 
+            (document_id,)
+        ).fetchone()
 
-            with open(output_path, 'wb') as f:
-                f.write(decrypted_data)
+        if not row:
+            raise ValueError("Документ не найден")
 
-    def search_documents(self, keyword):
-        with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT * FROM documents WHERE filename LIKE ? OR tags LIKE ? OR category LIKE ?",
-                (f"%{keyword}%", f"%{keyword}%", f"%{keyword}%")
-            )
-            return cursor.fetchall()
+        encrypted_path, key = row
+        from cryptography.fernet import Fernet
+        cipher = Fernet(key.encode())
+
+        with open(encrypted_path, 'rb') as f:
+            decrypted_data = cipher.decrypt(f.read())
+
+        with open(output_path, 'wb') as f:
+            f.write(decrypted_data)
+
+    def search_documents(self, keyword: str = "", *, category: str | None = None,
+                         tags=None, prefix: bool = True, limit: int = SEARCH_LIMIT,
+                         after: str | None = None) -> dict:
+        """Полнотекстовый поиск по имени файла, тегам и категории.
+
+        Слова запроса обязательны все, при prefix=True каждое ищется как префикс.
+        category — точное совпадение, tags — документ должен иметь все перечисленные теги.
+        С запросом результаты ранжируются по bm25, без запроса — сначала новые.
+        Возвращает {"items": [...], "next": курсор|None}; курсор передаётся в after.
+        """
+        limit = max(1, min(int(limit), SEARCH_LIMIT_MAX))
+        match = fts_query(keyword, prefix)
+        cols = ", ".join(f"d.{c}" for c in DOC_COLUMNS)
+        cond, prm = [], []
+        if match:
+            score = f"bm25(documents_fts, {', '.join(map(str, SEARCH_WEIGHTS))})"
+            sql = (f"SELECT {cols}, {score} AS score FROM documents_fts "
+                   "JOIN documents d ON d.id = documents_fts.rowid")
+            cond.append("documents_fts MATCH ?")
+            prm.append(match)
+            keys, order = (score, "d.id"), f"{score}, d.id"
+        tag_list = normalize_tags(tags)
+        if not match and tag_list:
+            # Без запроса ведущая таблица — первый тег: индекс (tag, document_id) уже отсортирован
+            # по id, и выборка останавливается на первой странице независимо от размера базы
+            sql = (f"SELECT {cols}, NULL AS score FROM document_tags t "
+                   "JOIN documents d ON d.id = t.document_id")
+            cond.append("t.tag = ?")
+            prm.append(tag_list.pop(0))
+            keys, order = ("d.id",), "t.document_id DESC"
+        elif not match:
+            sql = f"SELECT {cols}, NULL AS score FROM documents d"
+            keys, order = ("d.id",), "d.id DESC"
+        if category is not None:
+            cond.append("d.category = ?")
+            prm.append(category)
+        for tag in tag_list:
+            cond.append("d.id IN (SELECT document_id FROM document_tags WHERE tag = ?)")
+            prm.append(tag)
+        if after:
+            last = decode_cursor(after)
+            if len(last) != len(keys):
+                raise ValueError("Некорректный курсор")
+            cond.append(f"({', '.join(keys)}) > ({', '.join('?' * len(keys))})" if match
+                        else ("t.document_id < ?" if "document_tags t" in sql else "d.id < ?"))
+            prm.extend(last)
+        sql += (" WHERE " + " AND ".join(cond) if cond else "") + f" ORDER BY {order} LIMIT ?"
+        try:
+            rows = self.execute(sql, prm + [limit + 1]).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Некорректный поисковый запрос: {e}")
+
+        items = [dict(zip(DOC_COLUMNS + ("score",), r)) for r in rows[:limit]]
+        nxt = None
+        if len(rows) > limit:
+            last = items[-1]
+            nxt = encode_cursor([last["score"], last["id"]] if match else [last["id"]])
+        return {"items": items, "next": nxt}
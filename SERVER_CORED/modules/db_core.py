@@ -1,40 +1,373 @@
 
-import asyncio, sqlite3, bcrypt, secrets, datetime, shutil
+import asyncio, sqlite3, secrets, datetime, shutil, threading, base64, json, gzip, os, re, time
+import heapq, itertools, weakref
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Optional
+
+from modules.hasher import get_hasher
+from modules.migrations import add_columns, migrate
+from modules.metrics import counter, gauge, histogram
 
 MAX_FAILED = 5
 TOKEN_LIFETIME = datetime.timedelta(minutes=30)
 
-_QUEUE: 'asyncio.Queue[Task]' = asyncio.Queue()
-
-def get_queue() -> asyncio.Queue:
+# Групповая фиксация: воркер набирает до BATCH_MAX задач, ожидая не дольше BATCH_WAIT секунд,
+# и выполняет их одной транзакцией за один переход в поток. BATCH_MAX=1 — по задаче за раз.
+BATCH_MAX = 64
+BATCH_WAIT = 0.002
+
+# Чтение: пул read-only соединений (WAL позволяет читать параллельно с писателем).
+# READ_POOL_SIZE=0 отключает пул — тогда всё идёт через очередь воркера.
+READ_POOL_SIZE = 4
+READ_OPS = frozenset({"get", "check", "check_bulk", "auth", "list_users", "job_get", "job_list"})
+
+# Бэкапы: онлайн-копия через SQLite backup API порциями по BACKUP_STEP_PAGES страниц с паузой
+# BACKUP_STEP_SLEEP между ними. Плановые копии пишутся в подкаталог BACKUP_AUTO_DIR, и только
+# среди них хранится по одной на час (KEEP_HOURLY) и на день (KEEP_DAILY); ручные не удаляются.
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+BACKUP_COMPRESS = True
+BACKUP_KEEP_HOURLY = 24
+BACKUP_KEEP_DAILY = 7
+BACKUP_AUTO_DIR = "auto"
+_BACKUP_NAME = re.compile(r"^(\d{8})_(\d{2})\d{4}_.*\.db(\.gz)?$")
+
+# Список пользователей: колонки, которые можно запросить (pwd сюда не входит никогда)
+USER_COLUMNS = ("login", "full_name", "iin", "phone", "role", "created_at",
+                "last_login_at", "email_confirmed", "phone_confirmed",
+                "failed_logins", "is_blocked", "is_deleted")
+LIST_COLUMNS = ("login", "full_name", "phone", "role", "created_at",
+                "email_confirmed", "is_blocked", "is_deleted")
+PAGE_SIZE = 50
+PAGE_SIZE_MAX = 500
+# Уникальные реквизиты, которые проверяют check_free / check_free_bulk
+CHECK_FIELDS = ("login", "phone", "iin")
+
+# --- Схема (modules.migrations): шаги только дописываются в конец ---
+# Колонки users, которых нет в базах, созданных ранними версиями
+_USERS_LEGACY_COLUMNS = (
+    ("last_login_at", "TEXT"),
+    ("email_confirmed", "INTEGER DEFAULT 0"),
+    ("phone_confirmed", "INTEGER DEFAULT 0"),
+    ("failed_logins", "INTEGER DEFAULT 0"),
+    ("is_blocked", "INTEGER DEFAULT 0"),
+    ("is_deleted", "INTEGER DEFAULT 0"),
+)
+USERS_MIGRATIONS = [
+    ("users и reset_tokens", """
+        CREATE TABLE IF NOT EXISTS users(
+            login TEXT PRIMARY KEY,
+            full_name TEXT,
+            iin TEXT UNIQUE DEFAULT '',
+            pwd TEXT NOT NULL,
+            phone TEXT UNIQUE,
+            role TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            last_login_at TEXT,
+            email_confirmed INTEGER DEFAULT 0,
+            phone_confirmed INTEGER DEFAULT 0,
+            failed_logins INTEGER DEFAULT 0,
+            is_blocked INTEGER DEFAULT 0,
+            is_deleted INTEGER DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS reset_tokens(
+            token TEXT PRIMARY KEY,
+            login TEXT,
+            expires_at TEXT
+        );"""),
+    ("колонки старых баз", lambda conn: add_columns(conn, "users", _USERS_LEGACY_COLUMNS)),
+    # Список пользователей: сортировка по created_at и фильтр по роли идут по индексу,
+    # курсор (created_at, login) / (role, login) — без сортировки в памяти
+    ("индексы списка пользователей", """
+        CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at, login);
+        CREATE INDEX IF NOT EXISTS idx_users_role ON users(role, login);"""),
+    # Статус массового импорта (modules.user_import) — в базе, чтобы его видел любой воркер
+    ("import_jobs", """
+        CREATE TABLE IF NOT EXISTS import_jobs(
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            format TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            rows INTEGER DEFAULT 0,
+            inserted INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            errors TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_import_jobs_created ON import_jobs(created_at);"""),
+]
+IMPORT_JOB_COLUMNS = ("id", "status", "format", "created_at", "updated_at",
+                      "rows", "inserted", "failed", "errors", "error")
+
+# Очередь писателя: не больше QUEUE_MAX задач. В полную очередь producer ждёт места не дольше
+# QUEUE_PUT_TIMEOUT секунд (0 — отказ сразу), затем DBOverloaded.
+QUEUE_MAX = 10000
+QUEUE_PUT_TIMEOUT = 1.0
+# Классы приоритета: меньший выполняется раньше, внутри класса — по порядку поступления
+PRIO_INTERACTIVE, PRIO_WRITE, PRIO_BULK, PRIO_MAINTENANCE = range(4)
+OP_PRIORITY = {
+    "get": PRIO_INTERACTIVE, "check": PRIO_INTERACTIVE, "auth": PRIO_INTERACTIVE,
+    "login_ok": PRIO_INTERACTIVE, "login_failed": PRIO_INTERACTIVE, "list_users": PRIO_INTERACTIVE,
+    "job_get": PRIO_INTERACTIVE, "job_list": PRIO_INTERACTIVE,
+    "upd_contacts": PRIO_BULK, "check_bulk": PRIO_BULK, "add_many": PRIO_BULK, "job_save": PRIO_BULK,
+    "backup": PRIO_MAINTENANCE,
+}   # остальные — PRIO_WRITE
+# Сколько задача класса может ждать в очереди (сек, None — без срока); просроченная не выполняется
+PRIORITY_DEADLINE = {PRIO_INTERACTIVE: 5.0, PRIO_WRITE: 30.0, PRIO_BULK: None, PRIO_MAINTENANCE: None}
+
+_PRIO_NAMES = ("interactive", "write", "bulk", "maintenance")
+
+# --- Метрики (/metrics) ---
+_M_QUEUE_WAIT = histogram("db_queue_wait_seconds", "Ожидание задачи в очереди писателя", ("priority",))
+_M_OP = histogram("db_op_seconds", "Выполнение операции БД (writer — в пакете, read — в пуле чтения)",
+                  ("op", "path"))
+_M_COMMIT = histogram("db_commit_seconds", "Длительность COMMIT пакета")
+_M_BATCH = histogram("db_batch_size", "Задач в пакете групповой фиксации",
+                     buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+_M_DROPPED = counter("db_tasks_dropped_total", "Задачи, не выполненные писателем", ("reason",))
+_M_DEPTH = gauge("db_queue_depth", "Задач в очереди писателя", ("priority",))
+
+def _queue_depth() -> dict:
+    st = _QUEUE.stats() if _QUEUE is not None else {}
+    return {(name,): st.get(name, 0) for name in _PRIO_NAMES}
+
+_M_DEPTH.set_function(_queue_depth)
+
+class DBBusy(Exception):
+    """База не успевает: задача не принята или не выполнена из-за перегрузки."""
+
+class DBOverloaded(DBBusy):
+    """Очередь писателя полна дольше QUEUE_PUT_TIMEOUT."""
+
+class DBTaskExpired(DBBusy):
+    """Задача простояла в очереди дольше своего срока и не выполнялась."""
+
+_QUEUE: Optional["TaskQueue"] = None
+_READ_POOL: Optional["ReadPool"] = None
+
+def get_queue() -> "TaskQueue":
+    """Очередь писателя текущего цикла событий (создаётся при первом обращении)."""
+    global _QUEUE
+    if _QUEUE is None or _QUEUE.loop is not asyncio.get_running_loop():
+        _QUEUE = TaskQueue(QUEUE_MAX)
     return _QUEUE
 
+def get_read_pool() -> Optional["ReadPool"]:
+    return _READ_POOL
+
+# Подписчики на изменение роли/удаление пользователя (например, кеш ролей AuthManager). Методы
+# хранятся по слабой ссылке: подписка не держит объект живым, умершие подписчики выпадают сами.
+_USER_LISTENERS: List[Callable[[], Optional[Callable[[str], None]]]] = []
+
+def add_user_listener(fn: Callable[[str], None]) -> None:
+    if getattr(fn, "__func__", None) is not None:
+        _USER_LISTENERS.append(weakref.WeakMethod(fn))
+    else:
+        _USER_LISTENERS.append(lambda: fn)
+
+def remove_user_listener(fn: Callable[[str], None]) -> None:
+    _USER_LISTENERS[:] = [ref for ref in _USER_LISTENERS if ref() not in (None, fn)]
+
+def notify_user_changed(login: str) -> None:
+    """Сбросить сведения о пользователе у подписчиков этого процесса (роли, блокировка).
+
+    Действует только внутри процесса. Между процессами users.db-события рассылает владелец
+    (modules.db_server); прочие источники (роли в documents.db) другие воркеры uvicorn
+    --workers N не увидят раньше, чем истечёт их ROLE_CACHE_TTL.
+    """
+    alive = [(ref, ref()) for ref in list(_USER_LISTENERS)]
+    if any(fn is None for _, fn in alive):
+        _USER_LISTENERS[:] = [ref for ref, fn in alive if fn is not None]
+    for _, fn in alive:
+        if fn is not None:
+            fn(login)
+
 @dataclass
 class Task:
     op: Literal["add", "get", "del", "set_role", "upd_pwd",
-                "upd_contacts", "check", "auth", "backup",
+                "upd_contacts", "check", "check_bulk", "auth", "login_ok", "login_failed",
+                "list_users", "backup",
                 "confirm_email", "confirm_phone",
                 "request_pwd_reset", "reset_password",
-                "unblock", "restore_user"]
+                "unblock", "restore_user",
+                "add_many", "job_save", "job_get", "job_list"]
     payload: Dict[str, Any]
     fut: asyncio.Future
+    priority: int = PRIO_WRITE
+    deadline: Optional[float] = None    # loop.time(), после которого задачу не выполняем
+    enqueued: float = 0.0               # loop.time() постановки в очередь
+
+class TaskQueue(asyncio.Queue):
+    """Ограниченная очередь задач с приоритетами (куча по (priority, номер поступления)).
+
+    Отменённые задачи (клиент отключился) выбрасываются при извлечении, а если очередь
+    полна — сразу, через purge().
+    """
+    def __init__(self, maxsize: int = QUEUE_MAX):
+        super().__init__(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self.counters = {"rejected": 0, "cancelled": 0, "expired": 0}
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._seq = itertools.count()
+
+    def _put(self, task):
+        heapq.heappush(self._queue, (task.priority, next(self._seq), task))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[2]
+
+    def purge(self) -> int:
+        """Убрать из очереди задачи, чей future уже завершён; вернуть их число."""
+        live = [e for e in self._queue if not e[2].fut.done()]
+        n = len(self._queue) - len(live)
+        if n:
+            heapq.heapify(live)
+            self._queue = live
+            self.count("cancelled", n)
+            for _ in range(n):
+                self.task_done()
+                self._wakeup_next(self._putters)
+        return n
+
+    def count(self, reason: str, n: int = 1):
+        self.counters[reason] += n
+        _M_DROPPED.labels(reason).inc(n)
+
+    def stats(self) -> dict:
+        depth = [0] * (PRIO_MAINTENANCE + 1)
+        for prio, _, _ in self._queue:
+            depth[min(prio, PRIO_MAINTENANCE)] += 1
+        return dict(self.counters, size=self.qsize(), maxsize=self.maxsize,
+                    interactive=depth[PRIO_INTERACTIVE], write=depth[PRIO_WRITE],
+                    bulk=depth[PRIO_BULK], maintenance=depth[PRIO_MAINTENANCE])
+
+def encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Некорректный курсор")
+    if not isinstance(values, list):
+        raise ValueError("Некорректный курсор")
+    return values
+
+def sql_timestamp(value) -> str:
+    """Дата/время ISO 8601 (строка или datetime) -> формат created_at: "YYYY-MM-DD HH:MM:SS" UTC.
+
+    CURRENT_TIMESTAMP пишет через пробел; "2024-01-31T10:00" как строка больше любого времени
+    этого дня, поэтому границы сравниваются только в этом виде. Не ISO — ValueError.
+    """
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromisoformat(str(value))
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+def users_where(role=None, blocked=None, deleted=False, created_from=None, created_to=None):
+    """WHERE по фильтрам списка пользователей. None — фильтр не применяется.
+
+    created_from включительно, created_to — нет; границы приводятся sql_timestamp()
+    (некорректная дата — ValueError).
+    """
+    cond, prm = [], []
+    if role is not None:
+        cond.append("role=?"); prm.append(role)
+    if blocked is not None:
+        cond.append("is_blocked=?"); prm.append(int(blocked))
+    if deleted is not None:
+        cond.append("is_deleted=?"); prm.append(int(deleted))
+    for op, value in ((">=", created_from), ("<", created_to)):
+        if value:
+            try:
+                value = sql_timestamp(value)
+            except ValueError:
+                raise ValueError(f"Некорректная дата: {value}")
+            cond.append(f"created_at{op}?"); prm.append(value)
+    return cond, prm
+
+class ReadPool:
+    """Пул read-only соединений: у каждого потока ThreadPoolExecutor своё соединение.
+
+    Операции берутся у воркера (`_op_<op>`), так что SQL чтения один и тот же
+    для пула и для очереди.
+    """
+    def __init__(self, worker: "DBWorker", size: int = READ_POOL_SIZE):
+        self._worker = worker
+        self._uri = worker._db_path.resolve().as_uri() + "?mode=ro"
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size,
+                                            thread_name_prefix="db-read")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _sync_run(self, op, payload):
+        t0 = time.perf_counter()
+        try:
+            return getattr(self._worker, f"_op_{op}")(self._conn(), payload)
+        finally:
+            _M_OP.labels(op, "read").observe(time.perf_counter() - t0)
+
+    async def run(self, op: str, payload: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._sync_run, op, payload)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns.clear()
 
 class DBProducer:
-    def __init__(self):
-        self._q = _QUEUE
+    def __init__(self, read_ops=READ_OPS, hasher=None, put_timeout: float = QUEUE_PUT_TIMEOUT):
+        self._q = get_queue()
         self._loop = asyncio.get_running_loop()
+        self._read_ops = frozenset(read_ops)
+        self._hasher = hasher or get_hasher()
+        self._put_timeout = put_timeout
+        self._dummy_hash = None
 
     async def _call(self, op: str, **kw):
-        fut = self._loop.create_future()
-        await self._q.put(Task(op, kw, fut))
-        return await fut
+        pool = _READ_POOL
+        if pool is not None and op in self._read_ops:
+            return await pool.run(op, kw)
+        prio = OP_PRIORITY.get(op, PRIO_WRITE)
+        ttl = PRIORITY_DEADLINE.get(prio)
+        now = self._loop.time()
+        task = Task(op, kw, self._loop.create_future(), prio,
+                    None if ttl is None else now + ttl, now)
+        q = self._q
+        if q.full() and not q.purge():
+            try:
+                await asyncio.wait_for(q.put(task), self._put_timeout)
+            except asyncio.TimeoutError:
+                q.count("rejected")
+                raise DBOverloaded(f"Очередь БД переполнена ({q.maxsize} задач)") from None
+        else:
+            q.put_nowait(task)
+        # Отмена вызывающего (клиент отключился) отменяет и task.fut — воркер задачу пропустит
+        return await task.fut
 
     async def add_user(self, login: str, password: str, full_name: str,
                        phone: str, role: str = "", iin: str = ""):
-        pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        pw_hash = await self._hasher.hash(password)
         return await self._call("add", login=login, pwd=pw_hash,
                                 full_name=full_name, phone=phone,
                                 role=role, iin=iin)
@@ -43,16 +376,22 @@ class DBProducer:
         return await self._call("get", login=login)
 
     async def del_user(self, login: str):
-        return await self._call("del", login=login)
+        res = await self._call("del", login=login)
+        notify_user_changed(login)
+        return res
 
     async def restore_user(self, login: str):
-        return await self._call("restore_user", login=login)
+        res = await self._call("restore_user", login=login)
+        notify_user_changed(login)
+        return res
 
     async def set_role(self, login: str, role: str):
-        return await self._call("set_role", login=login, role=role)
+        res = await self._call("set_role", login=login, role=role)
+        notify_user_changed(login)
+        return res
 
     async def update_password(self, login: str, new_password: str):
-        pw_hash = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
+        pw_hash = await self._hasher.hash(new_password)
         return await self._call("upd_pwd", login=login, pwd=pw_hash)
 
     async def update_contacts(self, login: str, *,
@@ -65,8 +404,45 @@ class DBProducer:
     async def check_free(self, *, login=None, phone=None, iin=None):
         return await self._call("check", login=login, phone=phone, iin=iin)
 
-    async def auth(self, login: str, password: str):
-        return await self._call("auth", login=login, password=password)
+    async def check_free_bulk(self, *, logins=(), phones=(), iins=()) -> Dict[str, List[str]]:
+        """Какие из кандидатов уже заняты: {"login": [...], "phone": [...], "iin": [...]}.
+
+        Один вызов на тысячи значений (предпроверка массового импорта); пустые значения
+        не проверяются, повторы внутри списка не учитываются.
+        """
+        return await self._call("check_bulk", login=list(logins), phone=list(phones), iin=list(iins))
+
+    async def auth(self, login: str, password: str) -> bool:
+        # 1) хеш и состояние — чтением (пул, если есть); 2) bcrypt — в пуле хешера;
+        # 3) счётчики — одной записью. Воркер не держит задачу на время bcrypt.
+        row = await self._call("auth", login=login)
+        if row is None or row[1]:
+            # Нет такого логина или он заблокирован: bcrypt всё равно считается, иначе по
+            # времени ответа видно, какие логины существуют
+            await self._dummy_verify(password)
+            return False
+        pwd, _ = row
+        if await self._hasher.verify(password, pwd):
+            return await self._call("login_ok", login=login)
+        await self._call("login_failed", login=login, max_failed=MAX_FAILED)
+        return False
+
+    async def _dummy_verify(self, password: str):
+        """Проверка против постоянного хеша той же стоимости, что и настоящие (хеш — один раз)."""
+        if self._dummy_hash is None:
+            self._dummy_hash = await self._hasher.hash(secrets.token_urlsafe(16))
+        await self._hasher.verify(password, self._dummy_hash)
+
+    async def list_users(self, *, after: Optional[str] = None,
+                         order: Literal["login", "created_at"] = "login",
+                         desc: bool = False, limit: int = PAGE_SIZE,
+                         columns=LIST_COLUMNS, role: Optional[str] = None,
+                         blocked: Optional[bool] = None,
+                         deleted: Optional[bool] = False):
+        """Страница пользователей по ключу (keyset): {"items": [dict], "next": курсор | None}."""
+        return await self._call("list_users", after=after, order=order, desc=desc,
+                                limit=limit, columns=columns, role=role,
+                                blocked=blocked, deleted=deleted)
 
     async def confirm_email(self, login: str):
         return await self._call("confirm_email", login=login)
@@ -78,138 +454,461 @@ class DBProducer:
         return await self._call("request_pwd_reset", login=login)
 
     async def reset_password(self, token: str, new_password: str):
-        pw_hash = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
+        pw_hash = await self._hasher.hash(new_password)
         return await self._call("reset_password", token=token, pwd=pw_hash)
 
     async def unblock(self, login: str):
         return await self._call("unblock", login=login)
 
-    async def backup(self, note: str = ""):
-        return await self._call("backup", note=note)
+    async def add_users_bulk(self, rows) -> List[list]:
+        """Вставить пачку [login, pwd_hash, full_name, phone, role, iin] одной задачей (executemany).
+
+        Пароли уже захешированы. Возвращает [индекс строки, текст ошибки] для строк, которые
+        не вставились (уникальность нарушена между проверкой и вставкой); остальные вставлены.
+        """
+        return await self._call("add_many", rows=[list(r) for r in rows])
+
+    async def save_import_job(self, job: dict):
+        return await self._call("job_save", **{k: job.get(k) for k in IMPORT_JOB_COLUMNS})
+
+    async def get_import_job(self, job_id: str) -> Optional[dict]:
+        return await self._call("job_get", id=job_id)
+
+    async def list_import_jobs(self, limit: int = 20) -> List[dict]:
+        return await self._call("job_list", limit=limit)
+
+    async def backup(self, note: str = "", force: bool = False):
+        """Онлайн-бэкап. Если с прошлого снимка БД не менялась и force=False — путь прошлого снимка."""
+        return await self._call("backup", note=note, force=force)
 
 class DBWorker:
-    def __init__(self, db_path="users.db", backup_dir="backups"):
-        self._q = _QUEUE
+    # Операции, которые выполняются в фоне, а не в потоке писателя: очередь не ждёт их окончания
+    _BACKGROUND_OPS = frozenset({"backup"})
+
+    def __init__(self, db_path="users.db", backup_dir="backups",
+                 batch_max: int = BATCH_MAX, batch_wait: float = BATCH_WAIT,
+                 read_pool_size: int = READ_POOL_SIZE,
+                 backup_interval: Optional[float] = None,
+                 backup_compress: bool = BACKUP_COMPRESS,
+                 keep_hourly: int = BACKUP_KEEP_HOURLY,
+                 keep_daily: int = BACKUP_KEEP_DAILY):
+        self._q = get_queue()
         self._db_path = Path(db_path)
         self._backup_dir = Path(backup_dir)
+        self._batch_max = max(1, batch_max)
+        self._batch_wait = batch_wait
+        self._read_pool_size = read_pool_size
+        self._backup_interval = backup_interval
+        self._backup_compress = backup_compress
+        self._keep_hourly = keep_hourly
+        self._keep_daily = keep_daily
+        self._backup_lock = asyncio.Lock()
+        self._backup_src = None
+        # Последний снимок по назначению (ручные — backup_dir, плановые — BACKUP_AUTO_DIR):
+        # {scheduled: (data_version, путь)}. Ручная копия не заменяет плановую и наоборот.
+        self._last_backup = {}
+        self._background = set()
+        self.ready = asyncio.Event()    # БД открыта, схема создана
 
     def _sync_open(self):
         self._db_path.parent.mkdir(parents=True, exist_ok=True)
         self._backup_dir.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        # isolation_level=None: транзакциями пакета управляем сами (BEGIN/SAVEPOINT/COMMIT)
+        conn = sqlite3.connect(self._db_path, check_same_thread=False,
+                               isolation_level=None)
         conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("""CREATE TABLE IF NOT EXISTS users(
-            ALTER TABLE users ADD COLUMN is_deleted INTEGER DEFAULT 0;
-            login TEXT PRIMARY KEY,
-            full_name TEXT,
-            iin TEXT UNIQUE DEFAULT '',
-            pwd TEXT NOT NULL,
-            phone TEXT UNIQUE,
-            role TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            last_login_at TEXT,
-            email_confirmed INTEGER DEFAULT 0,
-            phone_confirmed INTEGER DEFAULT 0,
-            failed_logins INTEGER DEFAULT 0,
-            is_blocked INTEGER DEFAULT 0,
-            is_deleted INTEGER DEFAULT 0
-        );""")
-        conn.execute("""CREATE TABLE IF NOT EXISTS reset_tokens(
-            token TEXT PRIMARY KEY,
-            login TEXT,
-            expires_at TEXT
-        );""")
-        conn.commit()
+        migrate(conn, USERS_MIGRATIONS, "users.db")
         return conn
 
-    def _sync_backup(self, note):
-        t = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        dst = self._backup_dir / f"{t}_{note or 'auto'}.db"
-        shutil.copy2(self._db_path, dst)
-        return dst
+    def _sync_backup(self, note, force=False, scheduled=False):
+        if self._backup_src is None:
+            uri = self._db_path.resolve().as_uri() + "?mode=ro"
+            self._backup_src = sqlite3.connect(uri, uri=True, isolation_level=None,
+                                               check_same_thread=False)
+        src = self._backup_src
+        # Открытая транзакция чтения держит снимок WAL: шаги бэкапа копируют одну и ту же версию,
+        # а чужие коммиты между шагами не перезапускают копирование. Писатель при этом не ждёт.
+        src.execute("BEGIN")
+        try:
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            version = src.execute("PRAGMA data_version").fetchone()[0]
+            last = self._last_backup.get(scheduled)
+            if not force and last and last[0] == version and last[1].exists():
+                return last[1]
+            t = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            target_dir = self._backup_dir / BACKUP_AUTO_DIR if scheduled else self._backup_dir
+            target_dir.mkdir(parents=True, exist_ok=True)
+            dst_path = target_dir / f"{t}_{note or 'auto'}.db"
+            n = 1
+            while dst_path.exists() or dst_path.with_name(dst_path.name + ".gz").exists():
+                n += 1
+                dst_path = target_dir / f"{t}_{note or 'auto'}_{n}.db"
+            tmp_path = dst_path.with_name(dst_path.name + ".part")
+            dst = sqlite3.connect(tmp_path)
+            try:
+                src.backup(dst, pages=BACKUP_STEP_PAGES,
+                           progress=lambda *_: time.sleep(BACKUP_STEP_SLEEP))
+                check = dst.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                dst.close()
+        finally:
+            src.execute("COMMIT")
+        if check != "ok":
+            tmp_path.unlink(missing_ok=True)
+            raise sqlite3.DatabaseError(f"Копия не прошла integrity_check: {check}")
+
+        if self._backup_compress:
+            final = dst_path.with_name(dst_path.name + ".gz")
+            with open(tmp_path, "rb") as f_in, gzip.open(final.with_name(final.name + ".part"), "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            os.replace(final.with_name(final.name + ".part"), final)
+            tmp_path.unlink()
+        else:
+            final = dst_path
+            os.replace(tmp_path, final)
+        self._last_backup[scheduled] = (version, final)
+        if scheduled:
+            self._apply_retention(keep={final.name})
+        return final
+
+    def _apply_retention(self, keep=()):
+        """Среди плановых копий (BACKUP_AUTO_DIR) оставляет самую свежую в каждом из последних
+        keep_hourly часов и keep_daily дней. Ручные копии и файлы в самом backup_dir не трогает."""
+        auto_dir = self._backup_dir / BACKUP_AUTO_DIR
+        files = sorted((p for p in auto_dir.iterdir() if p.is_file() and _BACKUP_NAME.match(p.name)),
+                       key=lambda p: (p.name[:15], p.stat().st_mtime), reverse=True)
+        hours, days, keep = set(), set(), set(keep)
+        for p in files:
+            day, hour = _BACKUP_NAME.match(p.name).group(1, 2)
+            if len(hours) < self._keep_hourly and (day, hour) not in hours:
+                hours.add((day, hour)); keep.add(p.name)
+            if len(days) < self._keep_daily and day not in days:
+                days.add(day); keep.add(p.name)
+        for p in files:
+            if p.name not in keep:
+                p.unlink(missing_ok=True)
+
+    async def _run_background(self, t):
+        try:
+            async with self._backup_lock:
+                res = await asyncio.to_thread(self._sync_backup, t.payload["note"],
+                                              t.payload.get("force", False))
+        except Exception as e:
+            if not t.fut.done():
+                t.fut.set_exception(e)
+        else:
+            if not t.fut.done():
+                t.fut.set_result(res)
+
+    async def _periodic_backup(self):
+        while True:
+            await asyncio.sleep(self._backup_interval)
+            try:
+                async with self._backup_lock:
+                    await asyncio.to_thread(self._sync_backup, "auto", False, True)
+            except Exception:
+                pass    # следующая попытка через интервал; ручной бэкап вернёт ошибку вызывающему
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
 
     async def run(self):
+        global _READ_POOL
         conn = await asyncio.to_thread(self._sync_open)
-        while True:
-            t: Task = await self._q.get()
+        # Пул поднимаем после _sync_open: read-only соединениям нужен уже созданный файл и схема
+        pool = ReadPool(self, self._read_pool_size) if self._read_pool_size > 0 else None
+        _READ_POOL = pool
+        self.ready.set()
+        if self._backup_interval:
+            self._spawn(self._periodic_backup())
+        try:
+            while True:
+                batch = []
+                for t in await self._collect():
+                    if t.op in self._BACKGROUND_OPS:
+                        self._q.task_done()
+                        self._spawn(self._run_background(t))
+                    else:
+                        batch.append(t)
+                if not batch:
+                    continue
+                _M_BATCH.observe(len(batch))
+                try:
+                    results = await asyncio.to_thread(self._sync_batch, conn, batch)
+                except Exception as e:
+                    results = [(False, e)] * len(batch)
+                for t, (ok, val) in zip(batch, results):
+                    self._q.task_done()
+                    if t.fut.done():
+                        continue
+                    if ok:
+                        t.fut.set_result(val)
+                    else:
+                        t.fut.set_exception(val)
+        finally:
+            for task in list(self._background):
+                task.cancel()
+            if _READ_POOL is pool:
+                _READ_POOL = None
+            if pool is not None:
+                pool.close()
+            conn.close()
+            if self._backup_src is not None:
+                self._backup_src.close()
+                self._backup_src = None
+
+    def _accept(self, t) -> bool:
+        """False — задачу не выполняем: вызывающий её отменил или истёк её срок."""
+        now = self._q.loop.time()
+        if t.fut.done():
+            self._q.count("cancelled")
+        elif t.deadline is not None and now > t.deadline:
+            self._q.count("expired")
+            t.fut.set_exception(DBTaskExpired(f"{t.op}: задача не дождалась очереди"))
+        else:
+            _M_QUEUE_WAIT.labels(_PRIO_NAMES[min(t.priority, PRIO_MAINTENANCE)]).observe(now - t.enqueued)
+            return True
+        self._q.task_done()
+        return False
+
+    async def _collect(self):
+        """Забирает из очереди пакет задач: до batch_max штук или пока не истечёт batch_wait."""
+        batch = []
+        while not batch:
+            t = await self._q.get()
+            if self._accept(t):
+                batch.append(t)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._batch_wait
+        while len(batch) < self._batch_max:
+            if not self._q.empty():
+                t = self._q.get_nowait()
+            else:
+                left = deadline - loop.time()
+                if left <= 0:
+                    break
+                try:
+                    t = await asyncio.wait_for(self._q.get(), left)
+                except asyncio.TimeoutError:
+                    break
+            if self._accept(t):
+                batch.append(t)
+        return batch
+
+    def _sync_batch(self, c, batch):
+        """Выполняет пакет в одной транзакции; каждая задача — под своим SAVEPOINT.
+
+        Возвращает список (ok, результат | исключение) в порядке задач.
+        """
+        results = [None] * len(batch)
+        pending = []            # индексы задач, ожидающих COMMIT
+
+        def fail_pending(e):
+            for i in pending:
+                results[i] = (False, e)
+            pending.clear()
+
+        def commit():
+            if not c.in_transaction:
+                return
+            t0 = time.perf_counter()
             try:
-                await getattr(self, f"_op_{t.op}")(conn, t)
+                c.execute("COMMIT")
+                _M_COMMIT.observe(time.perf_counter() - t0)
             except Exception as e:
-                t.fut.set_exception(e)
-            finally:
-                self._q.task_done()
-
-    async def _op_add(self, c, t):
+                if c.in_transaction:
+                    c.execute("ROLLBACK")
+                fail_pending(e)
+            pending.clear()
+
+        for i, t in enumerate(batch):
+            op = getattr(self, f"_op_{t.op}", None)
+            if op is None:
+                results[i] = (False, AttributeError(f"Неизвестная операция: {t.op}"))
+                continue
+            if not c.in_transaction:
+                c.execute("BEGIN")
+            c.execute("SAVEPOINT task")
+            t0 = time.perf_counter()
+            try:
+                res = op(c, t.payload)
+                c.execute("RELEASE task")
+            except Exception as e:
+                _M_OP.labels(t.op, "writer").observe(time.perf_counter() - t0)
+                results[i] = (False, e)
+                if c.in_transaction:
+                    c.execute("ROLLBACK TO task")
+                    c.execute("RELEASE task")
+                else:
+                    # SQLite сам откатил всю транзакцию — соседи по пакету тоже потеряны
+                    fail_pending(e)
+                continue
+            _M_OP.labels(t.op, "writer").observe(time.perf_counter() - t0)
+            results[i] = (True, res)
+            pending.append(i)
+        commit()
+        return results
+
+    def _op_add(self, c, p):
         q = ("INSERT INTO users(login, full_name, iin, pwd, phone, role) "
              "VALUES(:login, :full_name, :iin, :pwd, :phone, :role);")
-        await asyncio.to_thread(c.execute, q, t.payload)
-        await asyncio.to_thread(c.commit)
-        t.fut.set_result(True)
-
-    async def _op_get(self, c, t):
-        cur = await asyncio.to_thread(c.execute,
-            "SELECT * FROM users WHERE login=? AND is_deleted=0", (t.payload["login"],))
-        t.fut.set_result(cur.fetchone())
-
-    async def _op_del(self, c, t):
-        await asyncio.to_thread(c.execute,
-            "UPDATE users SET is_deleted=1 WHERE login=?", (t.payload["login"],))
-        await asyncio.to_thread(c.commit)
-        t.fut.set_result(True)
-
-    async def _op_restore_user(self, c, t):
-        await asyncio.to_thread(c.execute,
-            "UPDATE users SET is_deleted=0 WHERE login=?", (t.payload["login"],))
-        await asyncio.to_thread(c.commit)
-        t.fut.set_result(True)
-
-    async def _op_set_role(self, c, t):
-        await asyncio.to_thread(c.execute,
-            "UPDATE users SET role=? WHERE login=?",
-            (t.payload["role"], t.payload["login"]))
-        await asyncio.to_thread(c.commit)
-        t.fut.set_result(True)
-
-    async def _op_upd_pwd(self, c, t):
-        await asyncio.to_thread(c.execute,
-            "UPDATE users SET pwd=? WHERE login=?",
-            (t.payload["pwd"], t.payload["login"]))
-        await asyncio.to_thread(c.commit)
-        t.fut.set_result(True)
-
-    async def _op_upd_contacts(self, c, t):
+        c.execute(q, p)
+        return True
+
+    def _op_add_many(self, c, p):
+        q = "INSERT INTO users(login, pwd, full_name, phone, role, iin) VALUES(?, ?, ?, ?, ?, ?)"
+        rows = p["rows"]
+        c.execute("SAVEPOINT add_many")
+        try:
+            c.executemany(q, rows)
+            c.execute("RELEASE add_many")
+            return []
+        except sqlite3.IntegrityError:
+            # Кто-то занял реквизит после предпроверки — повторяем построчно, чтобы вставить
+            # остальные и назвать конкретные строки
+            c.execute("ROLLBACK TO add_many")
+            c.execute("RELEASE add_many")
+        failed = []
+        for i, row in enumerate(rows):
+            try:
+                c.execute(q, row)
+            except sqlite3.IntegrityError as e:
+                failed.append([i, str(e)])
+        return failed
+
+    def _op_job_save(self, c, p):
+        cols = ", ".join(IMPORT_JOB_COLUMNS)
+        upd = ", ".join(f"{k}=excluded.{k}" for k in IMPORT_JOB_COLUMNS if k not in ("id", "created_at"))
+        c.execute(f"INSERT INTO import_jobs({cols}) VALUES({', '.join('?' * len(IMPORT_JOB_COLUMNS))}) "
+                  f"ON CONFLICT(id) DO UPDATE SET {upd}",
+                  [json.dumps(p[k], ensure_ascii=False) if k == "errors" else p[k]
+                   for k in IMPORT_JOB_COLUMNS])
+        return True
+
+    @staticmethod
+    def _job_row(row):
+        job = dict(zip(IMPORT_JOB_COLUMNS, row))
+        job["errors"] = json.loads(job["errors"]) if job["errors"] else []
+        return job
+
+    def _op_job_get(self, c, p):
+        row = c.execute(f"SELECT {', '.join(IMPORT_JOB_COLUMNS)} FROM import_jobs WHERE id=?",
+                        (p["id"],)).fetchone()
+        return self._job_row(row) if row else None
+
+    def _op_job_list(self, c, p):
+        # Список — без ошибок по строкам: их смотрят у конкретной задачи
+        cols = [k for k in IMPORT_JOB_COLUMNS if k != "errors"]
+        rows = c.execute(f"SELECT {', '.join(cols)} FROM import_jobs "
+                         "ORDER BY created_at DESC LIMIT ?", (int(p["limit"]),)).fetchall()
+        return [dict(zip(cols, r)) for r in rows]
+
+    def _op_get(self, c, p):
+        return c.execute("SELECT * FROM users WHERE login=? AND is_deleted=0",
+                         (p["login"],)).fetchone()
+
+    def _op_del(self, c, p):
+        c.execute("UPDATE users SET is_deleted=1 WHERE login=?", (p["login"],))
+        return True
+
+    def _op_restore_user(self, c, p):
+        c.execute("UPDATE users SET is_deleted=0 WHERE login=?", (p["login"],))
+        return True
+
+    def _op_set_role(self, c, p):
+        c.execute("UPDATE users SET role=? WHERE login=?", (p["role"], p["login"]))
+        return True
+
+    def _op_upd_pwd(self, c, p):
+        c.execute("UPDATE users SET pwd=? WHERE login=?", (p["pwd"], p["login"]))
+        return True
+
+    def _op_upd_contacts(self, c, p):
         sets, params = [], []
         for k in ("phone", "iin", "full_name"):
-            v = t.payload.get(k)
+            v = p.get(k)
             if v is not None:
                 sets.append(f"{k}=?")
                 params.append(v)
         if sets:
-            params.append(t.payload["login"])
-            sql = "UPDATE users SET " + ", ".join(sets) + " WHERE login=?"
-            await asyncio.to_thread(c.execute, sql, params)
-            await asyncio.to_thread(c.commit)
-        t.fut.set_result(True)
-
-    async def _op_check(self, c, t):
-        login, phone, iin = t.payload.values()
-        cond, prm = [], []
-        if login: cond.append("login=?"); prm.append(login)
-        if phone: cond.append("phone=?"); prm.append(phone)
-        if iin: cond.append("iin=?"); prm.append(iin)
-        if not cond:
-            t.fut.set_result({})
-            return
-        sql = "SELECT login, phone, iin FROM users WHERE " + " OR ".join(cond)
-        cur = await asyncio.to_thread(c.execute, sql, prm)
-        row = cur.fetchone()
-        busy = {"login": False, "phone": False, "iin": False}
-        if row:
-            busy["login"] = login and row[0] == login
-            busy["phone"] = phone and row[1] == phone
-            busy["iin"] = iin and row[2] == iin
-        t.fut.set_result(busy)
-
-    async def _op_backup(self, c, t):
-        dst = await asyncio.to_thread(self._sync_backup, t.payload["note"])
-        t.fut.set_result(dst)
+            params.append(p["login"])
+            c.execute("UPDATE users SET " + ", ".join(sets) + " WHERE login=?", params)
+        return True
+
+    def _op_check(self, c, p):
+        # Независимые точечные пробы по уникальным индексам (login, phone, iin) через UNION ALL:
+        # OR по трём колонкам мог уйти в полный просмотр и находил только одну из занятых строк
+        probes, prm = [], []
+        for field in CHECK_FIELDS:
+            if p[field]:
+                probes.append(f"SELECT '{field}' FROM users WHERE {field}=?")
+                prm.append(p[field])
+        if not probes:
+            return {}
+        taken = {row[0] for row in c.execute(" UNION ALL ".join(probes), prm)}
+        return {field: field in taken for field in CHECK_FIELDS}
+
+    def _op_check_bulk(self, c, p):
+        # Кандидаты поля — одним JSON-массивом; json_each(?) ведёт join как временная таблица,
+        # а каждая строка ищется по уникальному индексу users (CROSS JOIN фиксирует порядок
+        # обхода). Без записи во временную БД: соединения пула чтения — query_only.
+        sql = " UNION ALL ".join(
+            f"SELECT DISTINCT '{field}', k.value FROM json_each(?) k CROSS JOIN users u "
+            f"ON u.{field} = k.value" for field in CHECK_FIELDS)
+        prm = [json.dumps([v for v in p[field] if v]) for field in CHECK_FIELDS]
+        taken = {field: [] for field in CHECK_FIELDS}
+        for field, value in c.execute(sql, prm):
+            taken[field].append(value)
+        return taken
+
+    def _op_auth(self, c, p):
+        return c.execute("SELECT pwd, is_blocked FROM users WHERE login=? AND is_deleted=0",
+                         (p["login"],)).fetchone()
+
+    def _op_login_ok(self, c, p):
+        # is_blocked=0 в условии: если аккаунт заблокировали, пока шла проверка пароля, вход не засчитываем
+        cur = c.execute("UPDATE users SET failed_logins=0, last_login_at=CURRENT_TIMESTAMP "
+                        "WHERE login=? AND is_blocked=0", (p["login"],))
+        return cur.rowcount > 0
+
+    def _op_login_failed(self, c, p):
+        c.execute("UPDATE users SET failed_logins=failed_logins+1, "
+                  "is_blocked=CASE WHEN failed_logins+1>=? THEN 1 ELSE is_blocked END "
+                  "WHERE login=?", (p["max_failed"], p["login"]))
+        return True
+
+    def _op_unblock(self, c, p):
+        c.execute("UPDATE users SET is_blocked=0, failed_logins=0 WHERE login=?", (p["login"],))
+        return True
+
+    def _op_list_users(self, c, p):
+        order = p["order"]
+        if order not in ("login", "created_at"):
+            raise ValueError(f"Недопустимая сортировка: {order}")
+        cols = [k for k in p["columns"] if k in USER_COLUMNS]
+        if "login" not in cols:
+            cols.insert(0, "login")
+        keys = ["login"] if order == "login" else ["created_at", "login"]
+        limit = max(1, min(int(p["limit"]), PAGE_SIZE_MAX))
+
+        cond, prm = users_where(p["role"], p["blocked"], p["deleted"])
+        if p["after"]:
+            last = decode_cursor(p["after"])
+            if len(last) != len(keys):
+                raise ValueError("Некорректный курсор")
+            cond.append(f"({', '.join(keys)}) {'<' if p['desc'] else '>'} "
+                        f"({', '.join('?' * len(keys))})")
+            prm.extend(last)
+        direction = " DESC" if p["desc"] else ""
+        sql = (f"SELECT {', '.join(cols)}, {', '.join(keys)} FROM users"
+               + (" WHERE " + " AND ".join(cond) if cond else "")
+               + " ORDER BY " + ", ".join(k + direction for k in keys)
+               + " LIMIT ?")
+        rows = c.execute(sql, prm + [limit + 1]).fetchall()
+
+        items = [dict(zip(cols, r)) for r in rows[:limit]]
+        nxt = encode_cursor(list(rows[limit - 1][len(cols):])) if len(rows) > limit else None
+        return {"items": items, "next": nxt}
+
@@ -0,0 +1,315 @@
+"""Многопроцессный режим: один процесс-владелец users.db и HTTP-воркеры, которые шлют ему задачи.
+
+Владелец (`python -m modules.db_server`) держит единственный DBWorker: записи по-прежнему идут
+одной очередью, пакетами, одним писателем. HTTP-воркеры используют RemoteDBProducer: записи
+уходят владельцу по Unix-сокету, чтения выполняются в своём пуле read-only соединений (WAL
+позволяет читать из разных процессов), bcrypt считается в своём процессе.
+
+Протокол — кадры «длина (4 байта, big-endian) + marshal» поверх одного соединения на процесс,
+запросы мультиплексируются по номеру:
+    воркер -> владелец: (id, op, payload)        отмена: (id, None, None)
+    владелец -> воркер: (id, True, результат)    ошибка: (id, False, (имя типа, текст))
+                        (0, None, login)          — изменился пользователь (для кешей ролей)
+"""
+import argparse
+import asyncio
+import marshal
+import os
+import signal
+import sqlite3
+import struct
+from typing import Any, Dict, Optional
+
+from modules import metrics
+from modules.db_core import (DBProducer, DBWorker, ReadPool, DBBusy, DBOverloaded, DBTaskExpired,
+                             READ_OPS, READ_POOL_SIZE, notify_user_changed)
+
+DB_SOCKET = os.getenv("DB_SOCKET", "")
+CONNECT_TIMEOUT = 30.0      # сек: сколько HTTP-воркер ждёт появления сокета владельца при старте
+MAX_FRAME = 64 * 1024 * 1024
+_LEN = struct.Struct(">I")
+_MARSHAL_VERSION = 4
+# Операции, после которых владелец рассылает остальным воркерам (0, None, login)
+USER_OPS = frozenset({"set_role", "del", "restore_user"})
+
+# Исключения, которые воркер восстанавливает по имени; остальные приходят как DBRemoteError
+_ERRORS = {cls.__name__: cls for cls in (
+    ValueError, KeyError, TypeError, AttributeError,
+    sqlite3.IntegrityError, sqlite3.OperationalError, sqlite3.DatabaseError,
+    DBBusy, DBOverloaded, DBTaskExpired,
+)}
+
+
+class DBRemoteError(RuntimeError):
+    """Ошибка владельца БД, тип которой не передаётся по сокету."""
+
+
+class DBOwnerUnavailable(DBBusy, ConnectionError):
+    """Нет соединения с процессом-владельцем БД (не запущен или перезапускается)."""
+
+
+def _pack(msg) -> bytes:
+    body = marshal.dumps(msg, _MARSHAL_VERSION)
+    return _LEN.pack(len(body)) + body
+
+
+async def _read_frame(reader: asyncio.StreamReader):
+    n, = _LEN.unpack(await reader.readexactly(_LEN.size))
+    if n > MAX_FRAME:
+        raise ConnectionError(f"Слишком большой кадр: {n} байт")
+    return marshal.loads(await reader.readexactly(n))
+
+
+def _plain(value):
+    """Результат операции в типы, которые понимает marshal (Path бэкапа — в строку)."""
+    if isinstance(value, os.PathLike):
+        return os.fspath(value)
+    return value
+
+
+# --- Владелец ---
+class DBServer:
+    """Принимает задачи HTTP-воркеров и ставит их в общую очередь своего DBWorker."""
+
+    def __init__(self, socket_path: str, producer: DBProducer):
+        self.socket_path = socket_path
+        self._producer = producer
+        self._clients = set()
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)     # сокет от прошлого запуска
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        old = os.umask(0o177)               # сокет — только владельцу (0600)
+        try:
+            self._server = await asyncio.start_unix_server(self._serve, self.socket_path)
+        finally:
+            os.umask(old)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _serve(self, reader, writer):
+        inflight: Dict[int, asyncio.Task] = {}
+        self._clients.add(writer)
+        try:
+            while True:
+                try:
+                    rid, op, payload = await _read_frame(reader)
+                except Exception:
+                    break       # отключение или испорченный кадр — соединение бросаем
+                if op is None:
+                    task = inflight.pop(rid, None)
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = asyncio.create_task(self._handle(writer, rid, op, payload))
+                inflight[rid] = task
+                task.add_done_callback(lambda _, rid=rid: inflight.pop(rid, None))
+        finally:
+            self._clients.discard(writer)
+            # Воркер отключился — его задачи, ещё стоящие в очереди, не нужны
+            for task in list(inflight.values()):
+                task.cancel()
+            writer.close()
+
+    async def _handle(self, writer, rid: int, op: str, payload: Dict[str, Any]):
+        try:
+            res = await self._producer._call(op, **payload)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            frame = _pack((rid, False, (type(e).__name__, str(e))))
+        else:
+            frame = _pack((rid, True, _plain(res)))
+            if op in USER_OPS:
+                self._broadcast(writer, payload.get("login"))
+        if not writer.is_closing():
+            writer.write(frame)
+            await writer.drain()
+
+    def _broadcast(self, origin, login):
+        frame = _pack((0, None, login))
+        for w in self._clients:
+            if w is not origin and not w.is_closing():
+                w.write(frame)
+
+
+async def _serve_metrics(reader, writer):
+    """GET любого пути — метрики владельца (очередь, пакеты, COMMIT) в формате Prometheus."""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        body = metrics.render().encode()
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {metrics.CONTENT_TYPE}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(socket_path: str, db_path: str, backup_dir: str,
+                backup_interval: Optional[float] = None, metrics_port: int = 0, **worker_kw):
+    """Запустить владельца БД и работать до отмены."""
+    worker = DBWorker(db_path=db_path, backup_dir=backup_dir,
+                      backup_interval=backup_interval, **worker_kw)
+    task = asyncio.create_task(worker.run())
+    # Сокет появляется только после создания схемы: воркеры сразу читают БД сами
+    await asyncio.wait({task, asyncio.create_task(worker.ready.wait())},
+                       return_when=asyncio.FIRST_COMPLETED)
+    if task.done():
+        task.result()
+    server = DBServer(socket_path, DBProducer())
+    await server.start()
+    http = (await asyncio.start_server(_serve_metrics, "127.0.0.1", metrics_port)
+            if metrics_port else None)
+    try:
+        await task
+    finally:
+        if http is not None:
+            http.close()
+        await server.close()
+        task.cancel()
+
+
+# --- HTTP-воркер ---
+class RemoteDBProducer(DBProducer):
+    """DBProducer, который отдаёт записи владельцу БД по Unix-сокету.
+
+    Чтения из read_ops идут в собственный пул read-only соединений (read_pool_size=0 — тоже
+    владельцу). Отмена вызывающего отправляет владельцу отмену задачи.
+    """
+
+    def __init__(self, socket_path: str, db_path: str = "users.db", read_ops=READ_OPS,
+                 read_pool_size: int = READ_POOL_SIZE, hasher=None):
+        super().__init__(read_ops=read_ops, hasher=hasher)
+        self.socket_path = socket_path
+        # DBWorker здесь только источник _op_* для пула чтения; сам он не запускается
+        self._pool = ReadPool(DBWorker(db_path), read_pool_size) if read_pool_size > 0 else None
+        self._reader = self._writer = None
+        self._reader_task = None
+        self._connect_lock = asyncio.Lock()
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+
+    @classmethod
+    async def connect(cls, socket_path: str, db_path: str = "users.db",
+                      timeout: float = CONNECT_TIMEOUT, **kw) -> "RemoteDBProducer":
+        """Создать и подключиться, ожидая до timeout секунд, пока владелец поднимет сокет."""
+        self = cls(socket_path, db_path, **kw)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                await self._ensure_connected()
+                return self
+            except DBOwnerUnavailable:
+                if loop.time() >= deadline:
+                    self.close()
+                    raise
+                await asyncio.sleep(0.1)
+
+    async def _ensure_connected(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                raise DBOwnerUnavailable(f"Владелец БД недоступен ({self.socket_path}): {e}") from e
+            # Ожидающие ответа запросы — свои у каждого соединения: обрыв старого соединения
+            # не задевает запросы, отправленные уже после переподключения
+            self._reader, self._writer, self._pending = reader, writer, {}
+            self._reader_task = asyncio.create_task(self._read_loop(reader, writer, self._pending))
+
+    async def _read_loop(self, reader, writer, pending: Dict[int, asyncio.Future]):
+        err = DBOwnerUnavailable("Соединение с владельцем БД закрыто")
+        try:
+            while True:
+                rid, ok, value = await _read_frame(reader)
+                if rid == 0:
+                    notify_user_changed(value)
+                    continue
+                fut = pending.pop(rid, None)
+                if fut is None or fut.done():
+                    continue
+                if ok:
+                    fut.set_result(value)
+                else:
+                    name, text = value
+                    fut.set_exception(_ERRORS.get(name, DBRemoteError)(text))
+        except Exception as e:
+            # Обрыв, испорченный кадр (marshal: ValueError, EOFError) или кадр не того вида —
+            # дальше поток не разобрать: соединение бросаем, следующий вызов переподключится
+            err = DBOwnerUnavailable(f"Соединение с владельцем БД потеряно: {e!r}")
+        finally:
+            writer.close()
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(err)
+            pending.clear()
+
+    async def _call(self, op: str, **kw):
+        if self._pool is not None and op in self._read_ops:
+            return await self._pool.run(op, kw)
+        await self._ensure_connected()
+        writer, pending = self._writer, self._pending
+        self._next_id += 1
+        rid = self._next_id
+        fut = self._loop.create_future()
+        pending[rid] = fut
+        writer.write(_pack((rid, op, kw)))
+        try:
+            await writer.drain()
+            return await fut
+        except ConnectionError as e:
+            pending.pop(rid, None)
+            if isinstance(e, DBOwnerUnavailable):
+                raise
+            raise DBOwnerUnavailable(f"Соединение с владельцем БД потеряно: {e}") from e
+        except asyncio.CancelledError:
+            if pending.pop(rid, None) is not None and not writer.is_closing():
+                writer.write(_pack((rid, None, None)))
+            raise
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self._pool is not None:
+            self._pool.close()
+
+
+async def _main(*args):
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await serve(*args)
+    except asyncio.CancelledError:
+        pass    # штатная остановка: сокет удалён, воркер закрыл БД
+
+
+if __name__ == "__main__":
+    base = os.getenv("DATA_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    p = argparse.ArgumentParser(description="Процесс-владелец users.db для uvicorn --workers N")
+    p.add_argument("--socket", default=DB_SOCKET or os.path.join(base, "run", "db.sock"))
+    p.add_argument("--db", default=os.path.join(base, "users.db"))
+    p.add_argument("--backup-dir", default=os.path.join(base, "backups"))
+    p.add_argument("--backup-interval", type=float,
+                   default=float(os.getenv("BACKUP_INTERVAL", 3600)))
+    p.add_argument("--metrics-port", type=int, default=int(os.getenv("DB_METRICS_PORT", 0)),
+                   help="порт /metrics владельца на 127.0.0.1 (0 — не поднимать)")
+    a = p.parse_args()
+    asyncio.run(_main(a.socket, a.db, a.backup_dir, a.backup_interval or None, a.metrics_port))
@@ -1,10 +1,29 @@
 from modules.logger import Logger
+from modules.retry import backoff_delay
+import os
+import time
+import queue
+import atexit
+import hashlib
+import threading
 import traceback
 import smtplib
 from email.mime.text import MIMEText
 import requests
 
-log = Logger()
+log = Logger("error_handler")
+
+# --- Параметры рассылки уведомлений ---
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", 1000))
+# Одинаковые сообщения за окно склеиваются в одно с числом повторов
+ALERT_COALESCE_WINDOW = float(os.getenv("ALERT_COALESCE_WINDOW", 60))
+# Токен-бакет на канал: ALERT_RATE сообщений в минуту, всплеск до ALERT_BURST
+ALERT_RATE = float(os.getenv("ALERT_RATE", 6))
+ALERT_BURST = int(os.getenv("ALERT_BURST", 3))
+ALERT_TIMEOUT = float(os.getenv("ALERT_TIMEOUT", 10))
+ALERT_RETRIES = int(os.getenv("ALERT_RETRIES", 3))
+ALERT_BACKOFF_BASE = 1.0
+ALERT_BACKOFF_MAX = 30.0
 
 class CriticalError(Exception):
     """Критическая ошибка системы."""
@@ -14,12 +33,206 @@ class ValidationError(Exception):
     """Ошибка валидации данных."""
     pass
 
+class PermanentAlertError(Exception):
+    """Канал отказал так, что повтор не поможет (неверный адрес, токен и т.п.)."""
+    pass
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_min: float, burst: int):
+        self.rate = rate_per_min / 60.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.ts = time.monotonic()
+
+    def take(self) -> float:
+        """0, если токен взят, иначе сколько секунд ждать следующего."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else ALERT_COALESCE_WINDOW
+
+
+class AlertChannel(threading.Thread):
+    """Один канал уведомлений: своя очередь и свой поток, поэтому медленный SMTP не задерживает Telegram.
+
+    Первое сообщение уходит сразу; такие же в течение окна копятся и уходят одним сообщением
+    с числом повторов в конце окна. Пока бакет пуст, сообщения ждут в pending (и продолжают
+    склеиваться), а не теряются. Неудачная отправка повторяется с экспоненциальной паузой.
+    """
+
+    def __init__(self, name: str, send, rate: float = ALERT_RATE, burst: int = ALERT_BURST,
+                 window: float = ALERT_COALESCE_WINDOW, retries: int = ALERT_RETRIES,
+                 queue_size: int = ALERT_QUEUE_SIZE, backoff_base: float = ALERT_BACKOFF_BASE,
+                 backoff_max: float = ALERT_BACKOFF_MAX):
+        super().__init__(name=f"alert-{name}", daemon=True)
+        self.channel = name
+        self._send = send
+        self._bucket = _TokenBucket(rate, burst)
+        self.window = window
+        self.retries = max(1, retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._queue = queue.Queue(queue_size)
+        self._pending = {}      # ключ -> [последнее сообщение, повторов с прошлой отправки, когда отправлять]
+        self._stopping = False
+        self.counters = {"received": 0, "dropped": 0, "coalesced": 0, "sent": 0,
+                         "failed": 0, "retries": 0, "rate_limited": 0}
+
+    def submit(self, key: str, message: str):
+        try:
+            self._queue.put_nowait((key, message))
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def stop(self, timeout: float = None):
+        """Отправить накопленное (без ожидания окна) и остановить поток."""
+        self._queue.put(None)
+        self.join(timeout)
+
+    def stats(self) -> dict:
+        return dict(self.counters, queued=self._queue.qsize(), pending=len(self._pending))
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            due = min((e[2] for e in self._pending.values() if e[1]), default=None)
+            try:
+                item = self._queue.get(timeout=None if due is None else max(0.0, due - now))
+            except queue.Empty:
+                item = ()
+            if item is None:
+                self._stopping = True
+            elif item:
+                self._add(*item)
+                # Забираем всё, что уже лежит в очереди, прежде чем отправлять
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._stopping = True
+                        break
+                    self._add(*item)
+            self._flush()
+            if self._stopping:
+                return
+
+    def _add(self, key: str, message: str):
+        self.counters["received"] += 1
+        entry = self._pending.get(key)
+        if entry is None:
+            self._pending[key] = [message, 1, time.monotonic()]
+        else:
+            if entry[1]:
+                self.counters["coalesced"] += 1
+            entry[0] = message
+            entry[1] += 1
+
+    def _flush(self):
+        now = time.monotonic()
+        for key, entry in list(self._pending.items()):
+            message, count, due = entry
+            if not count:
+                # Окно прошло без повторов — забываем ключ
+                if due <= now:
+                    del self._pending[key]
+                continue
+            if due > now and not self._stopping:
+                continue
+            wait = 0.0 if self._stopping else self._bucket.take()
+            if wait:
+                self.counters["rate_limited"] += 1
+                entry[2] = now + wait
+                continue
+            if count > 1:
+                message = f"{message}\n\n(повторилось {count} раз)"
+            self._deliver(message)
+            entry[1], entry[2] = 0, time.monotonic() + self.window
+
+    def _deliver(self, message: str):
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._send(message)
+                self.counters["sent"] += 1
+                log.info("Уведомление (%s) отправлено успешно.", self.channel)
+                return
+            except PermanentAlertError as e:
+                log.error("Ошибка отправки (%s): %s", self.channel, e)
+                break
+            except Exception as e:
+                log.warning("Ошибка отправки (%s), попытка %s из %s: %s",
+                            self.channel, attempt, self.retries, e)
+                if attempt < self.retries and not self._stopping:
+                    self.counters["retries"] += 1
+                    time.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                else:
+                    break
+        self.counters["failed"] += 1
+
+
+class AlertDispatcher:
+    """Рассылка уведомлений в фоне: submit() только кладёт сообщение в очереди каналов."""
+
+    def __init__(self, channels):
+        self.channels = list(channels)
+        for ch in self.channels:
+            ch.start()
+
+    @staticmethod
+    def fingerprint(message: str) -> str:
+        return hashlib.sha1(message.encode("utf-8", "replace")).hexdigest()
+
+    def submit(self, message: str, key: str = None):
+        key = key or self.fingerprint(message)
+        for ch in self.channels:
+            ch.submit(key, message)
+
+    def close(self, timeout: float = ALERT_TIMEOUT):
+        for ch in self.channels:
+            ch.stop(timeout)
+
+    def stats(self) -> dict:
+        return {ch.channel: ch.stats() for ch in self.channels}
+
+
+_DISPATCHER = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_alert_dispatcher() -> AlertDispatcher:
+    """Диспетчер по EMAIL_CONFIG/TELEGRAM_CONFIG; создаётся при первом уведомлении."""
+    global _DISPATCHER
+    with _dispatcher_lock:
+        if _DISPATCHER is None:
+            channels = []
+            if ErrorHandler.EMAIL_CONFIG["enabled"]:
+                channels.append(AlertChannel("email", ErrorHandler.send_email_alert))
+            if ErrorHandler.TELEGRAM_CONFIG["enabled"]:
+                channels.append(AlertChannel("telegram", ErrorHandler.send_telegram_alert))
+            _DISPATCHER = AlertDispatcher(channels)
+            atexit.register(_DISPATCHER.close)
+        return _DISPATCHER
+
+
+def set_alert_dispatcher(dispatcher) -> None:
+    """Подменить диспетчер (любой объект с submit()), например в тестах."""
+    global _DISPATCHER
+    with _dispatcher_lock:
+        _DISPATCHER = dispatcher
+
+
 class ErrorHandler:
     # Конфигурация для уведомлений
     EMAIL_CONFIG = {
         "enabled": True,
         "smtp_server": "smtp.example.com",
         "smtp_port": 587,
+        "starttls": True,
         "username": "your_email@example.com",
         "password": "your_email_password",
         "recipient": "admin@example.com"
@@ -27,6 +240,7 @@ class ErrorHandler:
 
     TELEGRAM_CONFIG = {
         "enabled": True,
+        "api_url": "https://api.telegram.org",
         "bot_token": "YOUR_BOT_TOKEN",
         "chat_id": "YOUR_CHAT_ID"
     }
@@ -43,46 +257,44 @@ class ErrorHandler:
 
     @staticmethod
     def send_alert(message: str):
-        if ErrorHandler.EMAIL_CONFIG["enabled"]:
-            ErrorHandler.send_email_alert(message)
-        if ErrorHandler.TELEGRAM_CONFIG["enabled"]:
-            ErrorHandler.send_telegram_alert(message)
+        """Поставить уведомление в очередь; отправка, склейка и повторы — в фоне."""
+        get_alert_dispatcher().submit(message)
 
+    # Синхронные отправители: вызываются из потока канала, ошибки отдают наружу для повтора
     @staticmethod
     def send_email_alert(message: str):
+        config = ErrorHandler.EMAIL_CONFIG
+        msg = MIMEText(message)
+        msg["Subject"] = "🚨 Критическая ошибка на сервере"
+        msg["From"] = config["username"]
+        msg["To"] = config["recipient"]
+
         try:
-            config = ErrorHandler.EMAIL_CONFIG
-            msg = MIMEText(message)
-            msg["Subject"] = "🚨 Критическая ошибка на сервере"
-            msg["From"] = config["username"]
-            msg["To"] = config["recipient"]
-
-            with smtplib.SMTP(config["smtp_server"], config["smtp_port"]) as server:
-                server.starttls()
-                server.login(config["username"], config["password"])
+            with smtplib.SMTP(config["smtp_server"], config["smtp_port"],
+                              timeout=ALERT_TIMEOUT) as server:
+                if config.get("starttls", True):
+                    server.starttls()
+                if config.get("password"):
+                    server.login(config["username"], config["password"])
                 server.send_message(msg)
-            
-            log.info("Уведомление на Email отправлено успешно.")
-        except Exception as e:
-            log.error(f"Ошибка отправки Email: {e}")
+        except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused) as e:
+            raise PermanentAlertError(e)
 
     @staticmethod
     def send_telegram_alert(message: str):
-        try:
-            config = ErrorHandler.TELEGRAM_CONFIG
-            url = f"https://api.telegram.org/bot{config['bot_token']}/sendMessage"
-            payload = {
-                "chat_id": config["chat_id"],
-                "text": f"🚨 Критическая ошибка:\n{message}",
-                "parse_mode": "Markdown"
-            }
-            response = requests.post(url, json=payload)
-            if response.status_code == 200:
-                log.info("Уведомление в Telegram отправлено успешно.")
-            else:
-                log.warning(f"Не удалось отправить уведомление в Telegram: {response.text}")
-        except Exception as e:
-            log.error(f"Ошибка отправки в Telegram: {e}")
+        config = ErrorHandler.TELEGRAM_CONFIG
+        url = f"{config.get('api_url', 'https://api.telegram.org')}/bot{config['bot_token']}/sendMessage"
+        payload = {
+            "chat_id": config["chat_id"],
+            "text": f"🚨 Критическая ошибка:\n{message}",
+            "parse_mode": "Markdown"
+        }
+        response = requests.post(url, json=payload, timeout=ALERT_TIMEOUT)
+        if response.status_code == 200:
+            return
+        if 400 <= response.status_code < 500 and response.status_code != 429:
+            raise PermanentAlertError(f"Telegram {response.status_code}: {response.text}")
+        raise RuntimeError(f"Telegram {response.status_code}: {response.text}")
 
     @staticmethod
     def safe_execute(func):
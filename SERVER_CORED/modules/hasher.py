@@ -0,0 +1,170 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+
+from modules.metrics import histogram
+
+# --- Параметры ---
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Не больше половины ядер: хеширование не должно съедать CPU, нужный HTTP-воркерам
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+LATENCY_WINDOW = 1024
+# Пул создаётся лениво, когда в процессе уже работают потоки (пул чтения, воркер БД, логгер):
+# fork скопировал бы их захваченные блокировки в дочерний процесс. Воркеры стартуют чистыми.
+HASH_MP_START = os.getenv("HASH_MP_START", "forkserver"
+                          if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_M_BCRYPT = histogram("bcrypt_seconds", "Время bcrypt в воркере", ("kind",),
+                      buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0))
+_M_BCRYPT_WAIT = histogram("bcrypt_wait_seconds", "Ожидание свободного слота хеширования", ("kind",))
+
+
+# --- Функции для пула процессов (должны быть на уровне модуля, чтобы пиклиться) ---
+def _hashpw(password: bytes, rounds: int):
+    t0 = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    return hashed, time.perf_counter() - t0
+
+
+def _checkpw(password: bytes, hashed: bytes):
+    t0 = time.perf_counter()
+    ok = bcrypt.checkpw(password, hashed)
+    return ok, time.perf_counter() - t0
+
+
+class _LatencyStats:
+    """Скользящее окно задержек: время bcrypt в воркере и ожидание свободного слота."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.count = 0
+        self._cpu = deque(maxlen=window)
+        self._wait = deque(maxlen=window)
+
+    def add(self, cpu: float, wait: float):
+        self.count += 1
+        self._cpu.append(cpu)
+        self._wait.append(wait)
+
+    def snapshot(self) -> dict:
+        if not self._cpu:
+            return {"count": 0}
+        cpu = sorted(self._cpu)
+        return {
+            "count": self.count,
+            "avg_ms": round(sum(cpu) / len(cpu) * 1000, 2),
+            "p50_ms": round(cpu[len(cpu) // 2] * 1000, 2),
+            "p95_ms": round(cpu[min(len(cpu) - 1, int(len(cpu) * 0.95))] * 1000, 2),
+            "max_ms": round(cpu[-1] * 1000, 2),
+            "wait_avg_ms": round(sum(self._wait) / len(self._wait) * 1000, 2),
+        }
+
+
+class PasswordHasher:
+    """bcrypt вне цикла событий: пул процессов (или потоков, если процессы недоступны).
+
+    Одновременно выполняется не больше max_workers хешей; остальные ждут на семафоре,
+    а не в очереди исполнителя, поэтому время ожидания видно в stats().
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, max_workers: int = HASH_WORKERS,
+                 use_processes: bool = True):
+        self.rounds = rounds
+        self.max_workers = max(1, max_workers)
+        self._use_processes = use_processes
+        self._executor = None
+        self._backend = None
+        self._sem = None
+        self._sem_loop = None
+        self._stats = {"hash": _LatencyStats(), "verify": _LatencyStats()}
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self._use_processes:
+                try:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context(HASH_MP_START))
+                    self._backend = "process"
+                except (OSError, NotImplementedError, ImportError, ValueError):
+                    self._use_processes = False
+            if self._executor is None:
+                # bcrypt отпускает GIL, так что потоки тоже работают параллельно
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="bcrypt")
+                self._backend = "thread"
+        return self._executor
+
+    def _get_sem(self):
+        loop = asyncio.get_running_loop()
+        if self._sem is None or self._sem_loop is not loop:
+            self._sem = asyncio.Semaphore(self.max_workers)
+            self._sem_loop = loop
+        return self._sem
+
+    async def _submit(self, kind: str, fn, *args):
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        async with self._get_sem():
+            wait = time.perf_counter() - t0
+            try:
+                result, cpu = await loop.run_in_executor(self._get_executor(), fn, *args)
+            except (BrokenProcessPool, OSError):
+                if self._backend != "process":
+                    raise
+                # Пул процессов не поднялся (нет fork/семафоров) — переходим на потоки
+                self.shutdown()
+                self._use_processes = False
+                result, cpu = await loop.run_in_executor(self._get_executor(), fn, *args)
+        self._stats[kind].add(cpu, wait)
+        _M_BCRYPT.labels(kind).observe(cpu)
+        _M_BCRYPT_WAIT.labels(kind).observe(wait)
+        return result
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._submit("hash", _hashpw, password.encode(), self.rounds)
+        return hashed.decode()
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        """False и для испорченного хеша в базе: checkpw бросает ValueError (Invalid salt),
+        а вход должен считаться неудачным (счётчик ошибок, блокировка), а не падать с 500."""
+        try:
+            return await self._submit("verify", _checkpw, password.encode(), hashed.encode())
+        except ValueError:
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "backend": self._backend,
+            "rounds": self.rounds,
+            "max_workers": self.max_workers,
+            "hash": self._stats["hash"].snapshot(),
+            "verify": self._stats["verify"].snapshot(),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_HASHER: Optional[PasswordHasher] = None
+
+
+def get_hasher() -> PasswordHasher:
+    global _HASHER
+    if _HASHER is None:
+        _HASHER = PasswordHasher()
+    return _HASHER
+
+
+def set_hasher(hasher) -> None:
+    """Подменить хешер (любой объект с async hash()/verify()), например в тестах."""
+    global _HASHER
+    _HASHER = hasher
@@ -1,38 +1,209 @@
+import atexit
+import copy
+import json
 import logging
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
-class Logger:
-    def __init__(self, log_dir="logs", log_file="server.log", max_size=1_000_000, backup_count=5):
-        os.makedirs(log_dir, exist_ok=True)
-        log_path = os.path.join(log_dir, log_file)
+# --- Параметры ---
+ROOT_NAME = "SecureServerLogger"
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")            # text | json (JSON Lines)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")                # "api_client=INFO,auth=WARNING"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Сэмплирование: с одного места в коде не больше LOG_SAMPLE_RATE записей в секунду (всплеск до
+# LOG_SAMPLE_BURST) для уровней до LOG_SAMPLE_LEVEL включительно; остальные считаются и отбрасываются
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 10))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", 20))
+LOG_SAMPLE_LEVEL = logging.DEBUG
 
-        self.logger = logging.getLogger("SecureServerLogger")
-        self.logger.setLevel(logging.DEBUG)
+_TEXT_FORMAT = "[%(asctime)s] [%(levelname)s]: %(message)s"
+_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-        # Формат логов
-        formatter = logging.Formatter("[%(asctime)s] [%(levelname)s]: %(message)s", "%Y-%m-%d %H:%M:%S")
 
-        # Хэндлер для файла с ротацией
-        file_handler = RotatingFileHandler(log_path, maxBytes=max_size, backupCount=backup_count)
-        file_handler.setFormatter(formatter)
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, _DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "where": f"{record.module}:{record.lineno}",
+        }
+        # Из очереди запись приходит с готовой трассировкой в exc_text (_DroppingQueueHandler.prepare)
+        exc = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc:
+            entry["exc"] = exc
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Токен-бакет на каждое место вызова (логгер + файл + строка) для «горячих» отладочных сообщений.
+
+    Когда место снова пропускает запись, к ней дописывается число пропущенных с прошлого раза.
+    """
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE, burst: int = LOG_SAMPLE_BURST,
+                 max_level: int = LOG_SAMPLE_LEVEL):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_level = max_level
+        self.suppressed = 0
+        self._buckets = {}      # место -> [токены, время, пропущено]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                if len(self._buckets) > 10000:
+                    self._buckets.clear()
+                b = self._buckets[key] = [float(self.burst), now, 0]
+            b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+            b[1] = now
+            if b[0] < 1:
+                b[2] += 1
+                self.suppressed += 1
+                return False
+            b[0] -= 1
+            skipped, b[2] = b[2], 0
+        if skipped:
+            record.msg = f"{record.msg} (пропущено похожих: {skipped})"
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который при переполненной очереди отбрасывает запись, а не ждёт."""
+
+    dropped = 0
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        """Копия записи для очереди. Сообщение подставляется сразу (аргументы могут измениться
+        до записи в файл), а трассировка сохраняется отдельно в exc_text: стандартный prepare()
+        склеивает её с сообщением, и JsonFormatter терял поле exc."""
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_setup_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_sampler = None
+
+
+def setup_logging(log_dir: str = LOG_DIR, log_file: str = "server.log", max_size: int = 1_000_000,
+                  backup_count: int = 5, fmt: str = LOG_FORMAT, level: str = LOG_LEVEL,
+                  levels: str = LOG_LEVELS):
+    """Настроить логирование один раз на процесс; повторные вызовы ничего не делают.
 
-        # Хэндлер для консоли
+    Запись в файл и консоль идёт в фоновом потоке QueueListener; вызывающий поток только
+    кладёт запись в ограниченную очередь (при переполнении запись теряется и учитывается в stats).
+    """
+    global _listener, _queue_handler, _sampler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        os.makedirs(log_dir, exist_ok=True)
+        formatter = (JsonFormatter() if fmt == "json"
+                     else logging.Formatter(_TEXT_FORMAT, _DATE_FORMAT))
+
+        file_handler = RotatingFileHandler(os.path.join(log_dir, log_file),
+                                           maxBytes=max_size, backupCount=backup_count,
+                                           encoding="utf-8")
+        file_handler.setFormatter(formatter)
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
 
-        # Добавляем хэндлеры
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        _sampler = RateLimitFilter()
+        _queue_handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(_sampler)
+
+        root = logging.getLogger(ROOT_NAME)
+        root.setLevel(level.upper())
+        root.propagate = False
+        root.handlers[:] = [_queue_handler]
+        for item in filter(None, (x.strip() for x in levels.split(","))):
+            name, _, lvl = item.partition("=")
+            set_level(name.strip(), lvl.strip())
+
+        _listener = QueueListener(_queue_handler.queue, file_handler, console_handler,
+                                  respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Дописать очередь и остановить фоновый поток."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            for h in _listener.handlers:
+                h.close()
+            _listener = None
+
+
+def set_level(name: str, level):
+    """Уровень для логгера модуля (имя как в Logger(name)) или корня ("" / ROOT_NAME)."""
+    full = ROOT_NAME if name in ("", ROOT_NAME) else f"{ROOT_NAME}.{name}"
+    logging.getLogger(full).setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def logging_stats() -> dict:
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "suppressed": _sampler.suppressed if _sampler else 0,
+    }
+
+
+class Logger:
+    """Тонкая обёртка над logging: Logger() или Logger("имя_модуля").
+
+    Создание экземпляра не добавляет обработчиков — они ставятся один раз в setup_logging().
+    stacklevel=2: в записи указывается место вызова log.info(), а не эта обёртка.
+    """
+
+    def __init__(self, name: str = None, **setup):
+        setup_logging(**setup)
+        self.logger = logging.getLogger(ROOT_NAME if not name else f"{ROOT_NAME}.{name}")
+
+    def info(self, message: str, *args):
+        self.logger.info(message, *args, stacklevel=2)
 
-    def info(self, message: str):
-        self.logger.info(message)
+    def warning(self, message: str, *args):
+        self.logger.warning(message, *args, stacklevel=2)
 
-    def warning(self, message: str):
-        self.logger.warning(message)
+    def error(self, message: str, *args):
+        self.logger.error(message, *args, stacklevel=2)
 
-    def error(self, message: str):
-        self.logger.error(message)
+    def debug(self, message: str, *args):
+        self.logger.debug(message, *args, stacklevel=2)
 
-    def debug(self, message: str):
-        self.logger.debug(message)
+    def exception(self, message: str, *args):
+        self.logger.exception(message, *args, stacklevel=2)
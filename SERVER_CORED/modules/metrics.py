@@ -0,0 +1,214 @@
+"""Метрики процесса в текстовом формате Prometheus (0.0.4), без внешних зависимостей.
+
+Счётчики, gauge и гистограммы с фиксированными корзинами. Метрики объявляются один раз на уровне
+модуля; на горячем пути — поиск дочерней метрики по меткам в dict и инкремент под её блокировкой.
+
+    REQUESTS = counter("http_requests_total", "HTTP-запросы", ("method", "route", "status"))
+    REQUESTS.labels("GET", "/admin", "200").inc()
+    LATENCY = histogram("db_commit_seconds", "Длительность COMMIT")
+    LATENCY.observe(0.003)
+"""
+import bisect
+import math
+import threading
+
+# Корзины по умолчанию — задержки от 0.1 мс до 10 с
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(v)
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)    # последняя — больше верхней границы
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new())
+        return child
+
+    def _samples(self):
+        """(суффикс, метки, значение) для render()."""
+        for values, child in list(self._children.items()):
+            yield "", _labels(self.labelnames, values), child.value
+
+    def render(self) -> str:
+        doc = self.doc.replace("\\", "\\\\").replace("\n", "\\n")
+        lines = [f"# HELP {self.name} {doc}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{labels} {_fmt(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, labelnames=()):
+        self._fn = None
+        super().__init__(name, doc, labelnames)
+
+    def _new(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default.dec(amount)
+
+    def set_function(self, fn):
+        """Значение снимается при выдаче: fn() -> число или {кортеж меток: число}."""
+        self._fn = fn
+
+    def _samples(self):
+        if self._fn is None:
+            yield from super()._samples()
+            return
+        value = self._fn()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, v in items:
+            yield "", _labels(self.labelnames, values), v
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                acc += n
+                yield "_bucket", _labels(self.labelnames, values, f'le="{_fmt(float(bound))}"'), acc
+            yield "_sum", _labels(self.labelnames, values), total
+            yield "_count", _labels(self.labelnames, values), acc
+
+
+# --- Реестр процесса ---
+_REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, *args, **kw):
+    with _registry_lock:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = cls(name, *args, **kw)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Метрика {name} уже объявлена как {metric.kind}")
+        return metric
+
+
+def counter(name: str, doc: str, labelnames=()) -> Counter:
+    return _register(Counter, name, doc, labelnames)
+
+
+def gauge(name: str, doc: str, labelnames=()) -> Gauge:
+    return _register(Gauge, name, doc, labelnames)
+
+
+def histogram(name: str, doc: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram, name, doc, labelnames, buckets=buckets)
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus."""
+    with _registry_lock:
+        metrics = list(_REGISTRY.values())
+    return "\n".join(m.render() for m in metrics) + "\n"
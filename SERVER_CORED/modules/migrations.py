@@ -0,0 +1,85 @@
+"""Версионные миграции схемы SQLite по PRAGMA user_version.
+
+Миграция — список шагов; шаг — SQL-скрипт (несколько выражений через «;», в том числе триггеры)
+или функция fn(conn). Версия базы — число уже выполненных шагов. Шаги только дописываются в
+конец списка: уже выпущенный шаг не меняют, иначе существующие базы его не увидят.
+
+Базы, созданные до миграций, имеют user_version = 0, поэтому шаги, которые догоняют их до
+текущей схемы, написаны идемпотентно (IF NOT EXISTS, проверка колонок через table_info).
+
+    STEPS = [
+        ("таблицы", "CREATE TABLE IF NOT EXISTS ...; CREATE INDEX IF NOT EXISTS ..."),
+        ("колонки старых баз", lambda conn: add_columns(conn, "users", [("is_deleted", "INTEGER")])),
+    ]
+    migrate(conn, STEPS, "users.db")
+"""
+import sqlite3
+import time
+
+# Сколько соседний процесс ждёт, пока другой (uvicorn --workers N) выполняет миграцию
+LOCK_TIMEOUT_MS = 120_000
+
+
+def _statements(script: str):
+    """Разбить скрипт на выражения; «;» внутри BEGIN ... END триггера выражение не завершает."""
+    buf = ""
+    for part in script.split(";"):
+        buf += part + ";"
+        if sqlite3.complete_statement(buf):
+            if buf.strip(" \t\r\n;"):
+                yield buf.strip()
+            buf = ""
+    if buf.strip(" \t\r\n;"):
+        raise ValueError(f"Незавершённое выражение в миграции: {buf.strip()[:80]}")
+
+
+def user_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def add_columns(conn, table: str, columns):
+    """Добавить недостающие колонки [(имя, объявление), ...] — для баз, созданных до миграций."""
+    have = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def migrate(conn, steps, name: str = "") -> int:
+    """Довести схему до len(steps). Если база актуальна — одно чтение PRAGMA user_version.
+
+    Шаги выполняются в одной транзакции BEGIN IMMEDIATE: пишущая блокировка берётся до
+    повторного чтения версии, поэтому параллельный процесс дождётся её и ничего не повторит.
+    Ошибка шага откатывает всю миграцию, версия не меняется.
+    """
+    target = len(steps)
+    version = user_version(conn)
+    if version >= target:
+        return version
+    timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    conn.execute(f"PRAGMA busy_timeout={LOCK_TIMEOUT_MS}")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = user_version(conn)
+            for i in range(version, target):
+                title, step = steps[i]
+                t0 = time.perf_counter()
+                if callable(step):
+                    step(conn)
+                else:
+                    for sql in _statements(step):
+                        conn.execute(sql)
+                # Логгер — только когда миграция действительно выполняется (редкое событие)
+                from modules.logger import Logger
+                Logger("migrations").info("Миграция %s %d: %s (%.2f с)", name, i + 1, title,
+                                          time.perf_counter() - t0)
+            # PRAGMA user_version транзакционна: версия фиксируется вместе со шагами
+            conn.execute(f"PRAGMA user_version={max(version, target)}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.execute(f"PRAGMA busy_timeout={timeout}")
+    return max(version, target)
@@ -3,7 +3,7 @@ from functools import wraps
 from modules.auth import AuthManager
 from modules.logger import Logger
 
-log = Logger()
+log = Logger("request_handler")
 
 class RequestHandler:
     def __init__(self, auth_manager: AuthManager):
@@ -12,7 +12,7 @@ class RequestHandler:
     def get_json(self):
         try:
             data = request.get_json(force=True)
-            log.debug(f"Получены JSON данные: {data}")
+            log.debug("Получены JSON данные: %s", data)
             return data
         except Exception as e:
             log.warning(f"Ошибка парсинга JSON: {e}")
@@ -20,19 +20,19 @@ class RequestHandler:
 
     def get_args(self):
         args = request.args.to_dict()
-        log.debug(f"Получены GET параметры: {args}")
+        log.debug("Получены GET параметры: %s", args)
         return args
 
     def get_headers(self):
         headers = dict(request.headers)
-        log.debug(f"Получены заголовки: {headers}")
+        log.debug("Получены заголовки: %s", headers)
         return headers
 
     def get_token(self):
         auth_header = request.headers.get("Authorization", "")
         if auth_header.startswith("Bearer "):
             token = auth_header.split(" ")[1]
-            log.debug(f"Извлечён токен: {token}")
+            log.debug("Извлечён токен: %s…", token[:8])
             return token
         log.warning("Токен не найден в заголовках.")
         return None
@@ -40,7 +40,7 @@ class RequestHandler:
     def is_authenticated(self):
         token = self.get_token()
         if token and self.auth_manager.verify_token(token):
-            log.info("Токен подтверждён. Пользователь аутентифицирован.")
+            log.debug("Токен подтверждён. Пользователь аутентифицирован.")
             return True
         log.warning("Аутентификация не удалась.")
         return False
@@ -50,9 +50,8 @@ class RequestHandler:
         if not token:
             return False
         try:
-            decoded = self.auth_manager._decode_token(token)
-            username = decoded.split(":")[0]
-            return self.auth_manager.has_role(username, required_role)
+            username = self.auth_manager.token_user(token)
+            return username is not None and self.auth_manager.has_role(username, required_role)
         except Exception as e:
             log.warning(f"Ошибка проверки роли: {e}")
             return False
@@ -63,12 +62,11 @@ class RequestHandler:
             @wraps(f)
             def wrapper(*args, **kwargs):
                 token = self.get_token()
-                if not token or not self.auth_manager.verify_token(token):
+                username = self.auth_manager.token_user(token) if token else None
+                if username is None:
                     return jsonify({"error": "Unauthorized"}), 401
 
                 if required_role:
-                    decoded = self.auth_manager._decode_token(token)
-                    username = decoded.split(":")[0]
                     if not self.auth_manager.has_role(username, required_role):
                         return jsonify({"error": "Forbidden"}), 403
 
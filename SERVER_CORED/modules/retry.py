@@ -0,0 +1,10 @@
+"""Пауза между повторами — общая для HTTP-клиента (api_client) и уведомлений (error_handler).
+
+Отдельный модуль без зависимостей: обработка ошибок не должна тянуть за собой httpx.
+"""
+import random
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная пауза с полным джиттером (attempt с 1): случайная в [0, min(cap, base * 2^(attempt-1))]."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
@@ -0,0 +1,120 @@
+"""Потоковая выгрузка пользователей в CSV или NDJSON.
+
+Один SELECT на отдельном read-only соединении; строки читаются пачками fetchmany(EXPORT_BATCH)
+в собственном потоке выгрузки, там же форматируются и, если нужно, сжимаются gzip. В цикл
+событий приходят готовые байты, в памяти — одна пачка, сколько бы строк ни было в таблице.
+
+Выгрузка читает один снимок базы (транзакция чтения WAL): писатель её не ждёт, но пока она
+идёт, checkpoint не может обнулить WAL — файл -wal растёт на объём записей за это время.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import sqlite3
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from modules.db_core import USER_COLUMNS, users_where
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", 1000))
+EXPORT_GZIP_LEVEL = 6
+EXPORT_FORMATS = ("csv", "ndjson")
+
+
+class UserExport:
+    """Параметры выгрузки проверяются в конструкторе (ValueError), строки — в stream()."""
+
+    def __init__(self, db_path, fmt: str = "csv", columns=None, gzip: bool = False,
+                 role: Optional[str] = None, blocked: Optional[bool] = None,
+                 deleted: Optional[bool] = False, created_from: Optional[str] = None,
+                 created_to: Optional[str] = None, batch: int = EXPORT_BATCH):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Недопустимый формат: {fmt}")
+        columns = list(columns or USER_COLUMNS)
+        unknown = [c for c in columns if c not in USER_COLUMNS]
+        if unknown:
+            raise ValueError(f"Недопустимые колонки: {', '.join(unknown)}")
+        self.format = fmt
+        self.columns = columns
+        self.gzip = gzip
+        self.batch = max(1, int(batch))
+        self._uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+
+        cond, self._params = users_where(role, blocked, deleted, created_from, created_to)
+        # Порядок — по индексу: с диапазоном дат idx_users_created, иначе первичный ключ
+        # (или idx_users_role при фильтре по роли) — без сортировки всей выборки
+        order = "created_at, login" if created_from or created_to else "login"
+        self._sql = (f"SELECT {', '.join(columns)} FROM users"
+                     + (" WHERE " + " AND ".join(cond) if cond else "")
+                     + " ORDER BY " + order)
+        self._conn = self._cur = self._zip = None
+        self._buf = io.StringIO()
+        self._csv = csv.writer(self._buf, lineterminator="\n")
+        self.rows = 0
+
+    @property
+    def filename(self) -> str:
+        return f"users.{self.format}" + (".gz" if self.gzip else "")
+
+    @property
+    def media_type(self) -> str:
+        if self.gzip:
+            return "application/gzip"
+        return "text/csv; charset=utf-8" if self.format == "csv" else "application/x-ndjson"
+
+    # --- Поток выгрузки: все обращения к соединению — из одного потока ---
+    def _encode(self, text: str) -> bytes:
+        data = text.encode()
+        return self._zip.compress(data) if self._zip else data
+
+    def _open(self) -> bytes:
+        self._conn = sqlite3.connect(self._uri, uri=True)
+        self._conn.execute("PRAGMA query_only=1")
+        self._cur = self._conn.execute(self._sql, self._params)
+        if self.gzip:
+            self._zip = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return self._encode(",".join(self.columns) + "\n" if self.format == "csv" else "")
+
+    def _next(self) -> Optional[bytes]:
+        """Очередная пачка в байтах; b"" — сжатое ещё не вытолкнуто; None — конец."""
+        rows = self._cur.fetchmany(self.batch)
+        if not rows:
+            if self._zip is None:
+                return None
+            tail, self._zip = self._zip.flush(), None
+            return tail
+        self.rows += len(rows)
+        if self.format == "csv":
+            self._csv.writerows(rows)
+            text = self._buf.getvalue()
+            self._buf.seek(0)
+            self._buf.truncate()
+        else:
+            cols = self.columns
+            text = "".join(json.dumps(dict(zip(cols, r)), ensure_ascii=False) + "\n"
+                           for r in rows)
+        return self._encode(text)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = self._cur = None
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-export")
+        try:
+            data = await loop.run_in_executor(executor, self._open)
+            while data is not None:
+                if data:
+                    yield data
+                data = await loop.run_in_executor(executor, self._next)
+        finally:
+            # Клиент отключился — генератор отменён, возможно посреди fetchmany. Поток один,
+            # поэтому соединение закроется сразу после текущей пачки, а не параллельно с ней.
+            executor.submit(self._close)
+            executor.shutdown(wait=False)
@@ -0,0 +1,302 @@
+"""Массовый импорт пользователей из CSV или NDJSON, потоком.
+
+Тело разбирается по мере поступления (строки, затем записи), записи копятся в пачки по
+IMPORT_CHUNK. Для пачки: повторы внутри пачки, одна предпроверка check_free_bulk,
+хеширование паролей в пуле PasswordHasher, одна вставка executemany (add_users_bulk).
+Пока пачка хешируется и пишется, из сети читается следующая — в памяти не больше двух пачек.
+
+Колонки (CSV — строка заголовка, NDJSON — ключи объекта): login, password или pwd_hash
+(готовый bcrypt-хеш, например из другой системы), full_name, phone, role, iin. Пустые phone и
+iin пишутся как NULL, чтобы не конфликтовать по UNIQUE друг с другом.
+
+Статус задачи (ImportJob.to_dict()) сохраняется в users.db после каждой пачки — его видит любой
+воркер: GET /admin/import/{id}.
+
+HTTP-импорт не держит запрос до конца: тело сначала сохраняется во временный файл (spool),
+затем run_import_file разбирает его в фоновой задаче, а клиент сразу получает id задачи.
+"""
+import asyncio
+import codecs
+import csv
+import datetime
+import json
+import os
+import re
+import secrets
+import tempfile
+from typing import IO, AsyncIterator, Dict, Optional, Tuple
+
+from modules.db_core import CHECK_FIELDS, DBProducer
+from modules.hasher import PasswordHasher, get_hasher
+from modules.logger import Logger
+
+log = Logger("import")
+
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", 1000))
+IMPORT_MAX_ERRORS = 1000        # ошибок по строкам в статусе задачи; счётчик failed — полный
+MAX_LINE = 1024 * 1024          # символов в одной записи
+MAX_FIELD = 256                 # символов в поле
+SPOOL_READ = 64 * 1024         # байт за одно чтение временного файла
+IMPORT_FIELDS = ("login", "password", "pwd_hash", "full_name", "phone", "role", "iin")
+# Полный формат bcrypt: префикс, стоимость 04–31, 22 символа соли и 31 — хеша. Обрезанный хеш
+# checkpw не разберёт (ValueError) — такой пользователь не смог бы войти
+_BCRYPT_RE = re.compile(r"\$2[aby]\$(0[4-9]|[12][0-9]|3[01])\$[./A-Za-z0-9]{53}")
+
+
+class ImportFormatError(ValueError):
+    """Тело нельзя разобрать как CSV/NDJSON (нет заголовка, слишком длинная строка)."""
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+class ImportJob:
+    def __init__(self, fmt: Optional[str] = None):
+        self.id = secrets.token_hex(8)
+        self.status = "running"
+        self.format = fmt
+        self.created_at = self.updated_at = _now()
+        self.rows = self.inserted = self.failed = 0
+        self.errors = []
+        self.error = None
+
+    def fail_row(self, line: int, login, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "login": login, "error": message})
+
+    def to_dict(self) -> dict:
+        self.updated_at = _now()
+        return {"id": self.id, "status": self.status, "format": self.format,
+                "created_at": self.created_at, "updated_at": self.updated_at,
+                "rows": self.rows, "inserted": self.inserted, "failed": self.failed,
+                "errors": self.errors, "error": self.error}
+
+
+# --- Разбор потока ---
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Строки UTF-8 (BOM отбрасывается) из потока байтов, с окончанием строки."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        # Только по \n: splitlines резал бы и по \u2028, \x1c и т. п. внутри значений
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        if len(tail) > MAX_LINE:
+            raise ImportFormatError(f"Строка длиннее {MAX_LINE} символов")
+        for line in lines:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    """(номер строки, запись) из CSV с заголовком; поле в кавычках может занимать несколько строк."""
+    header, buf, start, n = None, "", 0, 0
+    async for line in lines:
+        n += 1
+        if not buf:
+            start = n
+        buf += line
+        if buf.count('"') % 2:          # кавычка не закрыта — запись продолжается
+            if len(buf) > MAX_LINE:
+                raise ImportFormatError(f"Запись со строки {start} длиннее {MAX_LINE} символов")
+            continue
+        record, buf = buf, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            if "login" not in header:
+                raise ImportFormatError("В заголовке CSV нет колонки login")
+            continue
+        yield start, dict(zip(header, values))
+    if buf.strip():
+        raise ImportFormatError(f"Незакрытая кавычка в записи со строки {start}")
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, object]]:
+    n = 0
+    async for line in lines:
+        n += 1
+        if line.strip():
+            try:
+                yield n, json.loads(line)
+            except ValueError as e:
+                yield n, e
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: Optional[str] = None):
+    """Записи CSV или NDJSON; без fmt формат определяется по первой непустой строке ("{" — NDJSON)."""
+    lines = iter_lines(chunks)
+    first = None
+    if fmt is None:
+        async for first in lines:
+            if first.strip():
+                break
+        fmt = "ndjson" if first and first.lstrip().startswith("{") else "csv"
+
+    async def replay():
+        if first is not None:
+            yield first
+        async for line in lines:
+            yield line
+
+    parse = iter_ndjson if fmt == "ndjson" else iter_csv
+    async for item in parse(replay()):
+        yield fmt, item
+
+
+def _validate(row) -> Tuple[Optional[list], Optional[str], Optional[str]]:
+    """(строка для вставки без хеша, пароль для хеширования, ошибка)."""
+    if isinstance(row, Exception):
+        return None, None, f"Некорректный JSON: {row}"
+    if not isinstance(row, dict):
+        return None, None, "Ожидается объект"
+    rec = {}
+    for k in IMPORT_FIELDS:
+        v = row.get(k)
+        v = "" if v is None else str(v).strip()
+        if len(v) > MAX_FIELD:
+            return None, None, f"Поле {k} длиннее {MAX_FIELD} символов"
+        rec[k] = v
+    if not rec["login"]:
+        return None, None, "Пустой login"
+    if rec["pwd_hash"] and not _BCRYPT_RE.fullmatch(rec["pwd_hash"]):
+        return None, None, "pwd_hash — не bcrypt-хеш"
+    if not rec["pwd_hash"] and not rec["password"]:
+        return None, None, "Нет password или pwd_hash"
+    values = [rec["login"], rec["pwd_hash"] or None, rec["full_name"],
+              rec["phone"] or None, rec["role"], rec["iin"] or None]
+    return values, None if rec["pwd_hash"] else rec["password"], None
+
+
+# --- Импорт ---
+def _unique_keys(values):
+    """(поле, значение) уникальных реквизитов строки; NULL не конфликтует и не проверяется."""
+    return [(f, v) for f, v in zip(CHECK_FIELDS, (values[0], values[3], values[5])) if v is not None]
+
+
+async def _process_chunk(producer: DBProducer, hasher: PasswordHasher, sem: asyncio.Semaphore,
+                         job: ImportJob, chunk):
+    """chunk — [(номер строки, values, password | None)]."""
+    # Повторы внутри пачки; между пачками их ловит check_free_bulk (прошлая пачка уже вставлена)
+    seen = {f: set() for f in CHECK_FIELDS}
+    fresh = []
+    for line, values, pw in chunk:
+        dup = [f for f, v in _unique_keys(values) if v in seen[f]]
+        if dup:
+            job.fail_row(line, values[0], f"Повтор в файле: {', '.join(dup)}")
+            continue
+        for f, v in _unique_keys(values):
+            seen[f].add(v)
+        fresh.append((line, values, pw))
+
+    taken = await producer.check_free_bulk(logins=seen["login"], phones=seen["phone"],
+                                           iins=seen["iin"])
+    taken = {f: set(v) for f, v in taken.items()}
+    ok = []
+    for line, values, pw in fresh:
+        busy = [f for f, v in _unique_keys(values) if v in taken[f]]
+        if busy:
+            job.fail_row(line, values[0], f"Уже занято: {', '.join(busy)}")
+        else:
+            ok.append((line, values, pw))
+
+    # Не больше слотов хешера одновременно: вход пользователей ждёт не дольше одного хеша
+    async def hash_one(item):
+        line, values, pw = item
+        if pw is not None:
+            async with sem:
+                values[1] = await hasher.hash(pw)
+
+    await asyncio.gather(*(hash_one(item) for item in ok))
+    if ok:
+        failed = await producer.add_users_bulk([values for _, values, _ in ok])
+        for i, message in failed:
+            job.fail_row(ok[i][0], ok[i][1][0], message)
+        job.inserted += len(ok) - len(failed)
+    await producer.save_import_job(job.to_dict())
+
+
+async def run_import(producer: DBProducer, chunks: AsyncIterator[bytes], job: ImportJob,
+                     fmt: Optional[str] = None, hasher: Optional[PasswordHasher] = None,
+                     chunk_size: int = IMPORT_CHUNK) -> ImportJob:
+    """Импортировать поток; статус — в job и в import_jobs. Ошибки строк не прерывают импорт."""
+    hasher = hasher or get_hasher()
+    sem = asyncio.Semaphore(hasher.max_workers)
+    await producer.save_import_job(job.to_dict())
+    pending: Optional[asyncio.Task] = None
+    chunk = []
+
+    async def flush():
+        nonlocal pending, chunk
+        if pending is not None:
+            await pending
+        pending = asyncio.create_task(_process_chunk(producer, hasher, sem, job, chunk))
+        chunk = []
+
+    try:
+        async for found, (line, row) in iter_records(chunks, fmt):
+            job.format = found
+            job.rows += 1
+            values, pw, error = _validate(row)
+            if error:
+                job.fail_row(line, row.get("login") if isinstance(row, dict) else None, error)
+                continue
+            chunk.append((line, values, pw))
+            if len(chunk) >= chunk_size:
+                await flush()
+        if chunk:
+            await flush()
+        if pending is not None:
+            await pending
+        job.status = "done"
+    except BaseException as e:
+        if pending is not None and not pending.done():
+            pending.cancel()
+        job.status = "failed"
+        job.error = str(e) or type(e).__name__
+        # Уже вставленные пачки остаются; статус сохраняем, даже если запрос отменён
+        await asyncio.shield(producer.save_import_job(job.to_dict()))
+        raise
+    await producer.save_import_job(job.to_dict())
+    return job
+
+
+# --- Фоновый импорт из временного файла ---
+async def spool(chunks: AsyncIterator[bytes]) -> IO[bytes]:
+    """Сохранить поток во временный файл (на диске, в памяти — один чанк); файл — на начале."""
+    f = tempfile.TemporaryFile()
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(f.write, chunk)
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+async def iter_file(f: IO[bytes], size: int = SPOOL_READ) -> AsyncIterator[bytes]:
+    try:
+        while chunk := await asyncio.to_thread(f.read, size):
+            yield chunk
+    finally:
+        f.close()
+
+
+async def run_import_file(producer: DBProducer, f: IO[bytes], job: ImportJob,
+                          fmt: Optional[str] = None) -> ImportJob:
+    """run_import для фоновой задачи: файл закрывается, ошибка остаётся в статусе (failed)."""
+    try:
+        await run_import(producer, iter_file(f), job, fmt)
+    except ImportFormatError as e:
+        log.warning(f"Импорт {job.id}: {e}")
+    except Exception:
+        log.exception(f"Импорт {job.id} прерван")
+    finally:
+        f.close()
+    return job
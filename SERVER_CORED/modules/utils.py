@@ -1 +1,72 @@
 # Модуль utils.py
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+# --- Потоковый разбор multipart/form-data ---
+async def iter_multipart(request):
+    """Разбирает тело multipart/form-data по мере поступления, ничего не сохраняя на диск.
+
+    Отдаёт события:
+      ("begin", name, filename | None) — начало поля (filename есть только у файлов);
+      ("data", bytes)                  — очередная порция содержимого поля;
+      ("end",)                         — конец поля.
+    Соседние порции данных из одного сетевого чанка склеиваются.
+    """
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise ValueError("Ожидается multipart/form-data")
+
+    events = []
+    headers = {}
+    field, value = bytearray(), bytearray()
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(field).lower()] = bytes(value)
+        field.clear()
+        value.clear()
+
+    def on_headers_finished():
+        _, opts = parse_options_header(headers.get(b"content-disposition", b""))
+        filename = opts.get(b"filename")
+        events.append(("begin", opts.get(b"name", b"").decode(),
+                       filename.decode() if filename is not None else None))
+
+    def on_part_data(data, start, end):
+        if events and events[-1][0] == "data":
+            events[-1][1].extend(data[start:end])
+        else:
+            events.append(("data", bytearray(data[start:end])))
+
+    def on_part_end():
+        events.append(("end",))
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for ev in events:
+            yield ev if ev[0] != "data" else ("data", bytes(ev[1]))
+        events.clear()
+    parser.finalize()
+    for ev in events:
+        yield ev if ev[0] != "data" else ("data", bytes(ev[1]))
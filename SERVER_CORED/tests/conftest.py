@@ -0,0 +1,56 @@
+import asyncio
+import contextlib
+import importlib
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Тесты запускаются из любого каталога: modules и bench — пакеты корня SERVER_CORED
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Журналы тестов — во временный каталог, не в logs/ проекта
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="test_logs_"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """TestClient приложения main с данными (users.db, документы, бэкапы) в tmp_path."""
+    from fastapi.testclient import TestClient
+    from modules import hasher
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("BACKUP_INTERVAL", "0")
+    monkeypatch.chdir(ROOT)                     # static/ монтируется относительно каталога
+    # Быстрый bcrypt в потоках. modules.hasher не перезагружаем: db_core держит его функции,
+    # и пул процессов не смог бы их пиклить
+    monkeypatch.setattr(hasher, "_HASHER", hasher.PasswordHasher(rounds=4, use_processes=False))
+    sys.modules.pop("main", None)
+    main = importlib.import_module("main")
+    with TestClient(main.app) as c:
+        yield c
+    sys.modules.pop("main", None)
+
+
+@pytest.fixture
+def open_db(tmp_path):
+    """Фабрика: async with open_db(**параметры DBWorker) as (worker, producer) — users.db в tmp_path."""
+    from modules.db_core import DBProducer, DBWorker
+    from modules.hasher import PasswordHasher
+
+    @contextlib.asynccontextmanager
+    async def factory(**worker_kw):
+        hasher = PasswordHasher(rounds=4, use_processes=False)
+        worker = DBWorker(db_path=os.path.join(tmp_path, "users.db"),
+                          backup_dir=os.path.join(tmp_path, "backups"), **worker_kw)
+        task = asyncio.create_task(worker.run())
+        await worker.ready.wait()
+        try:
+            yield worker, DBProducer(hasher=hasher)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            hasher.shutdown()
+
+    return factory
@@ -0,0 +1,116 @@
+"""Склейка повторов, ограничение частоты, повторы отправки и независимость каналов уведомлений
+на заглушках SMTP и Telegram из bench.alerts."""
+import socket
+import time
+
+import pytest
+
+from bench.alerts import StubSMTP, StubTelegram
+from modules.error_handler import AlertChannel, AlertDispatcher, ErrorHandler
+
+
+def wait_for(cond, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            raise AssertionError("условие не выполнилось за отведённое время")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def tg(monkeypatch):
+    srv = StubTelegram()
+    monkeypatch.setitem(ErrorHandler.TELEGRAM_CONFIG, "api_url", srv.url)
+    yield srv
+    srv.shutdown()
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    srv = StubSMTP()
+    for k, v in (("smtp_server", "127.0.0.1"), ("smtp_port", srv.server_address[1]),
+                 ("starttls", False), ("password", "")):
+        monkeypatch.setitem(ErrorHandler.EMAIL_CONFIG, k, v)
+    yield srv
+    srv.shutdown()
+
+
+def telegram(**kw):
+    kw.setdefault("backoff_base", 0.01)
+    return AlertChannel("telegram", ErrorHandler.send_telegram_alert, **kw)
+
+
+def test_identical_alerts_coalesced(tg):
+    dispatcher = AlertDispatcher([telegram(window=60, burst=10)])
+    dispatcher.submit("disk full")
+    wait_for(lambda: tg.received == 1)          # первое уходит сразу
+    for _ in range(4):
+        dispatcher.submit("disk full")
+    dispatcher.submit("db down")                # другой текст — другой ключ, не склеивается
+    wait_for(lambda: tg.received == 2)
+    time.sleep(0.2)
+    assert tg.received == 2                     # повторы ждут конца окна
+    dispatcher.close()                          # остановка отправляет накопленное сразу
+    assert tg.received == 3
+    assert "disk full" in tg.messages[0] and "повторилось" not in tg.messages[0]
+    assert "db down" in tg.messages[1]
+    assert "disk full" in tg.messages[2] and "(повторилось 4 раз)" in tg.messages[2]
+    stats = dispatcher.stats()["telegram"]
+    assert stats["received"] == 6 and stats["sent"] == 3 and stats["coalesced"] == 3
+
+
+def test_rate_limit_delays_but_keeps_alerts(tg):
+    channel = telegram(rate=0.001, burst=2, window=0)
+    dispatcher = AlertDispatcher([channel])
+    for i in range(5):
+        dispatcher.submit(f"сбой {i}")
+    wait_for(lambda: tg.received == 2)
+    time.sleep(0.2)
+    assert tg.received == 2                     # бакет пуст: остальные ждут, а не теряются
+    assert channel.counters["rate_limited"] >= 1
+    dispatcher.close()
+    assert tg.received == 5
+    assert channel.counters["failed"] == channel.counters["dropped"] == 0
+
+
+def test_transient_failure_retried(tg):
+    tg.status = 503
+    channel = telegram(retries=3)
+    dispatcher = AlertDispatcher([channel])
+    dispatcher.submit("сбой")
+    wait_for(lambda: channel.counters["failed"] == 1)
+    dispatcher.close()
+    assert tg.received == 3
+    assert channel.counters["retries"] == 2 and channel.counters["sent"] == 0
+
+
+def test_permanent_failure_not_retried(tg):
+    tg.status = 400
+    channel = telegram(retries=3)
+    dispatcher = AlertDispatcher([channel])
+    dispatcher.submit("сбой")
+    wait_for(lambda: channel.counters["failed"] == 1)
+    dispatcher.close()
+    assert tg.received == 1 and channel.counters["retries"] == 0
+
+
+def test_failing_channel_does_not_block_others(tg, smtp, monkeypatch):
+    # SMTP недоступен (порт закрыт): почта повторяет с паузами, Telegram уходит сразу
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        closed_port = s.getsockname()[1]
+    monkeypatch.setitem(ErrorHandler.EMAIL_CONFIG, "smtp_port", closed_port)
+    email = AlertChannel("email", ErrorHandler.send_email_alert, retries=3, backoff_base=0.5)
+    dispatcher = AlertDispatcher([email, telegram()])
+    t0 = time.monotonic()
+    dispatcher.submit("сбой")
+    wait_for(lambda: tg.received == 1)
+    assert time.monotonic() - t0 < 0.5
+    assert email.counters["sent"] == 0
+
+    # Почта снова доступна: следующее уведомление доходит по обоим каналам
+    wait_for(lambda: email.counters["failed"] == 1)
+    monkeypatch.setitem(ErrorHandler.EMAIL_CONFIG, "smtp_port", smtp.server_address[1])
+    dispatcher.submit("другой сбой")
+    dispatcher.close()
+    assert smtp.received == 1 and tg.received == 2
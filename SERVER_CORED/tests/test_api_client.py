@@ -0,0 +1,147 @@
+"""Повторы, паузы, здоровье прокси и предохранитель APIClient/AsyncAPIClient на заглушке
+из bench.api_client (отдельный процесс, настоящий HTTP)."""
+import asyncio
+import random
+
+import pytest
+
+from bench.api_client import StubServer
+from modules import api_client
+from modules.api_client import APIClient, AsyncAPIClient, BREAKER_COOLDOWN, BREAKER_FAILURES
+from modules.retry import backoff_delay
+
+
+@pytest.fixture(scope="module")
+def servers():
+    target, good, broken = StubServer(), StubServer(), StubServer(error_rate=1.0)
+    yield target, good, broken
+    for srv in (target, good, broken):
+        srv.stop()
+
+
+@pytest.fixture
+def target(servers):
+    servers[0].error_rate = 0.0
+    return servers[0]
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    """Паузы между повторами: номера попыток вместо сна."""
+    calls = []
+
+    def fake(attempt, base, cap):
+        calls.append(attempt)
+        return 0.0
+
+    monkeypatch.setattr(api_client, "backoff_delay", fake)
+    return calls
+
+
+def test_backoff_delay_full_jitter_bounds():
+    random.seed(1)
+    for attempt in range(1, 10):
+        cap = min(5.0, 0.2 * 2 ** (attempt - 1))
+        samples = [backoff_delay(attempt, 0.2, 5.0) for _ in range(200)]
+        assert all(0 <= d <= cap for d in samples)
+        assert max(samples) > cap * 0.8       # джиттер на весь интервал, а не около нуля
+
+
+def test_sync_retries_retryable_status_then_gives_up(target, delays):
+    target.error_rate = 1.0
+    client = APIClient(target.url, retries=3)
+    before = target.hits
+    assert client.get("/ping") is None
+    client.close()
+    assert target.hits - before == 3
+    assert delays == [1, 2]
+
+
+def test_sync_does_not_retry_client_errors(target, delays):
+    client = APIClient(target.url, retries=3)
+    before = target.hits
+    assert client.get("/status/404") is None
+    assert client.get("/ping") == {"ok": True}
+    client.close()
+    assert target.hits - before == 2
+    assert delays == []
+
+
+def test_async_retries_and_succeeds(target, delays):
+    async def run():
+        async with AsyncAPIClient(target.url, retries=4) as api:
+            return await api.get("/ping"), await api.get("/status/503")
+
+    before = target.hits
+    ok, failed = asyncio.run(run())
+    assert ok == {"ok": True}
+    assert failed is None
+    assert target.hits - before == 1 + 4
+    assert delays == [1, 2, 3]
+
+
+def test_proxy_failover_by_health(servers, delays):
+    target, good, broken = servers
+    target.error_rate = good.error_rate = 0.0
+    broken.error_rate = 1.0
+
+    async def run():
+        async with AsyncAPIClient(target.url, retries=3, proxies_list=[good.url, broken.url]) as api:
+            hits = good.hits, broken.hits
+            results = await api.gather([("get", "/ping")] * 40, concurrency=1)
+            # Отказ сломанного прокси повторяется через исправный; после отказа доля ошибок
+            # портит его оценку, и трафик уходит к исправному
+            assert all(r == {"ok": True} for r in results)
+            assert broken.hits - hits[1] <= 2
+            assert good.hits - hits[0] == 40
+            snap = {h["proxy"]: h for h in api.health()}
+            assert snap[broken.url]["error_rate"] > 0
+            assert snap[good.url]["error_rate"] == 0
+
+    asyncio.run(run())
+
+
+def test_circuit_breaker_transitions(servers, delays):
+    target, good, broken = servers
+    target.error_rate = 0.0
+    good.error_rate = broken.error_rate = 1.0
+
+    async def run():
+        async with AsyncAPIClient(target.url, retries=2, proxies_list=[good.url, broken.url]) as api:
+            h_good, h_broken = api.proxies._health[good.url], api.proxies._health[broken.url]
+
+            # closed -> open: каждый вызов пробует оба прокси, после BREAKER_FAILURES отказов
+            # подряд оба отдыхают
+            for _ in range(BREAKER_FAILURES):
+                assert await api.get("/ping") is None
+            assert h_good.failures == h_broken.failures == BREAKER_FAILURES
+            assert {h["proxy"] for h in api.health() if h["open_for"] > 0} == {good.url, broken.url}
+
+            # open -> half-open -> closed: отдых исправленного прокси кончился, пробная попытка успешна
+            good.error_rate = 0.0
+            h_good.open_until = 0.0
+            assert await api.get("/ping") == {"ok": True}
+            assert h_good.failures == 0 and h_good.cooldown == BREAKER_COOLDOWN
+
+            # Пока сломанный отдыхает, трафика на него нет
+            hits = broken.hits
+            for _ in range(10):
+                assert await api.get("/ping") == {"ok": True}
+            assert broken.hits == hits
+
+            # half-open -> open: проба всё ещё сломанного прокси — отдых вдвое дольше,
+            # сам вызов повторяется через исправный
+            cooldown = h_broken.cooldown
+            h_broken.open_until = 0.0
+            assert await api.get("/ping") == {"ok": True}
+            assert broken.hits == hits + 1
+            assert h_broken.open_until > 0 and h_broken.cooldown == cooldown * 2
+
+            # Прокси починился: проба успешна — предохранитель закрыт, отдых сброшен
+            broken.error_rate = 0.0
+            h_broken.open_until = 0.0
+            assert await api.get("/ping") == {"ok": True}
+            assert broken.hits == hits + 2
+            assert h_broken.failures == 0 and h_broken.cooldown == BREAKER_COOLDOWN
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+"""Кеш ролей AuthManager: сброс при записи user_roles и слабая подписка на изменения."""
+import gc
+import os
+
+from modules import db_core
+from modules.auth import AuthManager
+
+
+def make_manager(tmp_path, name="docs.db"):
+    return AuthManager("secret", os.path.join(tmp_path, name), role_ttl=3600)
+
+
+def test_role_change_invalidates_cache(tmp_path):
+    auth = make_manager(tmp_path)
+    other = make_manager(tmp_path)          # второй экземпляр на той же базе (другой модуль)
+    auth.db.add_user("alice", "pw")
+    assert auth.set_roles("alice", ["user"])
+    assert auth.get_roles("alice") == {"user"}
+    assert other.get_roles("alice") == {"user"}
+
+    # Запись через DocumentDatabase напрямую сбрасывает кеш обоих, не дожидаясь TTL
+    other.db.set_user_roles("alice", ["user", "admin"])
+    assert auth.has_role("alice", "admin")
+    assert other.get_roles("alice") == {"user", "admin"}
+    assert not auth.set_roles("nobody", ["admin"])
+    auth.close()
+    other.close()
+
+
+def test_listener_does_not_keep_manager_alive(tmp_path):
+    before = len(db_core._USER_LISTENERS)
+    auth = make_manager(tmp_path)
+    assert len(db_core._USER_LISTENERS) == before + 1
+    auth.db.close()
+    del auth
+    gc.collect()
+    db_core.notify_user_changed("alice")           # мёртвая подписка выпадает при рассылке
+    assert len(db_core._USER_LISTENERS) == before
+
+    auth = make_manager(tmp_path)
+    auth.close()
+    assert len(db_core._USER_LISTENERS) == before
@@ -0,0 +1,116 @@
+"""Формат SDOC: круговой тест через границы сегментов, чтение v1/CFB, обнаружение подмены."""
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from modules import crypto_module as cm
+
+SEG = 1000
+ITER = 1000             # быстрый PBKDF2 для v2; v1 и CFB читаются с LEGACY_KDF_ITERATIONS
+
+
+def write(path, data, password="pw", chunk=777, **kw):
+    writer = cm.EncryptedWriter(str(path), password, segment_size=SEG, iterations=ITER, **kw)
+    for i in range(0, len(data), chunk):
+        writer.write(data[i:i + chunk])
+    return writer.close()
+
+
+def read(path, password="pw", start=0, end=None, **kw):
+    with cm.EncryptedReader(str(path), password, **kw) as reader:
+        return b"".join(reader.iter_range(start, end))
+
+
+@pytest.mark.parametrize("size", [0, 1, SEG - 1, SEG, SEG + 1, 3 * SEG, 3 * SEG + 17])
+def test_round_trip(tmp_path, size):
+    data = os.urandom(size)
+    path = write(tmp_path / "doc.enc", data)
+    with cm.EncryptedReader(path, "pw") as reader:
+        assert reader.size == size
+    assert read(path) == data
+
+
+@pytest.mark.parametrize("start, end", [(0, SEG), (SEG - 1, SEG + 1), (SEG, 2 * SEG),
+                                        (10, 3 * SEG + 5), (2 * SEG + 500, None)])
+def test_ranges_across_segments(tmp_path, start, end):
+    data = os.urandom(3 * SEG + 17)
+    path = write(tmp_path / "doc.enc", data)
+    assert read(path, start=start, end=end) == data[start:end]
+
+
+def test_v3_blob_with_external_key(tmp_path):
+    key = AESGCM.generate_key(bit_length=256)
+    data = os.urandom(2 * SEG + 3)
+    path = write(tmp_path / "blob.sdoc", data, password=None, key=key)
+    assert read(path, None, key=key) == data
+    with pytest.raises(ValueError):
+        cm.EncryptedReader(path, "pw")                      # без ключа данных
+
+
+def test_reads_v1_files(tmp_path):
+    data = os.urandom(SEG + 10)
+    salt, prefix = os.urandom(16), os.urandom(7)
+    header = cm._HEADER_V1.pack(cm.MAGIC, 1, SEG, salt, prefix)
+    aead = AESGCM(cm.derive_key("pw", salt, cm.LEGACY_KDF_ITERATIONS))
+    segments = [data[:SEG], data[SEG:]]
+    body = b"".join(aead.encrypt(cm._segment_nonce(prefix, i, i == len(segments) - 1), s, header)
+                    for i, s in enumerate(segments))
+    path = tmp_path / "v1.enc"
+    path.write_bytes(header + body)
+    assert read(path) == data
+    assert read(path, start=SEG - 5, end=SEG + 5) == data[SEG - 5:SEG + 5]
+
+
+def test_reads_legacy_cfb_files(tmp_path):
+    data = os.urandom(5000)
+    salt, iv = os.urandom(16), os.urandom(16)
+    key = cm.derive_key("pw", salt, cm.LEGACY_KDF_ITERATIONS)
+    enc = Cipher(algorithms.AES(key), modes.CFB(iv)).encryptor()
+    path = tmp_path / "old.enc"
+    path.write_bytes(salt + iv + enc.update(data) + enc.finalize())
+    assert read(path) == data
+    assert read(path, start=1234, end=4321) == data[1234:4321]
+
+
+def test_wrong_password(tmp_path):
+    path = write(tmp_path / "doc.enc", b"secret")
+    with pytest.raises(InvalidTag):
+        cm.EncryptedReader(path, "other")
+
+
+def tampered(tmp_path, mutate):
+    data = os.urandom(3 * SEG + 17)
+    path = write(tmp_path / "doc.enc", data)
+    raw = bytearray(open(path, "rb").read())
+    with open(path, "wb") as f:
+        f.write(mutate(raw, cm._HEADER_V2.size, SEG + cm.TAG_SIZE))
+    return path
+
+
+def test_flipped_byte_in_segment_is_detected(tmp_path):
+    def flip(raw, head, stride):
+        raw[head + stride + 5] ^= 1                          # сегмент 1
+        return bytes(raw)
+    path = tampered(tmp_path, flip)
+    assert read(path, end=SEG)                              # сегмент 0 цел
+    with pytest.raises(InvalidTag):
+        read(path, start=SEG, end=SEG + 1)
+
+
+def test_truncation_is_detected(tmp_path):
+    # Отрезан последний сегмент: предпоследний не помечен как последний
+    path = tampered(tmp_path, lambda raw, head, stride: bytes(raw[:head + 3 * stride]))
+    with pytest.raises(InvalidTag):
+        read(path)
+
+
+def test_swapped_segments_are_detected(tmp_path):
+    def swap(raw, head, stride):
+        s1, s2 = raw[head:head + stride], raw[head + stride:head + 2 * stride]
+        return bytes(raw[:head] + s2 + s1 + raw[head + 2 * stride:])
+    path = tampered(tmp_path, swap)
+    with pytest.raises(InvalidTag):
+        read(path)
@@ -0,0 +1,82 @@
+"""Вход через DBProducer.auth: неверный пароль, счётчик ошибок и блокировка."""
+import asyncio
+
+from modules.db_core import MAX_FAILED
+from modules.hasher import PasswordHasher
+
+
+def set_pwd(worker, login, pwd):
+    conn = worker._sync_open()
+    conn.execute("UPDATE users SET pwd=? WHERE login=?", (pwd, login))
+    conn.commit()
+    conn.close()
+
+
+def login_state(worker, login):
+    """(failed_logins, is_blocked) прямо из файла, мимо кешей и пула чтения."""
+    conn = worker._sync_open()
+    try:
+        return conn.execute("SELECT failed_logins, is_blocked FROM users WHERE login=?",
+                            (login,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_malformed_stored_hash_is_a_failed_login(open_db):
+    async def main():
+        async with open_db() as (worker, db):
+            await db.add_user("ann", "secret", "Ann", "+70000000001")
+            await asyncio.to_thread(set_pwd, worker, "ann", "$2b$12$short")
+            assert await db.auth("ann", "secret") is False
+            assert await asyncio.to_thread(login_state, worker, "ann") == (1, 0)
+    asyncio.run(main())
+
+
+def test_verify_malformed_hash_returns_false():
+    hasher = PasswordHasher(rounds=4, use_processes=False)
+    try:
+        assert asyncio.run(hasher.verify("x", "$2b$12$short")) is False
+        assert asyncio.run(hasher.verify("x", "not a hash")) is False
+    finally:
+        hasher.shutdown()
+
+
+def test_lockout_after_max_failed_and_unblock(open_db):
+    async def main():
+        async with open_db() as (worker, db):
+            await db.add_user("ann", "secret", "Ann", "+70000000001")
+            for i in range(MAX_FAILED - 1):
+                assert await db.auth("ann", "wrong") is False
+            assert await asyncio.to_thread(login_state, worker, "ann") == (MAX_FAILED - 1, 0)
+            assert await db.auth("ann", "secret") is True          # успех обнуляет счётчик
+            assert await asyncio.to_thread(login_state, worker, "ann") == (0, 0)
+
+            for i in range(MAX_FAILED):
+                assert await db.auth("ann", "wrong") is False
+            assert await asyncio.to_thread(login_state, worker, "ann") == (MAX_FAILED, 1)
+            assert await db.auth("ann", "secret") is False         # заблокирован: и верный пароль
+
+            await db.unblock("ann")
+            assert await asyncio.to_thread(login_state, worker, "ann") == (0, 0)
+            assert await db.auth("ann", "secret") is True
+    asyncio.run(main())
+
+
+def test_unknown_and_blocked_logins_still_run_bcrypt(open_db):
+    async def main():
+        async with open_db() as (worker, db):
+            await db.add_user("ann", "secret", "Ann", "+70000000001")
+            for i in range(MAX_FAILED):
+                await db.auth("ann", "wrong")
+            verified = db._hasher.stats()["verify"]["count"]
+
+            assert await db.auth("nobody", "secret") is False
+            assert await db.auth("ann", "secret") is False
+            # По одной проверке bcrypt на каждый отказ — как у существующего логина
+            assert db._hasher.stats()["verify"]["count"] == verified + 2
+            # Проверка шла против хеша той же стоимости, что у настоящих паролей
+            assert db._dummy_hash.startswith("$2b$04$")
+            # Отказы по неизвестному и заблокированному логину не пишут в базу
+            assert await asyncio.to_thread(login_state, worker, "ann") == (MAX_FAILED, 1)
+            assert await asyncio.to_thread(login_state, worker, "nobody") is None
+    asyncio.run(main())
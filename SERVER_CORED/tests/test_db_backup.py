@@ -0,0 +1,25 @@
+"""Бэкапы DBWorker: ручные и плановые снимки не подменяют друг друга."""
+import asyncio
+
+from modules.db_core import BACKUP_AUTO_DIR
+
+
+def test_manual_backup_does_not_satisfy_scheduled(open_db, tmp_path):
+    async def main():
+        async with open_db(backup_compress=False) as (worker, db):
+            await db.add_user("ann", "pw", "Ann", "+70000000001", iin="iin1")
+            manual = await db.backup("manual")
+            assert manual.parent == tmp_path / "backups"
+
+            # Плановый запуск сразу после ручного: база та же, но плановой копии ещё нет
+            auto = await asyncio.to_thread(worker._sync_backup, "auto", False, True)
+            assert auto.parent == tmp_path / "backups" / BACKUP_AUTO_DIR
+            assert auto.exists() and manual.exists()
+
+            # Без изменений каждое назначение возвращает свой прошлый снимок
+            assert await asyncio.to_thread(worker._sync_backup, "auto", False, True) == auto
+            assert await db.backup("again") == manual
+
+            await db.add_user("bob", "pw", "Bob", "+70000000002", iin="iin2")
+            assert await asyncio.to_thread(worker._sync_backup, "auto", False, True) != auto
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""Групповая фиксация DBWorker: пакет записей — одна транзакция, задача — свой SAVEPOINT."""
+import asyncio
+import sqlite3
+
+import pytest
+
+
+def logins(worker):
+    conn = worker._sync_open()
+    try:
+        return [r[0] for r in conn.execute("SELECT login FROM users ORDER BY login")]
+    finally:
+        conn.close()
+
+
+def test_unique_failure_is_isolated_within_batch(open_db):
+    async def main():
+        async with open_db(batch_wait=0.2) as (worker, db):
+            sizes = []
+            sync_batch = worker._sync_batch
+
+            def recording(c, batch):
+                sizes.append(len(batch))
+                return sync_batch(c, batch)
+
+            worker._sync_batch = recording
+            users = [("u1", "+70000000001", "iin1"), ("u2", "+70000000002", "iin2"),
+                     ("u1", "+70000000003", "iin3"),       # повтор логина — UNIQUE
+                     ("u3", "+70000000004", "iin4")]
+            results = await asyncio.gather(
+                *(db.add_user(login, "pw", login.upper(), phone, iin=iin)
+                  for login, phone, iin in users),
+                return_exceptions=True)
+
+            assert sizes == [4]                            # все записи — одним пакетом
+            assert results[0] is True and results[1] is True and results[3] is True
+            assert isinstance(results[2], sqlite3.IntegrityError)
+            assert await asyncio.to_thread(logins, worker) == ["u1", "u2", "u3"]
+            # Соседи зафиксированы: видны и обычному чтению через producer
+            assert await db.get_user("u3") is not None
+    asyncio.run(main())
+
+
+def test_failed_task_does_not_roll_back_earlier_batch(open_db):
+    async def main():
+        async with open_db(batch_wait=0) as (worker, db):
+            assert await db.add_user("ann", "pw", "Ann", "+70000000001", iin="iin1") is True
+            with pytest.raises(sqlite3.IntegrityError):     # повтор телефона
+                await db.add_user("bob", "pw", "Bob", "+70000000001", iin="iin2")
+            assert await asyncio.to_thread(logins, worker) == ["ann"]
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""search_documents: слова + фильтры тегов/категории, курсорная пагинация, document_tags."""
+import os
+
+import pytest
+
+from modules.database import DocumentDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DocumentDatabase(os.path.join(tmp_path, "docs.db"), blob_dir=os.path.join(tmp_path, "blobs"))
+    yield db
+    db.close()
+
+
+def insert(db, filename, category, tags):
+    """Строка documents в обход add_document; теги — через set_tags, как у приложения."""
+    with db.get_connection():
+        doc_id = db.execute(
+            "INSERT INTO documents (filename, filepath, category, tags, date_added, encryption_key) "
+            "VALUES (?, ?, ?, '', '2024-01-01T00:00:00', '')",
+            (filename, f"/data/{filename}", category)).lastrowid
+    db.set_tags(doc_id, tags)
+    return doc_id
+
+
+def pages(db, limit, **kw):
+    ids, after, seen = [], None, 0
+    while True:
+        page = db.search_documents(limit=limit, after=after, **kw)
+        assert len(page["items"]) <= limit
+        ids += [d["id"] for d in page["items"]]
+        seen += 1
+        after = page["next"]
+        if after is None:
+            return ids, seen
+
+
+@pytest.fixture
+def corpus(db):
+    expected = {"kw_tag": set(), "two_tags": set(), "kw_tag_cat": set()}
+    for i in range(30):
+        tags = ["Finance"] if i % 2 == 0 else ["hr"]
+        if i % 3 == 0:
+            tags.append("#Urgent")
+        category = "annual" if i % 5 else "misc"
+        name = f"{'report' if i % 4 else 'scan'}_{i:02d}.pdf"
+        doc_id = insert(db, name, category, ", ".join(tags))
+        if name.startswith("report") and i % 2 == 0:
+            expected["kw_tag"].add(doc_id)
+            if category == "annual":
+                expected["kw_tag_cat"].add(doc_id)
+        if i % 2 == 0 and i % 3 == 0:
+            expected["two_tags"].add(doc_id)
+    return expected
+
+
+def test_keyword_and_tag_with_pagination(db, corpus):
+    ids, n = pages(db, 3, keyword="repo", tags="finance")
+    assert len(ids) == len(set(ids)) and set(ids) == corpus["kw_tag"]
+    assert n > 1
+    ids, _ = pages(db, 2, keyword="report", tags=["FINANCE"], category="annual")
+    assert set(ids) == corpus["kw_tag_cat"]
+
+
+def test_tags_only_newest_first(db, corpus):
+    ids, n = pages(db, 2, tags="urgent, finance")
+    assert ids == sorted(corpus["two_tags"], reverse=True)
+    assert n == 3
+
+
+def test_rows_written_outside_set_tags_need_rebuild(db, corpus):
+    with db.get_connection():
+        doc_id = db.execute(
+            "INSERT INTO documents (filename, filepath, category, tags, date_added, encryption_key) "
+            "VALUES ('report_raw.pdf', '/data/raw', 'reports', 'Finance, Raw', '2024-01-01', '')"
+        ).lastrowid
+    # FTS ведут триггеры, document_tags — нет (инвариант DocumentDatabase)
+    assert doc_id in {d["id"] for d in db.search_documents("raw")["items"]}
+    assert db.search_documents(tags="raw")["items"] == []
+
+    db.rebuild_tags([doc_id])
+    assert [d["id"] for d in db.search_documents("report", tags="raw")["items"]] == [doc_id]
+
+    with db.get_connection():
+        db.execute("UPDATE documents SET tags = 'moved' WHERE id = ?", (doc_id,))
+    db.rebuild_tags()
+    assert db.search_documents(tags="raw")["items"] == []
+    assert [d["id"] for d in db.search_documents(tags="moved")["items"]] == [doc_id]
+    ids, _ = pages(db, 4, keyword="repo", tags="finance")
+    assert set(ids) == corpus["kw_tag"]                     # полная пересборка не теряет теги
+
+
+def test_query_stats_is_bounded(db, monkeypatch):
+    from modules import database
+    monkeypatch.setattr(database, "QUERY_STATS_SIZE", 5)
+    for i in range(20):
+        db.execute(f"SELECT {i}")
+    db.execute("SELECT 19")
+    stats = db.query_stats()
+    assert len(stats) == 5
+    assert {r["sql"] for r in stats} == {f"SELECT {i}" for i in range(15, 20)}
+    assert next(r for r in stats if r["sql"] == "SELECT 19")["count"] == 2
@@ -0,0 +1,62 @@
+"""Скачивание документа: Range через границы сегментов, пароль только в заголовке или форме."""
+import os
+
+import pytest
+
+from modules.crypto_module import SEGMENT_SIZE
+
+PASSWORD = "doc-pass"
+DATA = os.urandom(3 * SEGMENT_SIZE + 1234)      # четыре сегмента, последний неполный
+
+
+@pytest.fixture
+def doc(client):
+    r = client.post("/admin/upload_document", data={"password": PASSWORD},
+                    files={"file": ("report.bin", DATA, "application/octet-stream")},
+                    follow_redirects=False)
+    assert r.status_code == 303
+    return "report.bin"
+
+
+def get(client, name, range_header=None, password=PASSWORD):
+    headers = {"X-Document-Password": password}
+    if range_header:
+        headers["Range"] = range_header
+    return client.get(f"/admin/documents/{name}", headers=headers)
+
+
+def test_full_download(client, doc):
+    r = get(client, doc)
+    assert r.status_code == 200
+    assert r.headers["accept-ranges"] == "bytes"
+    assert r.content == DATA
+
+
+@pytest.mark.parametrize("header, start, end", [
+    (f"bytes={SEGMENT_SIZE - 10}-{2 * SEGMENT_SIZE + 9}", SEGMENT_SIZE - 10, 2 * SEGMENT_SIZE + 10),
+    (f"bytes={SEGMENT_SIZE}-{SEGMENT_SIZE}", SEGMENT_SIZE, SEGMENT_SIZE + 1),
+    (f"bytes={3 * SEGMENT_SIZE - 1}-", 3 * SEGMENT_SIZE - 1, len(DATA)),
+    ("bytes=-2000", len(DATA) - 2000, len(DATA)),
+    (f"bytes=0-{10 * len(DATA)}", 0, len(DATA)),        # конец за файлом — до конца файла
+])
+def test_range_across_segments(client, doc, header, start, end):
+    r = get(client, doc, header)
+    assert r.status_code == 206
+    assert r.headers["content-range"] == f"bytes {start}-{end - 1}/{len(DATA)}"
+    assert r.content == DATA[start:end]
+
+
+def test_unsatisfiable_range_is_416(client, doc):
+    r = get(client, doc, f"bytes={len(DATA)}-")
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(DATA)}"
+
+
+def test_password_transport(client, doc):
+    assert get(client, doc, password="wrong").status_code == 403
+    # Пароль в URL не принимается
+    assert client.get(f"/admin/documents/{doc}?password={PASSWORD}").status_code == 401
+    r = client.post(f"/admin/documents/{doc}", data={"password": PASSWORD},
+                    headers={"Range": "bytes=-10"})
+    assert r.status_code == 206 and r.content == DATA[-10:]
+    assert get(client, "missing.bin").status_code == 404
@@ -0,0 +1,44 @@
+"""GET /admin/export: границы created_from/created_to в любом виде ISO 8601."""
+import json
+import os
+import sqlite3
+
+import pytest
+
+CREATED = {"a": "2024-01-31 09:59:59", "b": "2024-01-31 10:00:00", "c": "2024-01-31 11:30:00",
+           "d": "2024-01-31 12:00:00", "e": "2024-02-01 00:00:00"}
+
+
+@pytest.fixture
+def users(client, tmp_path):
+    conn = sqlite3.connect(os.path.join(tmp_path, "users.db"))
+    with conn:
+        conn.executemany("INSERT INTO users (login, full_name, pwd, phone, iin, created_at) "
+                         "VALUES (?, ?, 'x', ?, ?, ?)",
+                         ((login, login.upper(), f"+7{i}", f"iin{i}", ts)
+                          for i, (login, ts) in enumerate(CREATED.items())))
+    conn.close()
+
+
+def export(client, **params):
+    r = client.get("/admin/export", params={"format": "ndjson", "columns": "login", **params})
+    assert r.status_code == 200, r.text
+    return [json.loads(line)["login"] for line in r.text.splitlines()]
+
+
+@pytest.mark.parametrize("created_from, created_to, expected", [
+    ("2024-01-31T10:00", "2024-01-31T12:00", ["b", "c"]),
+    ("2024-01-31 10:00:00", "2024-01-31T12:00:00", ["b", "c"]),
+    ("2024-01-31", "2024-02-01", ["a", "b", "c", "d"]),
+    ("2024-01-31T15:00+05:00", None, ["b", "c", "d", "e"]),     # 10:00 UTC
+])
+def test_created_bounds(client, users, created_from, created_to, expected):
+    params = {"created_from": created_from}
+    if created_to:
+        params["created_to"] = created_to
+    assert export(client, **params) == expected
+
+
+def test_bad_date_is_422(client, users):
+    r = client.get("/admin/export", params={"created_from": "31.01.2024"})
+    assert r.status_code == 422
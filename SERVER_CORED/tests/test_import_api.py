@@ -0,0 +1,45 @@
+"""POST /admin/import: ответ 202 сразу, импорт — в фоне, итог — в GET /admin/import/{id}."""
+import time
+
+import bcrypt
+
+
+def wait_job(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/admin/import/{job_id}").json()
+        if job["status"] != "running":
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Импорт {job_id} не завершился за {timeout} с")
+
+
+def test_import_returns_202_and_finishes_in_background(client):
+    body = "login,password,full_name\nann,pw1,Ann\nbob,pw2,Bob\nann,pw3,Dup\n"
+    r = client.post("/admin/import", content=body, headers={"content-type": "text/csv"})
+    assert r.status_code == 202
+    job_id = r.json()["id"]
+    assert r.json()["status"] == "running"
+
+    job = wait_job(client, job_id)
+    assert job["status"] == "done"
+    assert (job["rows"], job["inserted"], job["failed"]) == (3, 2, 1)
+    assert job["errors"][0]["line"] == 4
+
+
+def test_format_error_is_reported_in_job_status(client):
+    r = client.post("/admin/import?format=csv", content="name,phone\nann,1\n",
+                    headers={"content-type": "text/csv"})
+    assert r.status_code == 202
+    job = wait_job(client, r.json()["id"])
+    assert job["status"] == "failed"
+    assert "login" in job["error"]
+
+
+def test_malformed_pwd_hash_is_rejected(client):
+    good = bcrypt.hashpw(b"pw", bcrypt.gensalt(4)).decode()
+    body = f"login,pwd_hash\nann,{good}\nbob,$2b$12$short\ncat,{good[:-1]}\n"
+    r = client.post("/admin/import", content=body, headers={"content-type": "text/csv"})
+    job = wait_job(client, r.json()["id"])
+    assert (job["inserted"], job["failed"]) == (1, 2)
+    assert [e["login"] for e in job["errors"]] == ["bob", "cat"]
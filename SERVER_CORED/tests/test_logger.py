@@ -0,0 +1,35 @@
+"""Очередь журнала: трассировка исключения доходит до форматтера отдельным полем."""
+import json
+import logging
+import queue
+
+from modules.logger import JsonFormatter, _DroppingQueueHandler, _DATE_FORMAT, _TEXT_FORMAT
+
+
+def log_exception(handler):
+    logger = logging.getLogger("test_logger.queue")
+    logger.propagate = False
+    logger.handlers[:] = [handler]
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("Сбой %s", "импорта")
+    finally:
+        logger.handlers.clear()
+    return handler.queue.get_nowait()
+
+
+def test_json_entry_keeps_exception():
+    record = log_exception(_DroppingQueueHandler(queue.Queue()))
+    assert record.exc_info is None and record.args is None
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "Сбой импорта"
+    assert entry["exc"].startswith("Traceback") and "ZeroDivisionError" in entry["exc"]
+
+
+def test_text_format_prints_traceback_once():
+    record = log_exception(_DroppingQueueHandler(queue.Queue()))
+    text = logging.Formatter(_TEXT_FORMAT, _DATE_FORMAT).format(record)
+    assert text.count("Traceback") == 1
+    assert text.splitlines()[0].endswith("Сбой импорта")
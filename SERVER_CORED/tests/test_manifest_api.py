@@ -0,0 +1,37 @@
+"""POST/GET /admin/manifest: подпись хранилища и понятный ответ без ключа подписи."""
+import os
+
+import pytest
+
+from modules import crypto_module
+
+
+@pytest.fixture
+def keys(tmp_path, monkeypatch):
+    """Ключи RSA — во временном каталоге; кеш загруженных ключей сбрасывается."""
+    key_dir = tmp_path / "keys"
+    monkeypatch.setattr(crypto_module, "PRIVATE_KEY_FILE", str(key_dir / "private_key.pem"))
+    monkeypatch.setattr(crypto_module, "PUBLIC_KEY_FILE", str(key_dir / "public_key.pem"))
+    monkeypatch.setattr(crypto_module, "_KEYS", {})
+    return key_dir
+
+
+def test_rebuild_without_signing_key_is_409(client, keys):
+    r = client.post("/admin/manifest")
+    assert r.status_code == 409
+    assert "private_key.pem" in r.json()["detail"]
+
+
+def test_rebuild_and_verify(client, keys, tmp_path):
+    crypto_module.generate_rsa_keys()
+    enc_dir = tmp_path / "encrypted_docs"
+    os.makedirs(enc_dir, exist_ok=True)
+    (enc_dir / "a.enc").write_bytes(b"data")
+
+    r = client.post("/admin/manifest")
+    assert r.status_code == 200 and r.json()["files"] == 1
+    assert client.get("/admin/manifest").json()["ok"] is True
+
+    (enc_dir / "a.enc").write_bytes(b"tampered")
+    check = client.get("/admin/manifest").json()
+    assert check["ok"] is False and check["changed"] == ["a.enc"]